@@ -0,0 +1,467 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Iterator
+
+from langchain_core.messages import BaseMessage, HumanMessage
+from langchain_core.messages.utils import count_tokens_approximately
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from langgraph.checkpoint.memory import InMemorySaver
+
+
+# ── Settings ──────────────────────────────────────────────────────────
+AI_HISTORY_MAX_TURNS = int(os.getenv("AI_HISTORY_MAX_TURNS", "10"))
+AI_HISTORY_MAX_TOKENS = int(os.getenv("AI_HISTORY_MAX_TOKENS", "3000"))
+AI_HISTORY_SUMMARIZE = os.getenv("AI_HISTORY_SUMMARIZE", "0") == "1"
+AI_MAX_THREADS = int(os.getenv("AI_MAX_THREADS", "10000"))
+AI_THREAD_IDLE_TTL = float(os.getenv("AI_THREAD_IDLE_TTL", str(24 * 60 * 60)))
+# اگه تنظیم بشه، گفتگوها روی دیسک (SQLite) ذخیره میشن و با ری‌استارت از بین نمیرن
+AI_CHECKPOINT_DB = os.getenv("AI_CHECKPOINT_DB")
+AI_CHECKPOINT_TTL = float(os.getenv("AI_CHECKPOINT_TTL", str(30 * 24 * 60 * 60)))
+
+
+# ── History Policy ────────────────────────────────────────────────────
+class HistoryPolicy:
+    """
+    تعیین اینکه کدوم پیام‌ها برای مدل فرستاده و نگه داشته بشن:
+    حداکثر max_turns نوبت آخر (هر نوبت = یک پیام کاربر + جواب‌ها) و
+    حداکثر max_tokens توکن. نوبت آخر همیشه نگه داشته میشه.
+    """
+
+    def __init__(
+        self,
+        max_turns: int = AI_HISTORY_MAX_TURNS,
+        max_tokens: int = AI_HISTORY_MAX_TOKENS,
+        summarize: bool = AI_HISTORY_SUMMARIZE,
+    ):
+        self.max_turns = max_turns
+        self.max_tokens = max_tokens
+        self.summarize = summarize
+
+    @staticmethod
+    def _turns(messages: list[BaseMessage]) -> list[list[BaseMessage]]:
+        turns: list[list[BaseMessage]] = []
+        for message in messages:
+            if isinstance(message, HumanMessage) or not turns:
+                turns.append([message])
+            else:
+                turns[-1].append(message)
+        return turns
+
+    def split(self, messages: list[BaseMessage]) -> tuple[list[BaseMessage], list[BaseMessage]]:
+        """(پیام‌های نگه‌داشتنی، پیام‌های قدیمی که باید کنار گذاشته بشن)"""
+        turns = self._turns(messages)
+        if self.max_turns > 0 and len(turns) > self.max_turns:
+            turns = turns[-self.max_turns:]
+
+        if self.max_tokens > 0:
+            sizes = [count_tokens_approximately(turn) for turn in turns]
+            total = sum(sizes)
+            start = 0
+            while total > self.max_tokens and start < len(turns) - 1:
+                total -= sizes[start]
+                start += 1
+            turns = turns[start:]
+
+        keep = [message for turn in turns for message in turn]
+        dropped = messages[:len(messages) - len(keep)]
+        return keep, dropped
+
+
+# ── Bounded Checkpointer ──────────────────────────────────────────────
+class BoundedMemorySaver(InMemorySaver):
+    """
+    MemorySaver با حافظه‌ی محدود: برای هر thread فقط چند checkpoint آخر
+    (و blobهایی که بهشون ارجاع دارن) نگه داشته میشه، threadهای بیکار بعد از
+    idle_ttl حذف میشن و تعداد کل threadها هم سقف max_threads داره.
+    """
+
+    def __init__(
+        self,
+        keep_checkpoints: int = 2,
+        max_threads: int = AI_MAX_THREADS,
+        idle_ttl: float = AI_THREAD_IDLE_TTL,
+        **kwargs: Any,
+    ):
+        super().__init__(**kwargs)
+        self.keep_checkpoints = keep_checkpoints
+        self.max_threads = max_threads
+        self.idle_ttl = idle_ttl
+        # thread → زمان آخرین استفاده؛ به ترتیب استفاده
+        self._last_used: OrderedDict[str, float] = OrderedDict()
+        # (thread, ns) → کلیدهای blob/write همون thread تا حذف نیاز به پیمایش کل حافظه نداشته باشه
+        self._blob_keys: dict[tuple[str, str], set] = {}
+        self._write_keys: dict[str, set] = {}
+
+    def _touch(self, thread_id: str):
+        self._last_used[thread_id] = time.monotonic()
+        self._last_used.move_to_end(thread_id)
+
+    def get_tuple(self, config):
+        result = super().get_tuple(config)
+        if result is not None:
+            self._touch(config["configurable"]["thread_id"])
+        return result
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        result = super().put(config, checkpoint, metadata, new_versions)
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        keys = self._blob_keys.setdefault((thread_id, checkpoint_ns), set())
+        for channel, version in new_versions.items():
+            keys.add((thread_id, checkpoint_ns, channel, version))
+        self._prune_thread(thread_id, checkpoint_ns)
+        self._touch(thread_id)
+        self._evict_idle()
+        return result
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        super().put_writes(config, writes, task_id, task_path)
+        thread_id = config["configurable"]["thread_id"]
+        key = (thread_id, config["configurable"]["checkpoint_ns"], config["configurable"]["checkpoint_id"])
+        self._write_keys.setdefault(thread_id, set()).add(key)
+
+    def _prune_thread(self, thread_id: str, checkpoint_ns: str):
+        """حذف checkpointهای قدیمی‌تر از keep_checkpoints و blobهای بی‌استفاده"""
+        checkpoints = self.storage[thread_id][checkpoint_ns]
+        if len(checkpoints) <= self.keep_checkpoints:
+            return
+        # uuid6 ها زمان‌محور و قابل مرتب‌سازی‌ان
+        ordered = sorted(checkpoints)
+        for checkpoint_id in ordered[:-self.keep_checkpoints]:
+            del checkpoints[checkpoint_id]
+            self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+            self._write_keys.get(thread_id, set()).discard((thread_id, checkpoint_ns, checkpoint_id))
+
+        live: set = set()
+        for checkpoint_id in ordered[-self.keep_checkpoints:]:
+            saved = self.serde.loads_typed(checkpoints[checkpoint_id][0])
+            for channel, version in saved["channel_versions"].items():
+                live.add((thread_id, checkpoint_ns, channel, version))
+        keys = self._blob_keys.get((thread_id, checkpoint_ns), set())
+        for key in keys - live:
+            self.blobs.pop(key, None)
+        keys &= live
+
+    def _evict_idle(self):
+        """حذف threadهای بیکار از ابتدای صف (هزینه‌ی سرشکن O(1))"""
+        now = time.monotonic()
+        for _ in range(2):
+            if not self._last_used:
+                return
+            thread_id, last = next(iter(self._last_used.items()))
+            if now - last < self.idle_ttl and len(self._last_used) <= self.max_threads:
+                return
+            self.delete_thread(thread_id)
+
+    def delete_thread(self, thread_id: str) -> None:
+        """حذف یک thread بدون پیمایش کل حافظه"""
+        namespaces = self.storage.pop(thread_id, {})
+        for checkpoint_ns in namespaces:
+            for key in self._blob_keys.pop((thread_id, checkpoint_ns), ()):
+                self.blobs.pop(key, None)
+        for key in self._write_keys.pop(thread_id, ()):
+            self.writes.pop(key, None)
+        self._last_used.pop(thread_id, None)
+
+    def thread_count(self) -> int:
+        return len(self._last_used)
+
+
+# ── SQLite Checkpointer ───────────────────────────────────────────────
+class SQLiteSaver(BaseCheckpointSaver):
+    """
+    checkpointer روی دیسک (SQLite با WAL) برای گفتگوهای AI.
+    هر checkpoint کامل (همراه channel_values) سریال‌سازی و با zlib فشرده
+    میشه؛ برای هر thread فقط keep_checkpoints نسخه‌ی آخر نگه داشته میشه و
+    get_tuple فقط آخرین نسخه رو می‌خونه. threadهایی که بیشتر از ttl
+    استفاده نشدن به‌صورت دوره‌ای حذف و فضای فایل بازپس گرفته میشه.
+    """
+
+    _PRUNE_EVERY = 500
+
+    def __init__(
+        self,
+        path: str,
+        keep_checkpoints: int = 2,
+        ttl: float = AI_CHECKPOINT_TTL,
+        **kwargs: Any,
+    ):
+        super().__init__(**kwargs)
+        self.keep_checkpoints = keep_checkpoints
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._puts = 0
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False, timeout=10)
+        # auto_vacuum باید قبل از ساخت جدول‌ها تنظیم بشه
+        self._conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                thread_id TEXT NOT NULL,
+                checkpoint_ns TEXT NOT NULL,
+                checkpoint_id TEXT NOT NULL,
+                parent_id TEXT,
+                type TEXT NOT NULL,
+                checkpoint BLOB NOT NULL,
+                metadata_type TEXT NOT NULL,
+                metadata BLOB NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS checkpoints_updated ON checkpoints(updated_at);
+            CREATE TABLE IF NOT EXISTS writes (
+                thread_id TEXT NOT NULL,
+                checkpoint_ns TEXT NOT NULL,
+                checkpoint_id TEXT NOT NULL,
+                task_id TEXT NOT NULL,
+                idx INTEGER NOT NULL,
+                channel TEXT NOT NULL,
+                type TEXT NOT NULL,
+                value BLOB NOT NULL,
+                task_path TEXT NOT NULL DEFAULT '',
+                PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+            ) WITHOUT ROWID;
+            """
+        )
+
+    # ── serialization ──
+    def _dump(self, value: Any) -> tuple[str, bytes]:
+        type_, data = self.serde.dumps_typed(value)
+        return type_, zlib.compress(data)
+
+    def _load(self, type_: str, data: bytes) -> Any:
+        return self.serde.loads_typed((type_, zlib.decompress(data)))
+
+    def _row_to_tuple(self, row: tuple) -> CheckpointTuple:
+        thread_id, checkpoint_ns, checkpoint_id, parent_id, type_, checkpoint, metadata_type, metadata = row
+        writes = self._conn.execute(
+            "SELECT task_id, channel, type, value FROM writes"
+            " WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?"
+            " ORDER BY task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": checkpoint_id,
+                }
+            },
+            checkpoint=self._load(type_, checkpoint),
+            metadata=self._load(metadata_type, metadata),
+            pending_writes=[(task_id, channel, self._load(t, v)) for task_id, channel, t, v in writes],
+            parent_config=(
+                {
+                    "configurable": {
+                        "thread_id": thread_id,
+                        "checkpoint_ns": checkpoint_ns,
+                        "checkpoint_id": parent_id,
+                    }
+                }
+                if parent_id
+                else None
+            ),
+        )
+
+    # ── sync API ──
+    def get_tuple(self, config) -> CheckpointTuple | None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = get_checkpoint_id(config)
+        columns = "thread_id, checkpoint_ns, checkpoint_id, parent_id, type, checkpoint, metadata_type, metadata"
+        with self._lock:
+            if checkpoint_id:
+                row = self._conn.execute(
+                    f"SELECT {columns} FROM checkpoints"
+                    " WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    (thread_id, checkpoint_ns, checkpoint_id),
+                ).fetchone()
+            else:
+                row = self._conn.execute(
+                    f"SELECT {columns} FROM checkpoints"
+                    " WHERE thread_id = ? AND checkpoint_ns = ?"
+                    " ORDER BY checkpoint_id DESC LIMIT 1",
+                    (thread_id, checkpoint_ns),
+                ).fetchone()
+            return self._row_to_tuple(row) if row else None
+
+    def list(self, config, *, filter=None, before=None, limit=None) -> Iterator[CheckpointTuple]:
+        query = (
+            "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_id, type, checkpoint, metadata_type, metadata"
+            " FROM checkpoints"
+        )
+        where, params = [], []
+        if config:
+            where.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            checkpoint_ns = config["configurable"].get("checkpoint_ns")
+            if checkpoint_ns is not None:
+                where.append("checkpoint_ns = ?")
+                params.append(checkpoint_ns)
+        if before:
+            where.append("checkpoint_id < ?")
+            params.append(get_checkpoint_id(before))
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        query += " ORDER BY checkpoint_id DESC"
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+            results = []
+            for row in rows:
+                item = self._row_to_tuple(row)
+                if filter and not all(item.metadata.get(k) == v for k, v in filter.items()):
+                    continue
+                results.append(item)
+                if limit is not None and len(results) >= limit:
+                    break
+        yield from results
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        type_, data = self._dump(checkpoint)
+        meta_type, meta = self._dump(get_checkpoint_metadata(config, metadata))
+        with self._lock:
+            conn = self._conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "INSERT OR REPLACE INTO checkpoints"
+                    " (thread_id, checkpoint_ns, checkpoint_id, parent_id, type, checkpoint,"
+                    "  metadata_type, metadata, updated_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        thread_id,
+                        checkpoint_ns,
+                        checkpoint["id"],
+                        config["configurable"].get("checkpoint_id"),
+                        type_,
+                        data,
+                        meta_type,
+                        meta,
+                        time.time(),
+                    ),
+                )
+                self._compact_thread(thread_id, checkpoint_ns)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            self._puts += 1
+            if self._puts % self._PRUNE_EVERY == 0:
+                self._prune_idle()
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        # نوشتن‌های خاص (خطا، interrupt و ...) جایگزین میشن، بقیه فقط یک بار ثبت میشن
+        verb = "REPLACE" if all(c in WRITES_IDX_MAP for c, _ in writes) else "IGNORE"
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            type_, data = self._dump(value)
+            rows.append((
+                thread_id, checkpoint_ns, checkpoint_id, task_id,
+                WRITES_IDX_MAP.get(channel, idx), channel, type_, data, task_path,
+            ))
+        with self._lock:
+            self._conn.executemany(
+                f"INSERT OR {verb} INTO writes"
+                " (thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, type, value, task_path)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,))
+            self._conn.execute("DELETE FROM writes WHERE thread_id = ?", (thread_id,))
+
+    # ── compaction ──
+    def _compact_thread(self, thread_id: str, checkpoint_ns: str):
+        """حذف نسخه‌های قدیمی‌تر از keep_checkpoints برای این thread"""
+        stale = self._conn.execute(
+            "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?"
+            " ORDER BY checkpoint_id DESC LIMIT -1 OFFSET ?",
+            (thread_id, checkpoint_ns, self.keep_checkpoints),
+        ).fetchall()
+        for (checkpoint_id,) in stale:
+            self._conn.execute(
+                "DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                (thread_id, checkpoint_ns, checkpoint_id),
+            )
+            self._conn.execute(
+                "DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                (thread_id, checkpoint_ns, checkpoint_id),
+            )
+
+    def _prune_idle(self):
+        """حذف threadهای منقضی‌شده (TTL) و آزاد کردن فضای فایل"""
+        cutoff = time.time() - self.ttl
+        conn = self._conn
+        expired = conn.execute(
+            "SELECT thread_id FROM checkpoints GROUP BY thread_id HAVING MAX(updated_at) < ?",
+            (cutoff,),
+        ).fetchall()
+        for (thread_id,) in expired:
+            conn.execute("DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,))
+            conn.execute("DELETE FROM writes WHERE thread_id = ?", (thread_id,))
+        conn.execute("PRAGMA incremental_vacuum")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def compact(self):
+        """اجرای دستی پاک‌سازی (مثلاً از یک جاب دوره‌ای)"""
+        with self._lock:
+            self._prune_idle()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # ── async API ──
+    async def aget_tuple(self, config) -> CheckpointTuple | None:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        items = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in items:
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+
+def make_checkpointer() -> BaseCheckpointSaver:
+    """SQLite اگه AI_CHECKPOINT_DB تنظیم شده باشه، وگرنه حافظه‌ی محدود داخل پروسه"""
+    if AI_CHECKPOINT_DB:
+        return SQLiteSaver(AI_CHECKPOINT_DB)
+    return BoundedMemorySaver()
@@ -0,0 +1,327 @@
+import os
+import sqlite3
+import time
+from bisect import bisect_left, bisect_right
+from typing import NamedTuple
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
+from telegram.error import Forbidden, TelegramError
+from telegram.ext import ContextTypes
+
+from gold import PriceSnapshot, get_snapshot, lookup_symbol, parse_price, symbol_for_key
+from textnorm import normalize_persian_text
+
+
+# ── Settings ──────────────────────────────────────────────────────────
+ALERTS_DB = os.getenv("ALERTS_DB", "alerts.db")
+ALERTS_MAX_PER_CHAT = int(os.getenv("ALERTS_MAX_PER_CHAT", "20"))
+
+ABOVE = "above"
+BELOW = "below"
+
+_DIRECTIONS = {
+    ">": ABOVE, "above": ABOVE, "بالای": ABOVE, "بالاتر": ABOVE, "بیشتر": ABOVE, "بیشتراز": ABOVE,
+    "<": BELOW, "below": BELOW, "زیر": BELOW, "پایین": BELOW, "کمتر": BELOW, "کمتراز": BELOW,
+}
+
+
+class Alert(NamedTuple):
+    id: int
+    chat_id: int
+    key: str
+    direction: str
+    threshold: float
+
+
+# ── Alert Index ───────────────────────────────────────────────────────
+class AlertIndex:
+    """
+    هشدارهای قیمت، ایندکس‌شده بر اساس key تی‌جی‌جی‌یو: برای هر key دو لیست
+    مرتب از (آستانه، id) داریم، یکی برای «بالاتر از» و یکی برای «پایین‌تر از».
+    با هر اسنپ‌شات فقط بازه‌ی بین قیمت قبلی و جدید با bisect پیدا میشه، پس
+    هزینه O(log n + تعداد هشدارهای فعال‌شده) هست نه O(تعداد کل هشدارها).
+    هشدارها یکبار مصرفن و روی SQLite ذخیره میشن.
+    """
+
+    def __init__(self, path: str = ALERTS_DB):
+        self._conn = sqlite3.connect(path, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._create_table()
+        self._alerts: dict[int, Alert] = {}
+        self._by_chat: dict[int, set[int]] = {}
+        self._above: dict[str, list[tuple[float, int]]] = {}
+        self._below: dict[str, list[tuple[float, int]]] = {}
+
+        rows = self._conn.execute("SELECT id, chat_id, key, direction, threshold FROM alerts").fetchall()
+        for row in rows:
+            self._index(Alert(*row))
+        for lists in (self._above, self._below):
+            for entries in lists.values():
+                entries.sort()
+
+    def _create_table(self):
+        """
+        AUTOINCREMENT تا id هشدارهای حذف‌شده دوباره استفاده نشه (وگرنه دکمه‌ی
+        alert_del یک لیست قدیمی ممکنه هشدار جدیدتری رو حذف کنه)
+        """
+        schema = (
+            "CREATE TABLE {name} ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " chat_id INTEGER NOT NULL,"
+            " key TEXT NOT NULL,"
+            " direction TEXT NOT NULL,"
+            " threshold REAL NOT NULL,"
+            " created_at REAL NOT NULL)"
+        )
+        row = self._conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'alerts'").fetchone()
+        if row is None:
+            self._conn.execute(schema.format(name="alerts"))
+        elif "AUTOINCREMENT" not in row[0].upper():
+            # دیتابیس‌های قبلی: ساخت دوباره‌ی جدول با همون داده‌ها
+            with self._conn:
+                self._conn.execute("BEGIN")
+                self._conn.execute(schema.format(name="alerts_new"))
+                self._conn.execute("INSERT INTO alerts_new SELECT id, chat_id, key, direction, threshold, created_at FROM alerts")
+                self._conn.execute("DROP TABLE alerts")
+                self._conn.execute("ALTER TABLE alerts_new RENAME TO alerts")
+
+    def __len__(self) -> int:
+        return len(self._alerts)
+
+    def _index(self, alert: Alert):
+        self._alerts[alert.id] = alert
+        self._by_chat.setdefault(alert.chat_id, set()).add(alert.id)
+        lists = self._above if alert.direction == ABOVE else self._below
+        lists.setdefault(alert.key, []).append((alert.threshold, alert.id))
+
+    def _unindex_chat(self, alert: Alert):
+        ids = self._by_chat.get(alert.chat_id)
+        if ids is not None:
+            ids.discard(alert.id)
+            if not ids:
+                del self._by_chat[alert.chat_id]
+
+    def count_for_chat(self, chat_id: int) -> int:
+        return len(self._by_chat.get(chat_id, ()))
+
+    def for_chat(self, chat_id: int) -> list[Alert]:
+        return sorted((self._alerts[i] for i in self._by_chat.get(chat_id, ())), key=lambda a: a.id)
+
+    def add(self, chat_id: int, key: str, direction: str, threshold: float) -> Alert:
+        cursor = self._conn.execute(
+            "INSERT INTO alerts (chat_id, key, direction, threshold, created_at) VALUES (?, ?, ?, ?, ?)",
+            (chat_id, key, direction, threshold, time.time()),
+        )
+        alert = Alert(cursor.lastrowid, chat_id, key, direction, threshold)
+        self._alerts[alert.id] = alert
+        self._by_chat.setdefault(chat_id, set()).add(alert.id)
+        lists = self._above if direction == ABOVE else self._below
+        entries = lists.setdefault(key, [])
+        entries.insert(bisect_right(entries, (threshold, alert.id)), (threshold, alert.id))
+        return alert
+
+    def add_many(self, alerts: list[tuple[int, str, str, float]]):
+        """ثبت دسته‌ای (chat_id, key, direction, threshold)؛ برای ایمپورت و بنچمارک"""
+        now = time.time()
+        with self._conn:
+            self._conn.execute("BEGIN")
+            start = self._conn.execute(
+                "SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'alerts'), 0),"
+                " COALESCE((SELECT MAX(id) FROM alerts), 0))"
+            ).fetchone()[0] + 1
+            self._conn.executemany(
+                "INSERT INTO alerts (id, chat_id, key, direction, threshold, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                [(start + i, *alert, now) for i, alert in enumerate(alerts)],
+            )
+        for i, alert in enumerate(alerts):
+            self._index(Alert(start + i, *alert))
+        for lists in (self._above, self._below):
+            for entries in lists.values():
+                entries.sort()
+
+    def remove(self, alert_id: int, chat_id: int | None = None) -> bool:
+        alert = self._alerts.get(alert_id)
+        if alert is None or (chat_id is not None and alert.chat_id != chat_id):
+            return False
+        del self._alerts[alert_id]
+        self._unindex_chat(alert)
+        lists = self._above if alert.direction == ABOVE else self._below
+        entries = lists[alert.key]
+        i = bisect_left(entries, (alert.threshold, alert_id))
+        del entries[i]
+        if not entries:
+            del lists[alert.key]
+        self._conn.execute("DELETE FROM alerts WHERE id = ?", (alert_id,))
+        return True
+
+    def evaluate(self, data: dict, previous: dict | None = None) -> list[Alert]:
+        """
+        بررسی هشدارها با دیکشنری current جدید و قبلی؛ هشدارهای فعال‌شده حذف و برگردونده میشن.
+        «بالاتر از t»: قبلی < t <= جدید ؛ «پایین‌تر از t»: جدید <= t < قبلی.
+        بدون قیمت قبلی (اولین اسنپ‌شات) هر هشداری که شرطش برقراره فعال میشه.
+        """
+        triggered: list[int] = []
+        previous = previous or {}
+        for key in self._above.keys() | self._below.keys():
+            new = parse_price(data.get(key, {}).get("p"))
+            if new is None:
+                continue
+            old = parse_price(previous.get(key, {}).get("p"))
+
+            entries = self._above.get(key)
+            if entries and (old is None or new > old):
+                lo = 0 if old is None else bisect_right(entries, (old, float("inf")))
+                hi = bisect_right(entries, (new, float("inf")))
+                if lo < hi:
+                    triggered.extend(alert_id for _, alert_id in entries[lo:hi])
+                    del entries[lo:hi]
+                    if not entries:
+                        del self._above[key]
+
+            entries = self._below.get(key)
+            if entries and (old is None or new < old):
+                lo = bisect_left(entries, (new, float("-inf")))
+                hi = len(entries) if old is None else bisect_left(entries, (old, float("-inf")))
+                if lo < hi:
+                    triggered.extend(alert_id for _, alert_id in entries[lo:hi])
+                    del entries[lo:hi]
+                    if not entries:
+                        del self._below[key]
+
+        if not triggered:
+            return []
+        alerts = [self._alerts.pop(alert_id) for alert_id in triggered]
+        for alert in alerts:
+            self._unindex_chat(alert)
+        with self._conn:
+            self._conn.execute("BEGIN")
+            self._conn.executemany("DELETE FROM alerts WHERE id = ?", ((alert_id,) for alert_id in triggered))
+        return alerts
+
+    def close(self):
+        self._conn.close()
+
+
+_index: AlertIndex | None = None
+
+
+def get_alert_index() -> AlertIndex:
+    global _index
+    if _index is None:
+        _index = AlertIndex()
+    return _index
+
+
+def close_alert_index():
+    global _index
+    if _index is not None:
+        _index.close()
+        _index = None
+
+
+# ── Formatting ────────────────────────────────────────────────────────
+def _format_threshold(alert: Alert) -> str:
+    symbol = symbol_for_key(alert.key)
+    value = alert.threshold / symbol.factor
+    if symbol.factor == 1:
+        return f"${value:,.2f}".rstrip("0").rstrip(".")
+    return f"{value:,.0f} تومان"
+
+
+def _describe(alert: Alert) -> str:
+    symbol = symbol_for_key(alert.key)
+    arrow = "بالاتر از" if alert.direction == ABOVE else "پایین‌تر از"
+    return f"{symbol.label} {arrow} {_format_threshold(alert)}"
+
+
+# ── Handlers ──────────────────────────────────────────────────────────
+_USAGE = (
+    "فرمت درست: /alert نماد > قیمت  یا  /alert نماد < قیمت\n"
+    "مثال: /alert usd > 60000  (تومان)\n"
+    "مثال: /alert btc < 50000  (دلار)\n"
+    "لیست هشدارها: /alerts"
+)
+
+
+async def alert_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    message = update.effective_message
+    chat = update.effective_chat
+    if message is None or chat is None:
+        return
+    args = context.args or []
+    if len(args) < 3:
+        await message.reply_text(_USAGE)
+        return
+
+    symbol = lookup_symbol(" ".join(args[:-2]))
+    direction = _DIRECTIONS.get(normalize_persian_text(args[-2], keep_punctuation=True).replace(" ", ""))
+    value = parse_price(normalize_persian_text(args[-1], keep_punctuation=True))
+    if symbol is None or direction is None or value is None or value <= 0:
+        await message.reply_text(_USAGE)
+        return
+
+    index = get_alert_index()
+    if index.count_for_chat(chat.id) >= ALERTS_MAX_PER_CHAT:
+        await message.reply_text(f"❌ حداکثر {ALERTS_MAX_PER_CHAT} هشدار فعال می‌تونی داشته باشی.")
+        return
+
+    threshold = value * symbol.factor
+    # همون قیمتی که اسنپ‌شات بعدی به عنوان «قبلی» باهاش مقایسه میشه
+    snapshot = get_snapshot()
+    current = parse_price(snapshot.data.get(symbol.key, {}).get("p")) if snapshot is not None else None
+    if current is not None and (current >= threshold if direction == ABOVE else current <= threshold):
+        await message.reply_text("ℹ️ قیمت فعلی همین الان هم از این حد رد شده.")
+        return
+
+    alert = index.add(chat.id, symbol.key, direction, threshold)
+    await message.reply_text(f"🔔 هشدار ثبت شد: {_describe(alert)}")
+
+
+async def alerts_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    message = update.effective_message
+    chat = update.effective_chat
+    if message is None or chat is None:
+        return
+    alerts = get_alert_index().for_chat(chat.id)
+    if not alerts:
+        await message.reply_text("هیچ هشدار فعالی نداری.\n\n" + _USAGE)
+        return
+    rows = [
+        [InlineKeyboardButton(f"❌ {_describe(alert)}", callback_data=f"alert_del:{alert.id}")]
+        for alert in alerts
+    ]
+    await message.reply_text(
+        "🔔 هشدارهای فعال (برای حذف روی هر کدوم بزن):",
+        reply_markup=InlineKeyboardMarkup(rows),
+    )
+
+
+async def delete_alert(update: Update, context: ContextTypes.DEFAULT_TYPE, alert_id: str):
+    """callback «alert_del:<id>»"""
+    message = update.effective_message
+    chat = update.effective_chat
+    if message is None or chat is None or not alert_id.isdigit():
+        return
+    if get_alert_index().remove(int(alert_id), chat_id=chat.id):
+        await message.reply_text("🗑 هشدار حذف شد.")
+    else:
+        await message.reply_text("این هشدار دیگه وجود نداره.")
+
+
+async def check_alerts(context: ContextTypes.DEFAULT_TYPE, previous: PriceSnapshot | None, snapshot: PriceSnapshot):
+    """listener اسنپ‌شات قیمت‌ها: ارسال هشدارهای فعال‌شده"""
+    index = get_alert_index()
+    if not len(index):
+        return
+    for alert in index.evaluate(snapshot.data, previous.data if previous is not None else None):
+        current = parse_price(snapshot.data.get(alert.key, {}).get("p"))
+        price = _format_threshold(alert._replace(threshold=current)) if current is not None else "---"
+        try:
+            await context.bot.send_message(
+                alert.chat_id,
+                f"🔔 هشدار قیمت: {_describe(alert)}\n💲 قیمت فعلی: {price}",
+            )
+        except Forbidden:
+            pass  # کاربر ربات رو بلاک کرده
+        except TelegramError as e:
+            print(f"Alert send Error: {e}")
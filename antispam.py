@@ -0,0 +1,282 @@
+import asyncio
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+
+try:
+    import redis.asyncio as redis_asyncio
+except ImportError:  # فقط برای بک‌اند Redis لازمه
+    redis_asyncio = None
+
+
+class SpamLimit(NamedTuple):
+    """حداکثر max_messages پیام در window ثانیه؛ بیشتر از اون → بلاک به مدت ban_duration"""
+    max_messages: int
+    window: float
+    ban_duration: float
+
+
+# ── Settings ──────────────────────────────────────────────────────────
+SPAM_BAN_DURATION = float(os.getenv("SPAM_BAN_DURATION", str(30 * 60)))   # مدت بلاک (۳۰ دقیقه)
+
+SPAM_LIMITS = {
+    "private": SpamLimit(
+        int(os.getenv("SPAM_PRIVATE_MAX", "5")),
+        float(os.getenv("SPAM_PRIVATE_WINDOW", "10")),
+        SPAM_BAN_DURATION,
+    ),
+    "group": SpamLimit(
+        int(os.getenv("SPAM_GROUP_MAX", "8")),
+        float(os.getenv("SPAM_GROUP_WINDOW", "10")),
+        SPAM_BAN_DURATION,
+    ),
+}
+
+SPAM_MAX_TRACKED_USERS = int(os.getenv("SPAM_MAX_TRACKED_USERS", "100000"))
+# memory | sqlite:///path/to/spam.db | redis://localhost:6379/0
+SPAM_STORE_URL = os.getenv("SPAM_STORE_URL", "memory")
+
+
+class SpamVerdict(NamedTuple):
+    """نتیجه‌ی ثبت یک پیام: blocked یعنی نادیده گرفته بشه، just_banned یعنی همین الان بلاک شد"""
+    blocked: bool
+    just_banned: bool
+    ban_remaining: float
+
+
+def limit_for_chat_type(chat_type: str | None) -> SpamLimit:
+    if chat_type in ("group", "supergroup"):
+        return SPAM_LIMITS["group"]
+    return SPAM_LIMITS["private"]
+
+
+# ── In-Memory Store ───────────────────────────────────────────────────
+class MemoryRateLimitStore:
+    """
+    token bucket برای هر کاربر: هر پیام یک توکن مصرف می‌کنه و توکن‌ها با نرخ
+    max_messages / window دوباره پر میشن. هر به‌روزرسانی O(1) و حافظه محدوده:
+    کاربرهایی که سطلشون دوباره پر شده (بیکار) و بلاک‌های منقضی‌شده حذف میشن
+    و تعداد کل کاربرهای ردیابی‌شده هم سقف داره.
+    """
+
+    def __init__(self, max_entries: int = SPAM_MAX_TRACKED_USERS):
+        self.max_entries = max_entries
+        # کاربر → [توکن باقی‌مونده، زمان آخرین پیام، پنجره‌ی limit]؛ به ترتیب آخرین استفاده
+        self._buckets: OrderedDict[int, list[float]] = OrderedDict()
+        # کاربر → زمان پایان بلاک؛ به ترتیب ثبت
+        self._bans: OrderedDict[int, float] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._buckets) + len(self._bans)
+
+    def ban_remaining(self, key: int, now: float | None = None) -> float:
+        """چند ثانیه از بلاک کاربر باقی مونده (۰ یعنی بلاک نیست)"""
+        now = time.time() if now is None else now
+        expires = self._bans.get(key)
+        if expires is None:
+            return 0.0
+        if now >= expires:
+            del self._bans[key]
+            return 0.0
+        return expires - now
+
+    def hit(self, key: int, limit: SpamLimit, now: float | None = None) -> bool:
+        """
+        ثبت یک پیام. True یعنی کاربر همین الان از حد مجاز رد شد و بلاک شد.
+        قبلش باید ban_remaining چک شده باشه.
+        """
+        now = time.time() if now is None else now
+        self._evict(now)
+
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            tokens = float(limit.max_messages)
+        else:
+            tokens, last, _ = bucket
+            tokens = min(limit.max_messages, tokens + (now - last) * limit.max_messages / limit.window)
+
+        if tokens < 1:
+            self._buckets.pop(key, None)
+            self._bans[key] = now + limit.ban_duration
+            self._bans.move_to_end(key)
+            return True
+
+        if bucket is None:
+            self._buckets[key] = [tokens - 1, now, limit.window]
+        else:
+            bucket[0], bucket[1], bucket[2] = tokens - 1, now, limit.window
+            self._buckets.move_to_end(key)
+        return False
+
+    def _evict(self, now: float):
+        """حذف چند ورودی قدیمی از ابتدای صف‌ها (هزینه‌ی سرشکن O(1))"""
+        buckets = self._buckets
+        for _ in range(2):
+            if not buckets:
+                break
+            key, (_, last, window) = next(iter(buckets.items()))
+            # بعد از یک پنجره‌ی کامل سطل پره؛ یعنی فرقی با کاربر جدید نداره
+            if now - last < window and len(buckets) < self.max_entries:
+                break
+            buckets.popitem(last=False)
+
+        bans = self._bans
+        for _ in range(2):
+            if not bans:
+                break
+            key, expires = next(iter(bans.items()))
+            if expires > now and len(bans) < self.max_entries:
+                break
+            bans.popitem(last=False)
+
+    async def check(self, key: int, limit: SpamLimit, now: float | None = None) -> SpamVerdict:
+        now = time.time() if now is None else now
+        remaining = self.ban_remaining(key, now)
+        if remaining > 0:
+            return SpamVerdict(True, False, remaining)
+        if self.hit(key, limit, now):
+            return SpamVerdict(True, True, limit.ban_duration)
+        return SpamVerdict(False, False, 0.0)
+
+    async def close(self):
+        pass
+
+
+# ── SQLite Store ──────────────────────────────────────────────────────
+class SQLiteRateLimitStore:
+    """
+    همون token bucket ولی روی یک فایل SQLite مشترک بین چند پروسه.
+    هر پیام یک تراکنش BEGIN IMMEDIATE (خواندن + نوشتن اتمیک)؛ بلاک‌ها
+    بعد از ری‌استارت هم باقی می‌مونن.
+    """
+
+    _EVICT_EVERY = 1000
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS spam ("
+            " key INTEGER PRIMARY KEY,"
+            " tokens REAL NOT NULL,"
+            " last REAL NOT NULL,"
+            " idle_at REAL NOT NULL,"
+            " banned_until REAL NOT NULL DEFAULT 0)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS spam_idle ON spam(idle_at)")
+        self._lock = asyncio.Lock()
+        self._calls = 0
+
+    def _check_sync(self, key: int, limit: SpamLimit, now: float) -> SpamVerdict:
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT tokens, last, banned_until FROM spam WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and row[2] > now:
+                conn.execute("COMMIT")
+                return SpamVerdict(True, False, row[2] - now)
+
+            if row is None or row[2]:
+                tokens = float(limit.max_messages)
+            else:
+                tokens = min(limit.max_messages, row[0] + (now - row[1]) * limit.max_messages / limit.window)
+
+            if tokens < 1:
+                banned_until = now + limit.ban_duration
+                conn.execute(
+                    "INSERT OR REPLACE INTO spam (key, tokens, last, idle_at, banned_until) VALUES (?, 0, ?, ?, ?)",
+                    (key, now, banned_until, banned_until),
+                )
+                verdict = SpamVerdict(True, True, limit.ban_duration)
+            else:
+                conn.execute(
+                    "INSERT OR REPLACE INTO spam (key, tokens, last, idle_at, banned_until) VALUES (?, ?, ?, ?, 0)",
+                    (key, tokens - 1, now, now + limit.window),
+                )
+                verdict = SpamVerdict(False, False, 0.0)
+
+            self._calls += 1
+            if self._calls % self._EVICT_EVERY == 0:
+                # کاربرهای بیکار و بلاک‌های تموم‌شده
+                conn.execute("DELETE FROM spam WHERE idle_at < ?", (now,))
+            conn.execute("COMMIT")
+            return verdict
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    async def check(self, key: int, limit: SpamLimit, now: float | None = None) -> SpamVerdict:
+        now = time.time() if now is None else now
+        async with self._lock:
+            return await asyncio.to_thread(self._check_sync, key, limit, now)
+
+    async def close(self):
+        self._conn.close()
+
+
+# ── Redis Store ───────────────────────────────────────────────────────
+# کل منطق token bucket + بلاک داخل یک اسکریپت Lua → یک رفت‌وبرگشت و اتمیک
+_REDIS_CHECK_SCRIPT = """
+local key = KEYS[1]
+local max_messages = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local ban_duration = tonumber(ARGV[3])
+local now = tonumber(ARGV[4])
+
+local state = redis.call('HMGET', key, 'tokens', 'last', 'banned_until')
+local banned_until = tonumber(state[3]) or 0
+if banned_until > now then
+    return {1, 0, tostring(banned_until - now)}
+end
+
+local tokens = max_messages
+if state[1] and banned_until == 0 then
+    tokens = math.min(max_messages, tonumber(state[1]) + (now - tonumber(state[2])) * max_messages / window)
+end
+
+if tokens < 1 then
+    redis.call('HSET', key, 'tokens', 0, 'last', now, 'banned_until', now + ban_duration)
+    redis.call('PEXPIRE', key, math.ceil(ban_duration * 1000))
+    return {1, 1, tostring(ban_duration)}
+end
+
+redis.call('HSET', key, 'tokens', tokens - 1, 'last', now, 'banned_until', 0)
+redis.call('PEXPIRE', key, math.ceil(window * 1000))
+return {0, 0, '0'}
+"""
+
+
+class RedisRateLimitStore:
+    """بک‌اند Redis (یا هر سرور سازگار) برای اشتراک محدودیت‌ها بین چند ورکر"""
+
+    def __init__(self, url: str, prefix: str = "spam:"):
+        if redis_asyncio is None:
+            raise RuntimeError("Redis spam store needs the 'redis' package: pip install redis")
+        self._redis = redis_asyncio.from_url(url)
+        self._script = self._redis.register_script(_REDIS_CHECK_SCRIPT)
+        self._prefix = prefix
+
+    async def check(self, key: int, limit: SpamLimit, now: float | None = None) -> SpamVerdict:
+        now = time.time() if now is None else now
+        blocked, just_banned, remaining = await self._script(
+            keys=[f"{self._prefix}{key}"],
+            args=[limit.max_messages, limit.window, limit.ban_duration, now],
+        )
+        return SpamVerdict(bool(blocked), bool(just_banned), float(remaining))
+
+    async def close(self):
+        await self._redis.aclose()
+
+
+def make_store(url: str = SPAM_STORE_URL):
+    """ساخت بک‌اند ذخیره‌سازی آنتی‌اسپم از روی SPAM_STORE_URL"""
+    if url.startswith("sqlite:///"):
+        return SQLiteRateLimitStore(url[len("sqlite:///"):])
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisRateLimitStore(url)
+    return MemoryRateLimitStore()
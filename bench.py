@@ -0,0 +1,441 @@
+"""
+بنچمارک‌های محلی ربات (بدون نیاز به اینترنت).
+
+    python bench.py webhook --updates 2000
+    python bench.py startup --runs 5
+    python bench.py keyboards --iterations 20000
+    python bench.py alerts --alerts 100000
+    python bench.py charts --requests 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import httpx
+from telegram import Update
+from telegram.ext import Application, MessageHandler, filters
+from tornado.httpserver import HTTPServer
+from tornado.netutil import bind_sockets
+from tornado.web import Application as TornadoApplication, RequestHandler
+
+from webhook import serve_webhook
+
+
+BENCH_TOKEN = "123456:bench"
+_BOT_USER = {"id": 123456, "is_bot": True, "first_name": "bench", "username": "bench_bot"}
+
+
+# ── Bot API stand-in ──────────────────────────────────────────────────
+class _BotAPIStandIn(RequestHandler):
+    """جایگزین محلی Bot API تلگرام: getMe / getUpdates / sendMessage و بقیه"""
+
+    def initialize(self, state: dict):
+        self.state = state
+
+    def _params(self) -> dict:
+        if self.request.body:
+            try:
+                return json.loads(self.request.body)
+            except ValueError:
+                pass
+        return {k: self.get_argument(k) for k in self.request.arguments}
+
+    async def post(self, method: str):
+        params = self._params()
+        result: object = True
+        if method == "getMe":
+            result = _BOT_USER
+        elif method == "getUpdates":
+            offset = int(params.get("offset") or 0)
+            pending = self.state["pending"]
+            while pending and pending[0]["update_id"] < offset:
+                pending.pop(0)
+            if not pending:
+                await asyncio.sleep(0.05)
+            result = pending[:100]
+        elif method == "sendMessage":
+            self.state["sent"] += 1
+            result = {
+                "message_id": self.state["sent"],
+                "date": int(time.time()),
+                "chat": {"id": int(params["chat_id"]), "type": "private"},
+                "from": _BOT_USER,
+                "text": params.get("text", ""),
+            }
+        elif method == "sendPhoto":
+            self.state["sent"] += 1
+            self.state["uploaded_bytes"] = self.state.get("uploaded_bytes", 0) + len(self.request.body)
+            n = self.state["sent"]
+            result = {
+                "message_id": n,
+                "date": int(time.time()),
+                "chat": {"id": int(params["chat_id"]), "type": "private"},
+                "from": _BOT_USER,
+                "photo": [{"file_id": f"photo-{n}", "file_unique_id": f"u{n}", "width": 800, "height": 400}],
+            }
+        self.write({"ok": True, "result": result})
+
+    get = post
+
+
+def _start_stand_in(state: dict) -> tuple[HTTPServer, str]:
+    app = TornadoApplication([(r"/bot[^/]+/(\w+)", _BotAPIStandIn, {"state": state})])
+    server = HTTPServer(app)
+    sockets = bind_sockets(0, "127.0.0.1")
+    server.add_sockets(sockets)
+    port = sockets[0].getsockname()[1]
+    return server, f"http://127.0.0.1:{port}/bot"
+
+
+def _fake_update(update_id: int) -> dict:
+    user_id = 1000 + update_id % 50
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(datetime.now().timestamp()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "u"},
+            "text": "🪙قیمت طلا",
+        },
+    }
+
+
+def _build_app(base_url: str, done: asyncio.Event, total: int) -> Application:
+    """اپلیکیشن با هندلر یکسان برای هر دو حالت"""
+    counter = {"n": 0}
+
+    async def echo(update: Update, context):
+        await update.message.reply_text(update.message.text)
+        counter["n"] += 1
+        if counter["n"] >= total:
+            done.set()
+
+    app = Application.builder().token(BENCH_TOKEN).base_url(base_url).concurrent_updates(64).build()
+    app.add_handler(MessageHandler(filters.TEXT, echo))
+    return app
+
+
+# ── Benchmarks ────────────────────────────────────────────────────────
+async def _bench_polling(total: int) -> float:
+    state = {"pending": [_fake_update(i) for i in range(1, total + 1)], "sent": 0}
+    server, base_url = _start_stand_in(state)
+    done = asyncio.Event()
+    app = _build_app(base_url, done, total)
+    try:
+        async with app:
+            started = time.perf_counter()
+            await app.updater.start_polling(poll_interval=0, timeout=0)
+            await app.start()
+            await done.wait()
+            elapsed = time.perf_counter() - started
+            await app.updater.stop()
+            await app.stop()
+    finally:
+        server.stop()
+    return elapsed
+
+
+async def _bench_webhook(total: int, port: int) -> float:
+    state = {"pending": [], "sent": 0}
+    server, base_url = _start_stand_in(state)
+    done = asyncio.Event()
+    stop = asyncio.Event()
+    app = _build_app(base_url, done, total)
+    secret = "bench-secret"
+    serving = asyncio.create_task(serve_webhook(
+        app, listen="127.0.0.1", port=port, path="/telegram",
+        secret_token=secret, webhook_url=None, stop_event=stop,
+    ))
+    url = f"http://127.0.0.1:{port}"
+    try:
+        async with httpx.AsyncClient(limits=httpx.Limits(max_connections=32)) as client:
+            while True:
+                if serving.done():
+                    serving.result()
+                try:
+                    if (await client.get(f"{url}/healthz")).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                await asyncio.sleep(0.05)
+
+            sem = asyncio.Semaphore(32)
+
+            async def post(i: int):
+                async with sem:
+                    resp = await client.post(
+                        f"{url}/telegram",
+                        json=_fake_update(i),
+                        headers={"X-Telegram-Bot-Api-Secret-Token": secret},
+                    )
+                    resp.raise_for_status()
+
+            started = time.perf_counter()
+            await asyncio.gather(*(post(i) for i in range(1, total + 1)))
+            await done.wait()
+            elapsed = time.perf_counter() - started
+    finally:
+        stop.set()
+        await serving
+        server.stop()
+    return elapsed
+
+
+def bench_webhook(args):
+    polling = asyncio.run(_bench_polling(args.updates))
+    webhook = asyncio.run(_bench_webhook(args.updates, args.port))
+    print(f"updates: {args.updates}")
+    print(f"polling: {polling:.3f}s  ({args.updates / polling:,.0f} updates/s)")
+    print(f"webhook: {webhook:.3f}s  ({args.updates / webhook:,.0f} updates/s)")
+
+
+# ── Startup ───────────────────────────────────────────────────────────
+# توی یک پروسه‌ی تازه اجرا میشه تا ایمپورت‌ها واقعاً سرد باشن
+_STARTUP_CHILD = """
+import json, sys, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter() - started
+ai_loaded_at_import = "langgraph" in sys.modules
+
+import asyncio
+from telegram import Update
+
+async def run():
+    app = main.build_app(token=sys.argv[1], base_url=sys.argv[2])
+    async with app:
+        update = Update.de_json(json.loads(sys.argv[3]), app.bot)
+        await app.process_update(update)
+    first_response = time.perf_counter() - started
+
+    import bot_ai
+    t = time.perf_counter()
+    await bot_ai.get_agent()
+    ai_load = time.perf_counter() - t
+    return first_response, ai_load
+
+first_response, ai_load = asyncio.run(run())
+print(json.dumps({
+    "import": imported,
+    "first_response": first_response,
+    "ai_load": ai_load,
+    "ai_loaded_at_import": ai_loaded_at_import,
+}))
+"""
+
+
+async def _bench_startup(runs: int) -> list[dict]:
+    state = {"pending": [], "sent": 0}
+    server, base_url = _start_stand_in(state)
+    update = _fake_update(1)
+    update["message"]["text"] = "/start"
+    update["message"]["entities"] = [{"type": "bot_command", "offset": 0, "length": 6}]
+    env = {**os.environ, "API_TELEGRAM": BENCH_TOKEN, "API_AI": os.getenv("API_AI", "bench"), "AI_WARMUP": "0"}
+    results = []
+    try:
+        for _ in range(runs):
+            proc = await asyncio.create_subprocess_exec(
+                sys.executable, "-c", _STARTUP_CHILD, BENCH_TOKEN, base_url, json.dumps(update),
+                env=env, stdout=asyncio.subprocess.PIPE,
+            )
+            out, _ = await proc.communicate()
+            if proc.returncode != 0:
+                raise RuntimeError(f"startup child exited with {proc.returncode}")
+            results.append(json.loads(out.decode().strip().splitlines()[-1]))
+    finally:
+        server.stop()
+    if state["sent"] < runs:
+        raise RuntimeError("/start was not answered")
+    return results
+
+
+def bench_startup(args):
+    results = asyncio.run(_bench_startup(args.runs))
+    print(f"runs: {args.runs}  (AI imported by main: {results[0]['ai_loaded_at_import']})")
+    for key, label in (
+        ("import", "import main"),
+        ("first_response", "first /start reply"),
+        ("ai_load", "AI load (lazy)"),
+    ):
+        values = [r[key] for r in results]
+        print(f"{label:<20} median {statistics.median(values) * 1000:8.1f} ms   max {max(values) * 1000:8.1f} ms")
+
+
+# ── Keyboards ─────────────────────────────────────────────────────────
+def _measure(func, iterations: int) -> tuple[float, int]:
+    """(میکروثانیه برای هر فراخوانی، بیشترین حافظه‌ی گرفته‌شده در یک فراخوانی به بایت)"""
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    per_call = (time.perf_counter() - started) / iterations * 1e6
+
+    tracemalloc.start()
+    try:
+        peak = 0
+        for _ in range(min(iterations, 200)):
+            base = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            func()
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - base)
+    finally:
+        tracemalloc.stop()
+    return per_call, peak
+
+
+def bench_keyboards(args):
+    import ui
+
+    today = datetime.now().date()
+    cases = [
+        ("city keyboard", lambda: ui._build_city_keyboard("weather_city_current"),
+         lambda: ui.city_keyboard("weather_city_current")),
+        ("forecast dates", lambda: ui._build_forecast_dates_keyboard(today), ui.forecast_dates_keyboard),
+    ]
+    print(f"iterations: {args.iterations}")
+    print(f"{'':<16}{'rebuild':>22}{'registry':>22}")
+    for name, rebuild, cached in cases:
+        old_us, old_bytes = _measure(rebuild, args.iterations)
+        new_us, new_bytes = _measure(cached, args.iterations)
+        print(
+            f"{name:<16}{old_us:>10.2f} us {old_bytes:>7} B"
+            f"{new_us:>10.2f} us {new_bytes:>7} B"
+        )
+
+
+# ── Price Alerts ──────────────────────────────────────────────────────
+def bench_alerts(args):
+    from alerts import ABOVE, BELOW, AlertIndex
+    from gold import CRYPTO_ITEMS, CURRENCY_ITEMS, GOLD_ITEMS
+
+    rng = random.Random(1)
+    keys = [key for key, _ in GOLD_ITEMS + CURRENCY_ITEMS] + [item[0] for item in CRYPTO_ITEMS]
+    base = {key: rng.uniform(1_000, 10_000_000) for key in keys}
+    alerts = []
+    for i in range(args.alerts):
+        key = rng.choice(keys)
+        if i % 2:
+            alerts.append((i % 50_000, key, ABOVE, base[key] * rng.uniform(1.0001, 1.2)))
+        else:
+            alerts.append((i % 50_000, key, BELOW, base[key] * rng.uniform(0.8, 0.9999)))
+    # قیمت‌ها نسبت به اسنپ‌شات قبلی حداکثر ±move درصد جابجا میشن
+    moved = {key: {"p": f"{price * (1 + rng.uniform(-args.move, args.move) / 100):,.2f}"} for key, price in base.items()}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = AlertIndex(os.path.join(tmp, "alerts.db"))
+        started = time.perf_counter()
+        index.add_many(alerts)
+        load = time.perf_counter() - started
+        base_data = {key: {"p": f"{price:,.2f}"} for key, price in base.items()}
+        index.evaluate(base_data)
+
+        # روش ساده: بررسی تک‌تک هشدارها با هر اسنپ‌شات
+        started = time.perf_counter()
+        naive = 0
+        for _, key, direction, threshold in alerts:
+            new = float(moved[key]["p"].replace(",", ""))
+            old = base[key]
+            if direction == ABOVE and old < threshold <= new or direction == BELOW and new <= threshold < old:
+                naive += 1
+        scan = time.perf_counter() - started
+
+        started = time.perf_counter()
+        triggered = index.evaluate(moved, base_data)
+        indexed = time.perf_counter() - started
+        index.close()
+
+    print(f"alerts: {args.alerts}  keys: {len(keys)}  price move: ±{args.move}%")
+    print(f"bulk insert + index: {load * 1000:8.1f} ms")
+    print(f"full scan:           {scan * 1000:8.1f} ms  ({naive} triggered)")
+    print(f"bisect index:        {indexed * 1000:8.1f} ms  ({len(triggered)} triggered, incl. SQLite delete)")
+
+
+# ── Charts ──────────────────────────────────────────────────────────
+async def _bench_charts(requests: int) -> dict:
+    import charts
+    import price_history
+    from telegram import Message
+
+    # تاریخچه‌ی مصنوعی ۲۴ ساعت با نمونه‌ی هر دقیقه
+    history = price_history.PriceHistory(capacity=24 * 60)
+    now = time.time()
+    rng = random.Random(1)
+    price = 600_000.0
+    for i in range(24 * 60):
+        price *= 1 + rng.uniform(-0.001, 0.001)
+        history.record({"price_dollar_rl": {"p": f"{price:,.0f}"}}, now - (24 * 60 - i) * 60)
+    price_history._history = history
+
+    state = {"pending": [], "sent": 0}
+    server, base_url = _start_stand_in(state)
+    app = Application.builder().token(BENCH_TOKEN).base_url(base_url).build()
+    results = {}
+    try:
+        async with app:
+            message = Message.de_json({
+                "message_id": 1, "date": int(now),
+                "chat": {"id": 1, "type": "private"}, "from": {"id": 1, "is_bot": False, "first_name": "u"},
+                "text": "/chart usd",
+            }, app.bot)
+            for label in ("cold", "warm"):
+                timings = []
+                uploaded = state.get("uploaded_bytes", 0)
+                for i in range(requests if label == "warm" else 1):
+                    if label == "cold":
+                        charts._images.clear()
+                        charts._file_ids.clear()
+                    started = time.perf_counter()
+                    path = await charts.send_chart(message, "price_dollar_rl", "24h")
+                    timings.append(time.perf_counter() - started)
+                results[label] = (path, statistics.median(timings), state.get("uploaded_bytes", 0) - uploaded)
+    finally:
+        server.stop()
+    return results
+
+
+def bench_charts(args):
+    results = asyncio.run(_bench_charts(args.requests))
+    for label, (path, median, uploaded) in results.items():
+        print(f"{label:<5} ({path:<8}) median {median * 1000:8.1f} ms   uploaded {uploaded:>8,} B")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="name", required=True)
+
+    p = sub.add_parser("webhook", help="polling در مقابل webhook با هندلرهای یکسان")
+    p.add_argument("--updates", type=int, default=2000)
+    p.add_argument("--port", type=int, default=8787)
+    p.set_defaults(func=bench_webhook)
+
+    p = sub.add_parser("startup", help="زمان ایمپورت و اولین جواب ربات در یک پروسه‌ی تازه")
+    p.add_argument("--runs", type=int, default=5)
+    p.set_defaults(func=bench_startup)
+
+    p = sub.add_parser("keyboards", help="ساخت کیبورد در هر آپدیت در مقابل رجیستری آماده")
+    p.add_argument("--iterations", type=int, default=20000)
+    p.set_defaults(func=bench_keyboards)
+
+    p = sub.add_parser("alerts", help="بررسی هشدارهای قیمت روی یک اسنپ‌شات")
+    p.add_argument("--alerts", type=int, default=100_000)
+    p.add_argument("--move", type=float, default=1.0, help="حداکثر تغییر قیمت (درصد)")
+    p.set_defaults(func=bench_alerts)
+
+    p = sub.add_parser("charts", help="نمودار: رندر و آپلود اول در مقابل ارسال دوباره با file_id")
+    p.add_argument("--requests", type=int, default=20)
+    p.set_defaults(func=bench_charts)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
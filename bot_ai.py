@@ -1,7 +1,11 @@
+import asyncio
 import os
 import logging
+import time
 from dotenv import load_dotenv
 from telegram import Update
+from telegram.constants import MessageLimit
+from telegram.error import BadRequest, RetryAfter, TelegramError
 from telegram.ext import (
     ApplicationBuilder,
     ContextTypes,
@@ -10,11 +14,17 @@ from telegram.ext import (
     filters,
 )
 
-# ایمپورت کردن کلاسی که ساختیم
-from main_ai import AIAgent
+# main_ai (langgraph / langchain) فقط موقع اولین استفاده ایمپورت میشه؛ get_agent رو ببین
+from llm_limiter import LLMBusyError
+from webhook import run_bot
 
 load_dotenv()
 TOKEN = os.getenv("BOT_TOKEN")
+# نمایش تدریجی جواب (با ویرایش پیام) به جای صبر برای کل جواب
+AI_STREAM_REPLIES = os.getenv("AI_STREAM_REPLIES", "1") == "1"
+# فاصله‌ی بین دو ویرایش یک پیام (ثانیه)؛ تلگرام ویرایش‌های پشت سر هم رو محدود می‌کنه
+AI_STREAM_EDIT_INTERVAL = float(os.getenv("AI_STREAM_EDIT_INTERVAL", "1.0"))
+AI_STREAM_GROUP_EDIT_INTERVAL = float(os.getenv("AI_STREAM_GROUP_EDIT_INTERVAL", "3.0"))
 
 # تنظیمات لاگ (برای اینکه بفهمیم چی به چیه)
 logging.basicConfig(
@@ -22,16 +32,199 @@ logging.basicConfig(
     level=logging.INFO
 )
 
-# ساخت یک نمونه از هوش مصنوعی (بیرون توابع که فقط یکبار ساخته بشه)
-print("Loading AI Model...")
-ai_brain = AIAgent()
-print("AI Model Loaded!")
+# نمونه‌ی هوش مصنوعی فقط یکبار و با تأخیر ساخته میشه (اولین پیام AI یا warm-up
+# بعد از بالا اومدن ربات) تا قیمت و آب و هوا بدون صبر برای لود LLM جواب بدن
+_ai_brain = None
+_ai_loading: asyncio.Future | None = None
+
+
+def _load_agent():
+    from main_ai import AIAgent
+
+    print("Loading AI Model...")
+    agent = AIAgent()
+    print("AI Model Loaded!")
+    return agent
+
+
+async def get_agent():
+    """نمونه‌ی مشترک AIAgent؛ لود سنگین در یک thread جدا و فقط یکبار انجام میشه"""
+    global _ai_brain, _ai_loading
+    if _ai_brain is not None:
+        return _ai_brain
+    if _ai_loading is None:
+        _ai_loading = asyncio.ensure_future(asyncio.to_thread(_load_agent))
+    loading = _ai_loading
+    try:
+        _ai_brain = await asyncio.shield(loading)
+    except Exception:
+        # مثلاً API_AI تنظیم نشده؛ دفعه‌ی بعد دوباره امتحان میشه
+        if _ai_loading is loading:
+            _ai_loading = None
+        raise
+    return _ai_brain
+
+
+async def warm_up_agent():
+    """لود AI در پس‌زمینه بعد از استارت ربات"""
+    try:
+        await get_agent()
+    except Exception as e:
+        logging.error(f"AI warm-up failed: {e}")
+
+
+async def _post_init(application):
+    application.create_task(warm_up_agent())
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(
         "سلام! من به مدل Llama 3 متصل هستم. هر سوالی داری بپرس!"
     )
 
+# آمار زمان تا اولین متن قابل مشاهده (time-to-first-visible-text)
+_stream_stats = {"replies": 0, "first_text_total": 0.0, "first_text_max": 0.0, "edits": 0}
+
+
+def stream_stats() -> dict:
+    replies = _stream_stats["replies"]
+    return {
+        **_stream_stats,
+        "first_text_avg": _stream_stats["first_text_total"] / replies if replies else 0.0,
+    }
+
+
+def answer_cache_stats() -> dict | None:
+    """آمار کش جواب‌های AI (None یعنی کش خاموشه یا AI هنوز لود نشده)"""
+    return _ai_brain.answer_cache_stats() if _ai_brain is not None else None
+
+
+def _split_point(text: str, limit: int = MessageLimit.MAX_TEXT_LENGTH) -> int:
+    """جای مناسب برای شکستن متن طولانی (ترجیحاً سر خط یا فاصله)"""
+    if len(text) <= limit:
+        return len(text)
+    cut = text.rfind("\n", 0, limit)
+    if cut < limit // 2:
+        cut = text.rfind(" ", 0, limit)
+    if cut < limit // 2:
+        cut = limit
+    return cut
+
+
+def _retry_seconds(error: RetryAfter) -> float:
+    retry_after = error.retry_after
+    return float(retry_after.total_seconds() if hasattr(retry_after, "total_seconds") else retry_after)
+
+
+def _split_text(text: str) -> list[str]:
+    parts = []
+    while text:
+        cut = _split_point(text)
+        parts.append(text[:cut])
+        text = text[cut:].lstrip("\n")
+    return parts
+
+
+class _StreamingReply:
+    """
+    یک جواب در حال ساخت: اولین تیکه‌ی متن سریع ارسال میشه و بعد با فاصله‌ی
+    حداقل interval ثانیه ویرایش میشه. متن‌های بلندتر از حد تلگرام در پیام‌های
+    بعدی ادامه پیدا می‌کنن.
+    """
+
+    def __init__(self, message, interval: float):
+        self.message = message
+        self.interval = interval
+        self.current = None      # پیامی که الان داره ویرایش میشه
+        self.shown = ""          # متنی که الان تو اون پیام دیده میشه
+        self.buffer = ""         # متن کامل پیام فعلی
+        self.next_edit_at = 0.0
+        self.started = time.monotonic()
+        self.first_text_after: float | None = None
+
+    async def _send(self, text: str):
+        self.current = await self.message.reply_text(text)
+        self.shown = text
+        self.next_edit_at = time.monotonic() + self.interval
+        if self.first_text_after is None:
+            self.first_text_after = time.monotonic() - self.started
+
+    async def _edit(self, text: str, force: bool = False):
+        if text == self.shown:
+            return
+        if not force and time.monotonic() < self.next_edit_at:
+            return
+        try:
+            await self._apply_edit(text)
+        except RetryAfter as e:
+            # ویرایش بعدی رو عقب میندازیم؛ متن کامل در flush نهایی ارسال میشه
+            retry_after = _retry_seconds(e)
+            self.next_edit_at = time.monotonic() + retry_after
+            if not force:
+                return
+            # flush اجباری (آخر جواب یا مرز پیام): صبر و دوباره؛ این متن نباید گم بشه
+            await asyncio.sleep(retry_after)
+            try:
+                await self._apply_edit(text)
+            except TelegramError as e:
+                logging.warning(f"AI stream edit failed, sending the rest as a new message: {e}")
+                await self._send_rest(text)
+
+    async def _apply_edit(self, text: str):
+        try:
+            await self.current.edit_text(text)
+        except BadRequest as e:
+            if "not modified" not in str(e).lower():
+                raise
+        self.shown = text
+        _stream_stats["edits"] += 1
+        self.next_edit_at = time.monotonic() + self.interval
+
+    async def _send_rest(self, text: str):
+        """ادامه‌ی متنی که با ویرایش نشد نشونش داد، در یک پیام جدید"""
+        rest = text[len(self.shown):] if text.startswith(self.shown) else text
+        rest = rest.strip() or text
+        try:
+            self.current = await self.message.reply_text(rest)
+        except RetryAfter as e:
+            await asyncio.sleep(_retry_seconds(e))
+            self.current = await self.message.reply_text(rest)
+        self.shown = rest
+
+    async def feed(self, chunk: str):
+        self.buffer += chunk
+        # متن از حد یک پیام تلگرام بیشتر شد → بستن پیام فعلی و ادامه در پیام جدید
+        while len(self.buffer) > MessageLimit.MAX_TEXT_LENGTH:
+            cut = _split_point(self.buffer)
+            head, self.buffer = self.buffer[:cut], self.buffer[cut:].lstrip("\n")
+            if self.current is None:
+                await self._send(head)
+            else:
+                await self._edit(head, force=True)
+            self.current = None
+            self.shown = ""
+        if not self.buffer.strip():
+            return
+        if self.current is None:
+            await self._send(self.buffer)
+        else:
+            await self._edit(self.buffer)
+
+    async def finish(self):
+        if self.buffer.strip():
+            if self.current is None:
+                await self._send(self.buffer)
+            else:
+                await self._edit(self.buffer, force=True)
+        if self.first_text_after is not None:
+            _stream_stats["replies"] += 1
+            _stream_stats["first_text_total"] += self.first_text_after
+            _stream_stats["first_text_max"] = max(_stream_stats["first_text_max"], self.first_text_after)
+            logging.info(
+                f"AI stream: first text after {self.first_text_after:.2f}s, "
+                f"done after {time.monotonic() - self.started:.2f}s"
+            )
+
+
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     این هندلر پیام کاربر رو میگیره، میده به فایل ai_engine و جواب رو پس میده
@@ -43,13 +236,28 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await context.bot.send_chat_action(chat_id=update.effective_chat.id, action="typing")
     
     try:
+        ai_brain = await get_agent()
+        if AI_STREAM_REPLIES:
+            # ۲. نمایش تدریجی جواب با ویرایش پیام
+            interval = AI_STREAM_EDIT_INTERVAL
+            if update.effective_chat.type in ("group", "supergroup"):
+                interval = AI_STREAM_GROUP_EDIT_INTERVAL
+            reply = _StreamingReply(update.message, interval)
+            async for chunk in ai_brain.stream_chat(user_id=user_id, user_message=user_text):
+                await reply.feed(chunk)
+            await reply.finish()
+            return
+
         # ۲. ارسال پیام به کلاس هوش مصنوعی
         # (چون تابع chat رو async تعریف کردیم، اینجا await میذاریم)
         response = await ai_brain.chat(user_id=user_id, user_message=user_text)
         
-        # ۳. ارسال جواب به کاربر
-        await update.message.reply_text(response)
+        # ۳. ارسال جواب به کاربر (جواب‌های طولانی در چند پیام)
+        for part in _split_text(response):
+            await update.message.reply_text(part)
         
+    except LLMBusyError:
+        await update.message.reply_text("⏳ الان سرم خیلی شلوغه! لطفاً چند لحظه دیگه دوباره بپرس.")
     except Exception as e:
         logging.error(f"Error in AI generation: {e}")
         await update.message.reply_text("متاسفانه مشکلی در ارتباط با مغز هوش مصنوعی پیش آمد. 🤕")
@@ -59,15 +267,15 @@ def main():
         print("Error: BOT_TOKEN not found!")
         return
 
-    app = ApplicationBuilder().token(TOKEN).build()
+    app = ApplicationBuilder().token(TOKEN).post_init(_post_init).build()
 
     app.add_handler(CommandHandler("start", start))
     
     # فیلتر: همه پیام‌های متنی به جز دستورات (مثل /start)
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
 
-    print("Bot is polling...")
-    app.run_polling()
+    print("Bot is running...")
+    run_bot(app)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
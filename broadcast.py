@@ -0,0 +1,358 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from collections import deque
+from datetime import time as dtime
+from zoneinfo import ZoneInfo
+
+from telegram import Bot, InlineKeyboardButton, InlineKeyboardMarkup, Update
+from telegram.error import BadRequest, Forbidden, RetryAfter, TelegramError
+from telegram.ext import ContextTypes
+
+from gold import get_snapshot
+
+
+# ── Settings ──────────────────────────────────────────────────────────
+BROADCAST_DB = os.getenv("BROADCAST_DB", "broadcast.db")
+# سقف کلی تلگرام برای پیام‌های انبوه حدود ۳۰ پیام در ثانیه‌ست
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "30"))
+# فاصله‌ی دو پیام پشت سر هم به یک چت (گروه‌ها محدودیت سخت‌تری دارن)
+BROADCAST_CHAT_INTERVAL = float(os.getenv("BROADCAST_CHAT_INTERVAL", "1.0"))
+BROADCAST_GROUP_INTERVAL = float(os.getenv("BROADCAST_GROUP_INTERVAL", "3.0"))
+BROADCAST_WORKERS = int(os.getenv("BROADCAST_WORKERS", "8"))
+BROADCAST_MAX_RETRIES = int(os.getenv("BROADCAST_MAX_RETRIES", "3"))
+BROADCAST_CHECKPOINT_EVERY = int(os.getenv("BROADCAST_CHECKPOINT_EVERY", "50"))
+
+_tz = ZoneInfo(os.getenv("DIGEST_TZ", "Asia/Tehran"))
+_hour, _minute = (int(x) for x in os.getenv("DIGEST_TIME", "09:00").split(":"))
+DIGEST_TIME = dtime(_hour, _minute, tzinfo=_tz)
+
+
+def _retry_seconds(error: RetryAfter) -> float:
+    retry_after = error.retry_after
+    return float(retry_after.total_seconds() if hasattr(retry_after, "total_seconds") else retry_after)
+
+
+class RateLimiter:
+    """سقف سراسری: هر فراخوانی wait یک جایگاه زمانی به فاصله‌ی 1/rate رزرو می‌کنه"""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate
+        self._next = 0.0
+
+    async def wait(self):
+        now = time.monotonic()
+        slot = max(now, self._next)
+        self._next = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    def pause(self, seconds: float):
+        """بعد از RetryAfter هیچ پیامی تا seconds ثانیه‌ی دیگه فرستاده نمیشه"""
+        self._next = max(self._next, time.monotonic() + seconds)
+
+
+# ── Broadcaster ───────────────────────────────────────────────────────
+class Broadcaster:
+    """
+    ارسال یک پیام (یک یا چند تیکه‌ی از قبل رندرشده) به همه‌ی مشترک‌ها با سقف
+    سراسری BROADCAST_RATE و فاصله‌ی حداقلی بین پیام‌های یک چت. مشترک‌ها به
+    ترتیب chat_id فرستاده میشن و آخرین chat_id که همه‌ی قبلی‌هاش تموم شدن
+    مرتب ذخیره میشه؛ بعد از ری‌استارت ارسال از همون‌جا ادامه پیدا می‌کنه.
+    """
+
+    def __init__(
+        self,
+        path: str = BROADCAST_DB,
+        rate: float = BROADCAST_RATE,
+        workers: int = BROADCAST_WORKERS,
+        chat_interval: float = BROADCAST_CHAT_INTERVAL,
+        group_interval: float = BROADCAST_GROUP_INTERVAL,
+    ):
+        self._conn = sqlite3.connect(path, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS subscribers ("
+            " chat_id INTEGER PRIMARY KEY,"
+            " is_group INTEGER NOT NULL DEFAULT 0,"
+            " created_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS broadcasts ("
+            " id INTEGER PRIMARY KEY,"
+            " parts TEXT NOT NULL,"
+            " cursor INTEGER NOT NULL DEFAULT -9223372036854775808,"
+            " sent INTEGER NOT NULL DEFAULT 0,"
+            " failed INTEGER NOT NULL DEFAULT 0,"
+            " created_at REAL NOT NULL,"
+            " finished_at REAL)"
+        )
+        self.limiter = RateLimiter(rate)
+        self.workers = workers
+        self.chat_interval = chat_interval
+        self.group_interval = group_interval
+        self._running: asyncio.Task | None = None
+
+    # ── Subscribers ──
+    def subscribe(self, chat_id: int, is_group: bool = False):
+        self._conn.execute(
+            "INSERT OR IGNORE INTO subscribers (chat_id, is_group, created_at) VALUES (?, ?, ?)",
+            (chat_id, int(is_group), time.time()),
+        )
+
+    def unsubscribe(self, chat_id: int):
+        self._conn.execute("DELETE FROM subscribers WHERE chat_id = ?", (chat_id,))
+
+    def is_subscribed(self, chat_id: int) -> bool:
+        return self._conn.execute("SELECT 1 FROM subscribers WHERE chat_id = ?", (chat_id,)).fetchone() is not None
+
+    def subscriber_count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM subscribers").fetchone()[0]
+
+    # ── Broadcasts ──
+    @property
+    def running(self) -> bool:
+        return self._running is not None and not self._running.done()
+
+    def create(self, parts: list[str]) -> int:
+        cursor = self._conn.execute(
+            "INSERT INTO broadcasts (parts, created_at) VALUES (?, ?)", (json.dumps(parts), time.time())
+        )
+        return cursor.lastrowid
+
+    def unfinished(self) -> list[int]:
+        rows = self._conn.execute("SELECT id FROM broadcasts WHERE finished_at IS NULL ORDER BY id").fetchall()
+        return [row[0] for row in rows]
+
+    def start(self, bot: Bot) -> asyncio.Task | None:
+        """اجرای همه‌ی ارسال‌های تموم‌نشده (به ترتیب) در پس‌زمینه"""
+        if self.running or not self.unfinished():
+            return None
+        self._running = asyncio.create_task(self._run_all(bot))
+        return self._running
+
+    async def _run_all(self, bot: Bot):
+        last_id = 0
+        # ارسال‌هایی که وسط کار اضافه میشن هم همین‌جا برداشته میشن
+        while ids := [i for i in self.unfinished() if i > last_id]:
+            for broadcast_id in ids:
+                last_id = broadcast_id
+                try:
+                    await self.run(bot, broadcast_id)
+                except Exception as e:
+                    logging.error(f"Broadcast {broadcast_id} failed: {e}")
+
+    async def _send(self, bot: Bot, chat_id: int, is_group: bool, parts: list[str]) -> bool:
+        """ارسال همه‌ی تیکه‌ها به یک چت. False یعنی ارسال ناموفق بود"""
+        interval = self.group_interval if is_group else self.chat_interval
+        last_sent = 0.0
+        for part in parts:
+            for attempt in range(BROADCAST_MAX_RETRIES + 1):
+                wait = last_sent + interval - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                await self.limiter.wait()
+                try:
+                    await bot.send_message(chat_id, part)
+                    last_sent = time.monotonic()
+                    break
+                except RetryAfter as e:
+                    # محدودیت تلگرام: کل صف عقب میفته، نه فقط این چت
+                    self.limiter.pause(_retry_seconds(e))
+                    if attempt == BROADCAST_MAX_RETRIES:
+                        return False
+                except Forbidden:
+                    # ربات بلاک شده یا از گروه حذف شده
+                    self.unsubscribe(chat_id)
+                    return False
+                except BadRequest as e:
+                    if "chat not found" in str(e).lower():
+                        self.unsubscribe(chat_id)
+                    return False
+                except TelegramError as e:
+                    if attempt == BROADCAST_MAX_RETRIES:
+                        logging.warning(f"Broadcast to {chat_id} failed: {e}")
+                        return False
+                    await asyncio.sleep(1.0 + attempt)
+        return True
+
+    def _subscribers_after(self, cursor: int, limit: int = 500) -> list[tuple[int, int]]:
+        return self._conn.execute(
+            "SELECT chat_id, is_group FROM subscribers WHERE chat_id > ? ORDER BY chat_id LIMIT ?",
+            (cursor, limit),
+        ).fetchall()
+
+    async def run(self, bot: Bot, broadcast_id: int):
+        row = self._conn.execute(
+            "SELECT parts, cursor, sent, failed FROM broadcasts WHERE id = ?", (broadcast_id,)
+        ).fetchone()
+        if row is None:
+            return
+        parts = json.loads(row[0])
+        cursor, sent, failed = row[1], row[2], row[3]
+
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.workers * 2)
+        dispatched: deque[int] = deque()  # chat_idها به ترتیب ارسال
+        done: set[int] = set()
+        since_checkpoint = 0
+
+        def checkpoint():
+            self._conn.execute(
+                "UPDATE broadcasts SET cursor = ?, sent = ?, failed = ? WHERE id = ?",
+                (cursor, sent, failed, broadcast_id),
+            )
+
+        async def worker():
+            nonlocal cursor, sent, failed, since_checkpoint
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                chat_id, is_group = item
+                # خطای غیرتلگرامی (مثلاً قفل دیتابیس) نباید worker رو بکشه؛
+                # وگرنه queue.put تولیدکننده تا ابد منتظر می‌مونه
+                try:
+                    ok = await self._send(bot, chat_id, bool(is_group), parts)
+                except Exception as e:
+                    logging.warning(f"Broadcast to {chat_id} failed: {e}")
+                    ok = False
+                if ok:
+                    sent += 1
+                else:
+                    failed += 1
+                done.add(chat_id)
+                # cursor فقط تا جایی جلو میره که همه‌ی چت‌های قبلی تموم شده باشن
+                while dispatched and dispatched[0] in done:
+                    cursor = dispatched.popleft()
+                    done.discard(cursor)
+                since_checkpoint += 1
+                if since_checkpoint >= BROADCAST_CHECKPOINT_EVERY:
+                    since_checkpoint = 0
+                    try:
+                        checkpoint()
+                    except sqlite3.Error as e:
+                        # checkpoint بعدی دوباره امتحان می‌کنه
+                        logging.warning(f"Broadcast {broadcast_id} checkpoint failed: {e}")
+
+        tasks = [asyncio.create_task(worker()) for _ in range(self.workers)]
+        try:
+            last = cursor
+            while page := self._subscribers_after(last):
+                for chat_id, is_group in page:
+                    dispatched.append(chat_id)
+                    await queue.put((chat_id, is_group))
+                last = page[-1][0]
+            for _ in tasks:
+                await queue.put(None)
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            checkpoint()
+
+        self._conn.execute("UPDATE broadcasts SET finished_at = ? WHERE id = ?", (time.time(), broadcast_id))
+        logging.info(f"Broadcast {broadcast_id} finished: {sent} sent, {failed} failed")
+
+    def stats(self) -> dict:
+        row = self._conn.execute(
+            "SELECT id, sent, failed, finished_at FROM broadcasts ORDER BY id DESC LIMIT 1"
+        ).fetchone()
+        return {
+            "subscribers": self.subscriber_count(),
+            "running": self.running,
+            "last": None if row is None else {"id": row[0], "sent": row[1], "failed": row[2], "finished": row[3] is not None},
+        }
+
+    async def close(self):
+        """توقف ارسال در حال اجرا؛ checkpoint آخرش باید قبل از بستن دیتابیس نوشته بشه"""
+        if self._running is not None:
+            self._running.cancel()
+            try:
+                await self._running
+            except asyncio.CancelledError:
+                pass
+        self._conn.close()
+
+
+_broadcaster: Broadcaster | None = None
+
+
+def get_broadcaster() -> Broadcaster:
+    global _broadcaster
+    if _broadcaster is None:
+        _broadcaster = Broadcaster()
+    return _broadcaster
+
+
+async def close_broadcaster():
+    global _broadcaster
+    if _broadcaster is not None:
+        await _broadcaster.close()
+        _broadcaster = None
+
+
+# ── Daily Digest ──────────────────────────────────────────────────────
+def render_digest() -> list[str] | None:
+    """خلاصه‌ی روزانه از همون اسنپ‌شات get_gold_price/get_currency_price (یکبار برای همه)"""
+    snapshot = get_snapshot()
+    if snapshot is None:
+        return None
+    parts = [snapshot.messages[kind] for kind in ("gold", "currency", "crypto") if kind in snapshot.messages]
+    if not parts:
+        return None
+    parts[0] = "🗞 خلاصه‌ی روزانه‌ی قیمت‌ها\n\n" + parts[0]
+    return parts
+
+
+async def send_daily_digest(context: ContextTypes.DEFAULT_TYPE):
+    """جاب روزانه"""
+    broadcaster = get_broadcaster()
+    parts = render_digest()
+    if parts is None:
+        print("Digest Error: no price snapshot")
+        return
+    broadcaster.create(parts)
+    # اگه ارسال قبلی هنوز تموم نشده، این یکی بعدش برداشته میشه
+    broadcaster.start(context.bot)
+
+
+async def resume_broadcasts(application):
+    """بعد از ری‌استارت: ادامه‌ی ارسال‌های نیمه‌کاره از آخرین checkpoint"""
+    get_broadcaster().start(application.bot)
+
+
+def _digest_keyboard(subscribed: bool) -> InlineKeyboardMarkup:
+    if subscribed:
+        return InlineKeyboardMarkup([[InlineKeyboardButton("🔕 لغو اشتراک", callback_data="digest:off")]])
+    return InlineKeyboardMarkup([[InlineKeyboardButton("🔔 عضویت", callback_data="digest:on")]])
+
+
+async def digest_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    message = update.effective_message
+    chat = update.effective_chat
+    if message is None or chat is None:
+        return
+    subscribed = get_broadcaster().is_subscribed(chat.id)
+    status = "✅ عضو هستی" if subscribed else "❌ عضو نیستی"
+    await message.reply_text(
+        f"🗞 خلاصه‌ی روزانه‌ی قیمت طلا، ارز و رمز ارز (ساعت {DIGEST_TIME.strftime('%H:%M')})\n{status}",
+        reply_markup=_digest_keyboard(subscribed),
+    )
+
+
+async def toggle_digest(update: Update, context: ContextTypes.DEFAULT_TYPE, action: str):
+    """callback «digest:on» / «digest:off»"""
+    message = update.effective_message
+    chat = update.effective_chat
+    if message is None or chat is None:
+        return
+    broadcaster = get_broadcaster()
+    if action == "on":
+        broadcaster.subscribe(chat.id, is_group=chat.type in ("group", "supergroup"))
+        await message.reply_text("🔔 عضو خلاصه‌ی روزانه شدی.", reply_markup=_digest_keyboard(True))
+    else:
+        broadcaster.unsubscribe(chat.id)
+        await message.reply_text("🔕 اشتراک خلاصه‌ی روزانه لغو شد.", reply_markup=_digest_keyboard(False))
@@ -0,0 +1,159 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class TTLCache:
+    """
+    کش ساده با زمان انقضا + ادغام درخواست‌های همزمان (single-flight).
+    اگه چند نفر همزمان کلیدی رو بخوان که تو کش نیست، فقط یک درخواست واقعی زده میشه
+    و بقیه منتظر همون نتیجه می‌مونن.
+    با stale_ttl، مقدار منقضی‌شده تا این مدت بعد از انقضا برای get_or_revalidate نگه داشته میشه.
+    """
+
+    def __init__(self, ttl: float, maxsize: int | None = None, stale_ttl: float = 0.0):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.stale_ttl = stale_ttl
+        # key → (زمان انقضا، زمان ذخیره، مقدار)
+        self._data: OrderedDict[Hashable, tuple[float, float, Any]] = OrderedDict()
+        self._inflight: dict[Hashable, asyncio.Future] = {}
+        self._revalidating: set[asyncio.Task] = set()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.stale = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """مقدار معتبر کش یا default (بدون شمارش hit/miss)"""
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        expires_at, _, value = entry
+        now = time.monotonic()
+        if expires_at < now:
+            if expires_at + self.stale_ttl < now:
+                del self._data[key]
+            return default
+        if self.maxsize is not None:
+            # با سقف اندازه، ترتیب دیکشنری همون ترتیب LRU هست
+            self._data.move_to_end(key)
+        return value
+
+    def lookup(self, key: Hashable, default: Any = None) -> Any:
+        """مثل get ولی به عنوان hit/miss در stats شمرده میشه"""
+        value = self.get(key)
+        if value is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None):
+        """ذخیره‌ی مقدار با TTL پیش‌فرض یا دلخواه"""
+        now = time.monotonic()
+        self._data[key] = (now + (self.ttl if ttl is None else ttl), now, value)
+        self._data.move_to_end(key)
+        if self.maxsize is not None:
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_stale(self, key: Hashable) -> tuple[Any, float] | None:
+        """(مقدار، عمر به ثانیه) حتی اگه منقضی شده باشه، تا stale_ttl بعد از انقضا"""
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, stored_at, value = entry
+        now = time.monotonic()
+        if expires_at + self.stale_ttl < now:
+            del self._data[key]
+            return None
+        return value, now - stored_at
+
+    def invalidate(self, key: Hashable):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    async def get_or_fetch(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        مقدار کش‌شده رو برمی‌گردونه؛ در غیر این صورت fetch رو (فقط یک بار
+        برای همه‌ی درخواست‌های همزمان) صدا می‌زنه. مقدار None کش نمیشه.
+        """
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await fetch()
+        except BaseException as e:
+            future.set_exception(e)
+            # جلوگیری از هشدار "exception was never retrieved" وقتی منتظری نیست
+            future.exception()
+            raise
+        else:
+            if value is not None:
+                self.set(key, value)
+            future.set_result(value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    async def get_or_revalidate(
+        self,
+        key: Hashable,
+        fetch: Callable[[], Awaitable[Any]],
+        revalidate: Callable[[], Awaitable[Any]] | None = None,
+    ) -> tuple[Any, float | None]:
+        """
+        stale-while-revalidate: اگه مقدار منقضی شده ولی هنوز کهنه‌ی قابل قبوله،
+        همون فوراً برمی‌گرده و revalidate (پیش‌فرض fetch) در پس‌زمینه اجرا میشه.
+        خروجی: (مقدار، عمر مقدار کهنه به ثانیه یا None برای مقدار تازه)
+        """
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            return value, None
+        stale = self.get_stale(key)
+        if stale is None:
+            return await self.get_or_fetch(key, fetch), None
+
+        self.stale += 1
+        if key not in self._inflight:
+            task = asyncio.get_running_loop().create_task(self._revalidate(key, revalidate or fetch))
+            self._revalidating.add(task)
+            task.add_done_callback(self._revalidating.discard)
+        return stale
+
+    async def _revalidate(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]):
+        try:
+            await self.get_or_fetch(key, fetch)
+        except Exception:
+            # مقدار کهنه سر جاشه؛ دفعه‌ی بعد دوباره امتحان میشه
+            pass
+
+    def stats(self) -> dict:
+        """آمار استفاده برای تنظیم TTL"""
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "stale": self.stale,
+            "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,138 @@
+import asyncio
+import importlib.util
+import io
+import os
+from datetime import datetime
+
+from telegram import Message, Update
+from telegram.ext import ContextTypes
+
+from cache import TTLCache
+from gold import get_snapshot, lookup_symbol, symbol_for_key
+from price_history import WINDOWS, format_price, get_price_history
+
+# matplotlib فقط برای /chart لازمه و ایمپورتش چند صد میلی‌ثانیه طول می‌کشه؛
+# پس با اولین رندر لود میشه، نه موقع استارت ربات
+HAS_MATPLOTLIB = importlib.util.find_spec("matplotlib") is not None
+
+
+# ── Settings ──────────────────────────────────────────────────────────
+CHART_IMAGE_CACHE_SIZE = int(os.getenv("CHART_IMAGE_CACHE_SIZE", "64"))
+CHART_FILE_ID_CACHE_SIZE = int(os.getenv("CHART_FILE_ID_CACHE_SIZE", "1024"))
+CHART_CACHE_TTL = float(os.getenv("CHART_CACHE_TTL", str(24 * 60 * 60)))
+
+# کلید هر دو کش: (key تی‌جی‌جی‌یو، بازه، نسخه‌ی اسنپ‌شات)؛ با اسنپ‌شات جدید کلید عوض میشه
+_images = TTLCache(ttl=CHART_CACHE_TTL, maxsize=CHART_IMAGE_CACHE_SIZE)
+# file_id عکس‌هایی که قبلاً آپلود شدن → ارسال دوباره بدون رندر و بدون آپلود
+_file_ids = TTLCache(ttl=CHART_CACHE_TTL, maxsize=CHART_FILE_ID_CACHE_SIZE)
+_chart_stats = {"file_id": 0, "uploaded": 0, "rendered": 0}
+
+
+def chart_stats() -> dict:
+    return {**_chart_stats, "images": len(_images), "file_ids": len(_file_ids)}
+
+
+def render_chart(key: str, window: str) -> bytes | None:
+    """رسم نمودار PNG از تاریخچه‌ی محلی (None یعنی داده‌ای نیست)؛ داخل thread اجرا میشه"""
+    if not HAS_MATPLOTLIB:
+        raise RuntimeError("Charts need the 'matplotlib' package: pip install matplotlib")
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.dates as mdates
+    import matplotlib.ticker
+    from matplotlib.figure import Figure
+
+    series = get_price_history().series(key)
+    if series is None:
+        return None
+    times, values = series.points(WINDOWS[window])
+    if len(times) < 2:
+        return None
+
+    symbol = symbol_for_key(key)
+    scale = series.scale * symbol.factor
+    unit = "USD" if symbol.factor == 1 else "Toman"
+    x = [datetime.fromtimestamp(t) for t in times]
+    y = [v / scale for v in values]
+
+    # از API شیءگرای Figure استفاده می‌کنیم (pyplot سراسری و thread-safe نیست)
+    fig = Figure(figsize=(8, 4), dpi=100)
+    ax = fig.add_subplot()
+    ax.plot(x, y, color="#1f77b4", linewidth=1.5)
+    ax.fill_between(x, y, min(y), color="#1f77b4", alpha=0.1)
+    ax.set_title(f"{key} — {window}")
+    ax.set_ylabel(unit)
+    ax.grid(True, alpha=0.3)
+    ax.xaxis.set_major_formatter(mdates.DateFormatter("%H:%M" if window != "7d" else "%m-%d"))
+    ax.yaxis.set_major_formatter(matplotlib.ticker.StrMethodFormatter("{x:,.0f}" if scale > 1 else "{x:,.2f}"))
+    fig.autofmt_xdate()
+    fig.tight_layout()
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png")
+    return buffer.getvalue()
+
+
+async def _render(key: str, window: str) -> bytes | None:
+    image = await asyncio.to_thread(render_chart, key, window)
+    if image is not None:
+        _chart_stats["rendered"] += 1
+    return image
+
+
+async def send_chart(message: Message, key: str, window: str, caption: str | None = None) -> str | None:
+    """
+    ارسال نمودار: اول file_id (بدون رندر و آپلود)، بعد تصویر کش‌شده (فقط آپلود)
+    و در آخر رندر تازه. مسیر استفاده‌شده رو برمی‌گردونه؛ None یعنی داده‌ای نبود.
+    """
+    snapshot = get_snapshot()
+    cache_key = (key, window, snapshot.version if snapshot else 0)
+
+    file_id = _file_ids.lookup(cache_key)
+    if file_id is not None:
+        await message.reply_photo(file_id, caption=caption)
+        _chart_stats["file_id"] += 1
+        return "file_id"
+
+    cached = _images.get(cache_key) is not None
+    image = await _images.get_or_fetch(cache_key, lambda: _render(key, window))
+    if image is None:
+        return None
+    sent = await message.reply_photo(image, caption=caption)
+    _chart_stats["uploaded"] += 1
+    if sent.photo:
+        # بزرگ‌ترین سایز؛ تلگرام بقیه رو خودش می‌سازه
+        _file_ids.set(cache_key, sent.photo[-1].file_id)
+    return "image" if cached else "rendered"
+
+
+async def chart_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    message = update.effective_message
+    if message is None:
+        return
+    if not HAS_MATPLOTLIB:
+        await message.reply_text("📉 نمودار فعلاً در دسترس نیست.")
+        return
+    args = list(context.args or [])
+    window = "24h"
+    if args and args[-1].lower() in WINDOWS:
+        window = args.pop().lower()
+    symbol = lookup_symbol(" ".join(args)) if args else None
+    if symbol is None:
+        await message.reply_text(
+            "فرمت درست: /chart نماد [1h|24h|7d]\n"
+            "مثال: /chart geram18 24h  یا  /chart btc 7d"
+        )
+        return
+
+    series = get_price_history().series(symbol.key)
+    stats = series.stats(WINDOWS[window]) if series is not None else None
+    caption = None
+    if stats is not None:
+        caption = (
+            f"📈 {symbol.label} — {window}\n"
+            f"{format_price(symbol.key, stats['min'])} ← → {format_price(symbol.key, stats['max'])}  "
+            f"({stats['change_pct']:+.2f}%)"
+        )
+    if await send_chart(message, symbol.key, window, caption) is None:
+        await message.reply_text("هنوز داده‌ی کافی برای رسم نمودار این بازه ثبت نشده.")
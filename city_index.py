@@ -0,0 +1,123 @@
+from bisect import bisect_left
+
+from textnorm import normalize_persian_text
+
+
+# ── Normalization ─────────────────────────────────────────────────────
+# بعد از normalize_persian_text: آ → ا و حذف همه‌ی فاصله‌ها
+# ("خرم‌آباد"، "خرم آباد" و "خرماباد" یک کلید میشن)
+_CITY_CHAR_MAP = str.maketrans({"آ": "ا", " ": None})
+
+
+def city_key(text: str) -> str:
+    """کلید مقایسه‌ی اسم شهر"""
+    return normalize_persian_text(text).translate(_CITY_CHAR_MAP)
+
+
+def _max_distance(length: int) -> int:
+    """حداکثر غلط تایپی قابل قبول بر اساس طول اسم"""
+    if length < 3:
+        return 0
+    if length <= 5:
+        return 1
+    return 2
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """
+    فاصله‌ی ویرایشی (با جابه‌جایی دو حرف کنار هم)؛ به محض اینکه از limit
+    رد بشه limit + 1 برمی‌گردونه
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    before: list[int] | None = None
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i] + [0] * len(b)
+        best = i
+        for j, cb in enumerate(b, 1):
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb))
+            if before is not None and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                value = min(value, before[j - 2] + 1)
+            current[j] = value
+            best = min(best, value)
+        if best > limit:
+            return limit + 1
+        before, previous = previous, current
+    return previous[-1]
+
+
+# ── City Index ────────────────────────────────────────────────────────
+class CityIndex:
+    """
+    ایندکس آفلاین اسم شهرها: تطبیق دقیق روی کلید نرمال‌شده، جستجوی پیشوندی
+    با bisect و پیشنهاد با فاصله‌ی ویرایشی. هیچ درخواست شبکه‌ای نداره.
+    فاصله‌ی ویرایشی فقط برای پیشنهاده، نه تصحیح خودکار: خیلی از شهرهای واقعی
+    بیرون ایندکس (Milan، Bari، Arad) یک حرف با یکی از شهرهای ایندکس فرق دارن.
+    """
+
+    _MEMO_SIZE = 4096
+
+    def __init__(self, aliases: dict[str, str]):
+        self._exact: dict[str, str] = {}
+        # اسم فارسی هر شهر برای پیشنهاد
+        self.display: dict[str, str] = {}
+        for alias, city in aliases.items():
+            self._exact.setdefault(city_key(alias), city)
+            self._exact.setdefault(city_key(city), city)
+            self.display.setdefault(city, alias)
+        self._keys = sorted(self._exact)
+        self._memo: dict[str, list[str]] = {}
+        self.stats = {"exact": 0, "miss": 0, "suggested": 0}
+
+    def _fuzzy(self, key: str, limit: int) -> list[tuple[int, str]]:
+        """(فاصله، شهر) برای همه‌ی کلیدهای نزدیک، مرتب"""
+        found: dict[str, int] = {}
+        for candidate in self._keys:
+            distance = edit_distance(key, candidate, limit)
+            if distance <= limit:
+                city = self._exact[candidate]
+                found[city] = min(distance, found.get(city, distance))
+        return sorted((distance, city) for city, distance in found.items())
+
+    def resolve(self, text: str) -> str | None:
+        """
+        اسم استاندارد شهر با تطبیق دقیق روی کلید نرمال‌شده.
+        None یعنی شهر تو ایندکس نیست (و باید همون متن کاربر استفاده بشه).
+        """
+        key = city_key(text)
+        if not key:
+            return None
+        city = self._exact.get(key)
+        self.stats["exact" if city else "miss"] += 1
+        return city
+
+    def prefix(self, text: str) -> list[str]:
+        """همه‌ی شهرهایی که یکی از اسم‌هاشون با text شروع میشه"""
+        key = city_key(text)
+        cities: dict[str, None] = {}
+        if not key:
+            return []
+        i = bisect_left(self._keys, key)
+        while i < len(self._keys) and self._keys[i].startswith(key):
+            cities.setdefault(self._exact[self._keys[i]])
+            i += 1
+        return list(cities)
+
+    def suggest(self, text: str, limit: int = 3) -> list[str]:
+        """پیشنهاد اسم فارسی شهرها برای متنی که پیدا نشد: اول پیشوندی، بعد نزدیک‌ترین‌ها"""
+        key = city_key(text)
+        if not key:
+            return []
+        suggestions = self._memo.get(key)
+        if suggestions is None:
+            cities = dict.fromkeys(self.prefix(text))
+            for _, city in self._fuzzy(key, _max_distance(len(key)) + 1):
+                cities.setdefault(city)
+            suggestions = [self.display[city] for city in cities]
+            if len(self._memo) >= self._MEMO_SIZE:
+                self._memo.clear()
+            self._memo[key] = suggestions
+        if suggestions:
+            self.stats["suggested"] += 1
+        return suggestions[:limit]
@@ -1,7 +1,14 @@
-import requests
-from telegram import Update
+import os
+import time
+from typing import Awaitable, Callable, NamedTuple
+
+from telegram import ReplyParameters, Update
 from telegram.ext import ContextTypes
 
+from http_client import get_json
+from resilience import CircuitBreaker, CircuitOpenError
+from textnorm import normalize_persian_text
+
 
 # ── API URLs ──────────────────────────────────────────────────────────
 TGJU_API = (
@@ -9,21 +16,194 @@ TGJU_API = (
     "?rev=ZnJtH9UMnDmx3fRLiipjCG5wWUM8cdtyHqUyohjHGjQegGDp7Q573gVniUw3"
 )
 
+# فاصله‌ی به‌روزرسانی اسنپ‌شات قیمت‌ها (ثانیه)
+TGJU_REFRESH_INTERVAL = int(os.getenv("TGJU_REFRESH_INTERVAL", "60"))
+# اسنپ‌شاتی که از این قدیمی‌تر باشه با هشدار "سرویس در دسترس نیست" نشون داده میشه
+TGJU_STALE_AFTER = float(os.getenv("TGJU_STALE_AFTER", str(3 * TGJU_REFRESH_INTERVAL)))
+
+# فقط جاب پس‌زمینه به تی‌جی‌جی‌یو درخواست می‌زنه، پس همون جاب تست بازیابی هم هست
+_breaker = CircuitBreaker("TGJU")
+
+
+# ── Tracked Items ─────────────────────────────────────────────────────
+GOLD_ITEMS = [
+    ("geram18", "طلای ۱۸ عیار (هر گرم)"),
+    ("geram24", "طلای ۲۴ عیار (هر گرم)"),
+    ("mesghal", "مثقال طلا"),
+    ("sekee", "سکه امامی"),
+    ("sekeb", "سکه بهار آزادی"),
+    ("nim", "نیم سکه"),
+    ("rob", "ربع سکه"),
+    ("gerami", "سکه گرمی"),
+]
+
+CURRENCY_ITEMS = [
+    ("price_dollar_rl", "دلار آمریکا"),
+    ("price_eur", "یورو"),
+    ("price_gbp", "پوند انگلیس"),
+    ("price_aed", "درهم امارات"),
+    ("price_try", "لیر ترکیه"),
+    ("price_cny", "یوان چین"),
+    ("price_sar", "ریال عربستان"),
+    ("price_cad", "دلار کانادا"),
+    ("price_aud", "دلار استرالیا"),
+]
+
+CRYPTO_ITEMS = [
+    ("crypto-bitcoin", "crypto-bitcoin-irr", "بیت‌کوین", "BTC"),
+    ("crypto-ethereum", "crypto-ethereum-irr", "اتریوم", "ETH"),
+    ("crypto-tether", "crypto-tether-irr", "تتر", "USDT"),
+    ("crypto-binance-coin", "crypto-binance-coin-irr", "بایننس کوین", "BNB"),
+    ("crypto-solana", "crypto-solana-irr", "سولانا", "SOL"),
+    ("crypto-ripple", "crypto-ripple-irr", "ریپل", "XRP"),
+    ("crypto-cardano", "crypto-cardano-irr", "کاردانو", "ADA"),
+    ("crypto-dogecoin", "crypto-dogecoin-irr", "دوج‌کوین", "DOGE"),
+    ("crypto-toncoin", "crypto-toncoin-irr", "تون‌کوین", "TON"),
+    ("crypto-tron", "crypto-tron-irr", "ترون", "TRX"),
+    ("crypto-litecoin", "crypto-litecoin-irr", "لایت‌کوین", "LTC"),
+    ("crypto-chainlink", "crypto-chainlink-irr", "چین‌لینک", "LINK"),
+    ("crypto-polkadot", "crypto-polkadot-irr", "پولکادات", "DOT"),
+    ("crypto-avalanche", "crypto-avalanche-irr", "آوالانچ", "AVAX"),
+    ("crypto-monero", "crypto-monero-irr", "مونرو", "XMR"),
+]
+
+
+class PriceSymbol(NamedTuple):
+    """key در دیکشنری تی‌جی‌جی‌یو؛ factor: واحد API → واحد نمایش (ریال → تومان یا دلار → دلار)"""
+    key: str
+    label: str
+    factor: int
+
+
+def _build_symbols() -> dict[str, PriceSymbol]:
+    """اسم‌هایی که کاربر می‌تونه برای یک قیمت بنویسه (نرمال‌شده) → PriceSymbol"""
+    symbols: dict[str, PriceSymbol] = {}
+
+    def add(symbol: PriceSymbol, *aliases: str):
+        for alias in (symbol.key, *aliases):
+            symbols[normalize_persian_text(alias)] = symbol
+
+    for key, label in GOLD_ITEMS:
+        add(PriceSymbol(key, label, 10))
+    for key, label in CURRENCY_ITEMS:
+        add(PriceSymbol(key, label, 10), key.removeprefix("price_"), label)
+    for usd_key, irr_key, name, symbol in CRYPTO_ITEMS:
+        add(PriceSymbol(usd_key, name, 1), symbol, name)
+        add(PriceSymbol(irr_key, f"{name} (تومانی)", 10))
+    add(PriceSymbol("ons", "اونس جهانی طلا", 1), "اونس")
+    # اسم‌های کوتاه رایج
+    symbols["usd"] = symbols["دلار"] = symbols["price_dollar_rl"]
+    symbols["یورو"] = symbols["price_eur"]
+    symbols["طلا"] = symbols["gold"] = symbols["geram18"]
+    symbols["سکه"] = symbols["sekee"]
+    return symbols
+
+
+PRICE_SYMBOLS = _build_symbols()
+_SYMBOLS_BY_KEY = {symbol.key: symbol for symbol in PRICE_SYMBOLS.values()}
+
+
+def lookup_symbol(text: str) -> PriceSymbol | None:
+    return PRICE_SYMBOLS.get(normalize_persian_text(text))
+
+
+def symbol_for_key(key: str) -> PriceSymbol:
+    return _SYMBOLS_BY_KEY.get(key) or PriceSymbol(key, key, 1)
+
+
+def parse_price(value) -> float | None:
+    """قیمت تی‌جی‌جی‌یو (مثل '1,234,500') → عدد"""
+    try:
+        return float(str(value).replace(",", "").strip())
+    except (TypeError, ValueError):
+        return None
+
+
+# ── Price Snapshot ────────────────────────────────────────────────────
+class PriceSnapshot:
+    """
+    یک نسخه از دیکشنری current تی‌جی‌جی‌یو به همراه زمان دریافت، شماره نسخه
+    و متن آماده‌ی پیام‌ها (gold / currency / crypto) با نسخه‌ی جداگانه برای هر کدوم.
+    """
+
+    __slots__ = ("data", "version", "fetched_at", "messages", "message_versions")
+
+    def __init__(
+        self,
+        data: dict,
+        version: int,
+        fetched_at: float,
+        messages: dict[str, str] | None = None,
+        message_versions: dict[str, int] | None = None,
+    ):
+        self.data = data
+        self.version = version
+        self.fetched_at = fetched_at
+        self.messages = messages or {}
+        self.message_versions = message_versions or {}
+
+    @property
+    def age(self) -> float:
+        """چند ثانیه از دریافت این داده گذشته"""
+        return max(0.0, time.time() - self.fetched_at)
+
+
+_snapshot: PriceSnapshot | None = None
+# بعد از هر اسنپ‌شات جدید صدا زده میشن: listener(context, previous, snapshot)
+_snapshot_listeners: list[Callable[..., Awaitable[None]]] = []
+
+
+def get_snapshot() -> PriceSnapshot | None:
+    """آخرین اسنپ‌شات قیمت‌ها (بدون هیچ درخواست شبکه)"""
+    return _snapshot
+
+
+def add_snapshot_listener(listener: Callable[..., Awaitable[None]]):
+    _snapshot_listeners.append(listener)
+
+
+def _build_snapshot(data: dict, previous: PriceSnapshot | None) -> PriceSnapshot:
+    """
+    رندر یک‌باره‌ی هر سه پیام برای این داده. نسخه‌ی هر پیام فقط وقتی
+    بالا میره که متنش واقعاً عوض شده باشه.
+    """
+    messages = {kind: render(data) for kind, render in _RENDERERS.items()}
+    message_versions = {}
+    for kind, text in messages.items():
+        if previous is not None and previous.messages.get(kind) == text:
+            message_versions[kind] = previous.message_versions[kind]
+        elif previous is not None:
+            message_versions[kind] = previous.message_versions.get(kind, 0) + 1
+        else:
+            message_versions[kind] = 1
+    version = previous.version + 1 if previous else 1
+    return PriceSnapshot(data, version, time.time(), messages, message_versions)
+
+
+async def refresh_prices(context: ContextTypes.DEFAULT_TYPE):
+    """جاب پس‌زمینه: دریافت دوباره‌ی داده‌ها و جایگزینی اسنپ‌شات مشترک"""
+    global _snapshot
+    data = await _fetch_data()
+    if not data:
+        # داده‌ی قبلی رو نگه می‌داریم تا کاربرها بی‌جواب نمونن
+        return
+    previous = _snapshot
+    _snapshot = _build_snapshot(data, previous)
+    for listener in _snapshot_listeners:
+        try:
+            await listener(context, previous, _snapshot)
+        except Exception as e:
+            print(f"Snapshot listener Error: {e}")
+
 
 # ── Helper Functions ──────────────────────────────────────────────────
-def _fetch_data():
-    """دریافت داده از API تی‌جی‌جی‌یو"""
+async def _fetch_data():
+    """دریافت داده از API تی‌جی‌جی‌یو (وقتی مدار قطعه، بدون درخواست None)"""
     try:
-        headers = {
-            "User-Agent": (
-                "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                "AppleWebKit/537.36 (KHTML, like Gecko) "
-                "Chrome/144.0.0.0 Safari/537.36"
-            )
-        }
-        resp = requests.get(TGJU_API, headers=headers, timeout=15)
-        resp.raise_for_status()
-        return resp.json().get("current", {})
+        data = await _breaker.call(lambda: get_json(TGJU_API), background=True)
+        return data.get("current", {})
+    except CircuitOpenError:
+        return None
     except Exception as e:
         print(f"TGJU Error: {e}")
         return None
@@ -77,6 +257,21 @@ def _price_line(data, key, label, to_toman=True):
     return f"▫️ {label}:\n   💲 {price_display}  {change}\n   🕐 {time}"
 
 
+def _age_text(snapshot: PriceSnapshot, kind: str) -> str:
+    """متن تازگی داده برای انتهای پیام"""
+    age = int(snapshot.age)
+    if age < 60:
+        ago = f"{age} ثانیه پیش"
+    elif age < 60 * 60:
+        ago = f"{age // 60} دقیقه پیش"
+    else:
+        ago = f"{age // 3600} ساعت و {age % 3600 // 60} دقیقه پیش"
+    text = f"━━━━━━━━━━━━━━━━━━\n🔄 به‌روزرسانی: {ago} (نسخه {snapshot.message_versions[kind]})"
+    if snapshot.age > TGJU_STALE_AFTER:
+        text += "\n⚠️ سرویس قیمت فعلاً در دسترس نیست؛ این آخرین قیمت معتبره."
+    return text
+
+
 def _get_target(update: Update):
     """دریافت هدف ارسال پیام"""
     if update.callback_query:
@@ -84,30 +279,37 @@ def _get_target(update: Update):
     return update.message
 
 
-# ── Gold & Coins ──────────────────────────────────────────────────────
-async def get_gold_price(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """نمایش قیمت لحظه‌ای طلا و سکه"""
-    data = _fetch_data()
+async def _send_prices(update: Update, context: ContextTypes.DEFAULT_TYPE, kind: str):
+    """
+    ارسال پیام آماده از اسنپ‌شات. اگه همین نسخه قبلاً تو این چت ارسال شده،
+    به جای فرستادن دوباره‌ی کل متن فقط به همون پیام اشاره می‌کنیم.
+    """
+    snapshot = get_snapshot()
     target = _get_target(update)
 
-    if not data:
+    if snapshot is None or kind not in snapshot.messages:
         await target.reply_text("❌ خطا در دریافت اطلاعات. لطفاً دوباره تلاش کنید.")
         return
 
-    gold_items = [
-        ("geram18", "طلای ۱۸ عیار (هر گرم)"),
-        ("geram24", "طلای ۲۴ عیار (هر گرم)"),
-        ("mesghal", "مثقال طلا"),
-        ("sekee", "سکه امامی"),
-        ("sekeb", "سکه بهار آزادی"),
-        ("nim", "نیم سکه"),
-        ("rob", "ربع سکه"),
-        ("gerami", "سکه گرمی"),
-    ]
+    version = snapshot.message_versions[kind]
+    sent = context.chat_data.setdefault("price_messages", {}) if context.chat_data is not None else {}
+    last = sent.get(kind)
+    if last is not None and last[0] == version:
+        await target.reply_text(
+            "➖ قیمت‌ها از آخرین پیام تغییری نکرده‌اند.\n" + _age_text(snapshot, kind),
+            reply_parameters=ReplyParameters(message_id=last[1], allow_sending_without_reply=True),
+        )
+        return
+
+    message = await target.reply_text(snapshot.messages[kind] + "\n" + _age_text(snapshot, kind))
+    sent[kind] = (version, message.message_id)
 
+
+# ── Gold & Coins ──────────────────────────────────────────────────────
+def _render_gold(data: dict) -> str:
     lines = ["🪙 قیمت لحظه‌ای طلا و سکه\n━━━━━━━━━━━━━━━━━━"]
 
-    for key, label in gold_items:
+    for key, label in GOLD_ITEMS:
         line = _price_line(data, key, label)
         if line:
             lines.append(line)
@@ -119,72 +321,36 @@ async def get_gold_price(update: Update, context: ContextTypes.DEFAULT_TYPE):
         ons_ts = _format_time(ons.get("t", ""))
         lines.append(f"▫️ اونس جهانی طلا:\n   💲 ${ons_p}\n   🕐 {ons_ts}")
 
-    await target.reply_text("\n".join(lines))
+    return "\n".join(lines)
 
 
-# ── Currency ──────────────────────────────────────────────────────────
-async def get_currency_price(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """نمایش قیمت لحظه‌ای ارز"""
-    data = _fetch_data()
-    target = _get_target(update)
-
-    if not data:
-        await target.reply_text("❌ خطا در دریافت اطلاعات. لطفاً دوباره تلاش کنید.")
-        return
+async def get_gold_price(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """نمایش قیمت لحظه‌ای طلا و سکه"""
+    await _send_prices(update, context, "gold")
 
-    currency_items = [
-        ("price_dollar_rl", "دلار آمریکا"),
-        ("price_eur", "یورو"),
-        ("price_gbp", "پوند انگلیس"),
-        ("price_aed", "درهم امارات"),
-        ("price_try", "لیر ترکیه"),
-        ("price_cny", "یوان چین"),
-        ("price_sar", "ریال عربستان"),
-        ("price_cad", "دلار کانادا"),
-        ("price_aud", "دلار استرالیا"),
-    ]
 
+# ── Currency ──────────────────────────────────────────────────────────
+def _render_currency(data: dict) -> str:
     lines = ["💵 قیمت لحظه‌ای ارز\n━━━━━━━━━━━━━━━━━━"]
 
-    for key, label in currency_items:
+    for key, label in CURRENCY_ITEMS:
         line = _price_line(data, key, label)
         if line:
             lines.append(line)
 
-    await target.reply_text("\n".join(lines))
-
+    return "\n".join(lines)
 
-# ── Crypto ────────────────────────────────────────────────────────────
-async def get_crypto_price(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """نمایش قیمت لحظه‌ای رمز ارزها"""
-    data = _fetch_data()
-    target = _get_target(update)
 
-    if not data:
-        await target.reply_text("❌ خطا در دریافت اطلاعات. لطفاً دوباره تلاش کنید.")
-        return
+async def get_currency_price(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """نمایش قیمت لحظه‌ای ارز"""
+    await _send_prices(update, context, "currency")
 
-    crypto_list = [
-        ("crypto-bitcoin", "crypto-bitcoin-irr", "بیت‌کوین", "BTC"),
-        ("crypto-ethereum", "crypto-ethereum-irr", "اتریوم", "ETH"),
-        ("crypto-tether", "crypto-tether-irr", "تتر", "USDT"),
-        ("crypto-binance-coin", "crypto-binance-coin-irr", "بایننس کوین", "BNB"),
-        ("crypto-solana", "crypto-solana-irr", "سولانا", "SOL"),
-        ("crypto-ripple", "crypto-ripple-irr", "ریپل", "XRP"),
-        ("crypto-cardano", "crypto-cardano-irr", "کاردانو", "ADA"),
-        ("crypto-dogecoin", "crypto-dogecoin-irr", "دوج‌کوین", "DOGE"),
-        ("crypto-toncoin", "crypto-toncoin-irr", "تون‌کوین", "TON"),
-        ("crypto-tron", "crypto-tron-irr", "ترون", "TRX"),
-        ("crypto-litecoin", "crypto-litecoin-irr", "لایت‌کوین", "LTC"),
-        ("crypto-chainlink", "crypto-chainlink-irr", "چین‌لینک", "LINK"),
-        ("crypto-polkadot", "crypto-polkadot-irr", "پولکادات", "DOT"),
-        ("crypto-avalanche", "crypto-avalanche-irr", "آوالانچ", "AVAX"),
-        ("crypto-monero", "crypto-monero-irr", "مونرو", "XMR"),
-    ]
 
+# ── Crypto ────────────────────────────────────────────────────────────
+def _render_crypto(data: dict) -> str:
     lines = ["💎 قیمت لحظه‌ای رمز ارزها\n━━━━━━━━━━━━━━━━━━"]
 
-    for usd_key, irr_key, name, symbol in crypto_list:
+    for usd_key, irr_key, name, symbol in CRYPTO_ITEMS:
         usd_item = data.get(usd_key, {})
         irr_item = data.get(irr_key, {})
         if not usd_item:
@@ -207,4 +373,16 @@ async def get_crypto_price(update: Update, context: ContextTypes.DEFAULT_TYPE):
             f"   🕐 {time}"
         )
 
-    await target.reply_text("\n".join(lines))
+    return "\n".join(lines)
+
+
+async def get_crypto_price(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """نمایش قیمت لحظه‌ای رمز ارزها"""
+    await _send_prices(update, context, "crypto")
+
+
+_RENDERERS = {
+    "gold": _render_gold,
+    "currency": _render_currency,
+    "crypto": _render_crypto,
+}
@@ -0,0 +1,97 @@
+import asyncio
+import os
+from urllib.parse import urlsplit
+
+import httpx
+from telegram.ext import Application
+
+
+# ── Settings ──────────────────────────────────────────────────────────
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "10"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "50"))
+HTTP_MAX_PER_HOST = int(os.getenv("HTTP_MAX_PER_HOST", "10"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+
+_DEFAULT_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/144.0.0.0 Safari/537.36"
+    ),
+    "Accept": "application/json",
+    "Accept-Encoding": "gzip, deflate",
+}
+
+_client: httpx.AsyncClient | None = None
+_host_limits: dict[str, asyncio.Semaphore] = {}
+
+
+# ── Lifecycle ─────────────────────────────────────────────────────────
+def _build_client() -> httpx.AsyncClient:
+    """ساخت کلاینت با connection pool و keep-alive"""
+    return httpx.AsyncClient(
+        headers=_DEFAULT_HEADERS,
+        timeout=httpx.Timeout(
+            connect=HTTP_CONNECT_TIMEOUT,
+            read=HTTP_READ_TIMEOUT,
+            write=HTTP_READ_TIMEOUT,
+            pool=HTTP_CONNECT_TIMEOUT,
+        ),
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_CONNECTIONS,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        ),
+        follow_redirects=True,
+    )
+
+
+async def start_http_client(application: Application | None = None):
+    """ساخت کلاینت مشترک (برای post_init اپلیکیشن)"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _build_client()
+
+
+async def close_http_client(application: Application | None = None):
+    """بستن کلاینت و آزاد کردن کانکشن‌ها (برای post_shutdown اپلیکیشن)"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+    _host_limits.clear()
+
+
+def get_client() -> httpx.AsyncClient:
+    """کلاینت مشترک؛ اگه هنوز ساخته نشده (مثلاً در اسکریپت‌ها) همینجا ساخته میشه"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _build_client()
+    return _client
+
+
+# ── Requests ──────────────────────────────────────────────────────────
+def _host_limit(url: str) -> asyncio.Semaphore:
+    """محدودیت تعداد کانکشن همزمان به هر هاست"""
+    host = urlsplit(url).hostname or ""
+    sem = _host_limits.get(host)
+    if sem is None:
+        sem = _host_limits[host] = asyncio.Semaphore(HTTP_MAX_PER_HOST)
+    return sem
+
+
+async def get_json(url: str, params: dict | None = None, headers: dict | None = None):
+    """درخواست GET غیرهمزمان و برگرداندن JSON پاسخ"""
+    async with _host_limit(url):
+        resp = await get_client().get(url, params=params, headers=headers)
+    resp.raise_for_status()
+    return resp.json()
+
+
+async def post_json(url: str, json: dict, params: dict | None = None, headers: dict | None = None):
+    """درخواست POST با بدنه‌ی JSON و برگرداندن JSON پاسخ"""
+    async with _host_limit(url):
+        resp = await get_client().post(url, json=json, params=params, headers=headers)
+    resp.raise_for_status()
+    return resp.json()
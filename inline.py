@@ -0,0 +1,124 @@
+import os
+from bisect import bisect_left
+
+from telegram import InlineQueryResultArticle, InputTextMessageContent, Update
+from telegram.ext import ContextTypes
+
+from gold import (
+    PRICE_SYMBOLS,
+    TGJU_REFRESH_INTERVAL,
+    PriceSymbol,
+    _change_text,
+    get_snapshot,
+    parse_price,
+)
+from textnorm import normalize_persian_text
+from weather_advanced import _CITY_ALIASES, cached_current_weather, format_current_weather, get_current_weather
+
+
+# ── Settings ──────────────────────────────────────────────────────────
+INLINE_MAX_RESULTS = int(os.getenv("INLINE_MAX_RESULTS", "10"))
+# سقف cache_time نتیجه‌ها در سمت تلگرام (ثانیه)
+INLINE_CACHE_TIME = int(os.getenv("INLINE_CACHE_TIME", "60"))
+# وقتی داده‌ی یک شهر هنوز تو کش نیست، تلگرام زود دوباره بپرسه
+INLINE_MISS_CACHE_TIME = 5
+
+# نتیجه‌های پیش‌فرض برای کوئری خالی
+_DEFAULT_QUERIES = ("usd", "eur", "geram18", "sekee", "btc", "usdt")
+
+
+# ── Prefix Index ──────────────────────────────────────────────────────
+def _build_index() -> list[tuple[str, str, object]]:
+    """لیست مرتب (اسم نرمال‌شده، نوع، داده) برای جستجوی پیشوندی با bisect"""
+    entries = [(alias, "price", symbol) for alias, symbol in PRICE_SYMBOLS.items() if alias]
+    for alias, city in _CITY_ALIASES.items():
+        entries.append((normalize_persian_text(alias), "weather", city))
+        entries.append((normalize_persian_text(city), "weather", city))
+    return sorted(set(entries), key=lambda entry: (entry[0], entry[1], str(entry[2])))
+
+
+_INDEX = _build_index()
+_NAMES = [entry[0] for entry in _INDEX]
+
+
+def search(query: str, limit: int = INLINE_MAX_RESULTS) -> list[tuple[str, object]]:
+    """همه‌ی قیمت‌ها/شهرهایی که اسمشون با query شروع میشه (بدون تکرار)"""
+    prefix = normalize_persian_text(query)
+    found: dict[tuple[str, str], object] = {}
+    i = bisect_left(_NAMES, prefix)
+    while i < len(_INDEX) and _NAMES[i].startswith(prefix) and len(found) < limit:
+        _, kind, payload = _INDEX[i]
+        found.setdefault((kind, payload.key if kind == "price" else payload), payload)
+        i += 1
+    return [(kind, payload) for (kind, _), payload in found.items()]
+
+
+# ── Results ───────────────────────────────────────────────────────────
+def _price_result(symbol: PriceSymbol, snapshot) -> InlineQueryResultArticle | None:
+    item = snapshot.data.get(symbol.key) if snapshot else None
+    price = parse_price(item.get("p")) if item else None
+    if price is None:
+        return None
+    if symbol.factor == 1:
+        shown = f"${item.get('p')}"
+    else:
+        shown = f"{price / symbol.factor:,.0f} تومان"
+    change = _change_text(item.get("dt", ""), item.get("dp", 0))
+    return InlineQueryResultArticle(
+        id=f"p:{symbol.key}",
+        title=symbol.label,
+        description=f"{shown}  {change}",
+        input_message_content=InputTextMessageContent(
+            f"▫️ {symbol.label}:\n   💲 {shown}  {change}\n   🕐 {item.get('t', '---')}"
+        ),
+    )
+
+
+def _weather_result(city: str, data: dict) -> InlineQueryResultArticle | None:
+    if "error" in data:
+        return None
+    current = data["current"]
+    return InlineQueryResultArticle(
+        id=f"w:{city}"[:64],
+        title=f"🌤 {data['location']['name']}",
+        description=f"{current['temp_c']}°C — {current['condition']['text']}",
+        input_message_content=InputTextMessageContent(format_current_weather(data)),
+    )
+
+
+async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    جواب inline فقط از اسنپ‌شات قیمت‌ها و کش آب و هوا؛ هیچ درخواستی به
+    سرویس‌های بیرونی در مسیر جواب نیست. شهرهایی که هنوز تو کش نیستن در
+    پس‌زمینه گرفته میشن تا تلگرام بعد از cache_time کوتاه دوباره بپرسه.
+    """
+    query = update.inline_query
+    if query is None:
+        return
+    text = query.query.strip()
+    if text:
+        matches = search(text)
+    else:
+        matches = [("price", PRICE_SYMBOLS[q]) for q in _DEFAULT_QUERIES]
+
+    snapshot = get_snapshot()
+    results = []
+    cache_time = INLINE_CACHE_TIME
+    if snapshot is not None:
+        # تا اسنپ‌شات بعدی همین جواب معتبره
+        cache_time = min(cache_time, max(1, int(TGJU_REFRESH_INTERVAL - snapshot.age)))
+
+    for kind, payload in matches:
+        if kind == "price":
+            result = _price_result(payload, snapshot)
+        else:
+            data = cached_current_weather(payload)
+            if data is None:
+                context.application.create_task(get_current_weather(payload))
+                cache_time = INLINE_MISS_CACHE_TIME
+                continue
+            result = _weather_result(payload, data)
+        if result is not None:
+            results.append(result)
+
+    await query.answer(results, cache_time=cache_time, is_personal=False)
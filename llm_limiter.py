@@ -0,0 +1,123 @@
+import asyncio
+import os
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Hashable
+
+
+# ── Settings ──────────────────────────────────────────────────────────
+AI_MAX_CONCURRENT = int(os.getenv("AI_MAX_CONCURRENT", "8"))          # تعداد درخواست همزمان به LLM
+AI_QUEUE_TIMEOUT = float(os.getenv("AI_QUEUE_TIMEOUT", "20"))         # حداکثر انتظار در صف (ثانیه)
+AI_MAX_QUEUE = int(os.getenv("AI_MAX_QUEUE", "200"))                  # حداکثر کل صف
+AI_MAX_QUEUE_PER_USER = int(os.getenv("AI_MAX_QUEUE_PER_USER", "2"))  # حداکثر درخواست منتظر هر کاربر
+
+
+class LLMBusyError(Exception):
+    """صف پره یا زمان انتظار تموم شد؛ کاربر باید بعداً دوباره امتحان کنه"""
+
+
+class FairLimiter:
+    """
+    محدودکننده‌ی همزمانی با صف انتظار منصفانه: وقتی جایی خالی میشه، نوبت
+    به‌صورت چرخشی بین کاربرها داده میشه تا یک کاربر پرحرف بقیه رو پشت صف نگه نداره.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = AI_MAX_CONCURRENT,
+        queue_timeout: float = AI_QUEUE_TIMEOUT,
+        max_queue: int = AI_MAX_QUEUE,
+        max_queue_per_user: int = AI_MAX_QUEUE_PER_USER,
+    ):
+        self.max_concurrent = max_concurrent
+        self.queue_timeout = queue_timeout
+        self.max_queue = max_queue
+        self.max_queue_per_user = max_queue_per_user
+        self._active = 0
+        self._waiting = 0
+        # کاربر → صف futureها؛ ترتیب dict همون ترتیب نوبت چرخشیه
+        self._queues: OrderedDict[Hashable, deque[asyncio.Future]] = OrderedDict()
+        self.rejected = 0
+        self.timed_out = 0
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    @property
+    def waiting(self) -> int:
+        return self._waiting
+
+    async def acquire(self, key: Hashable):
+        if self._active < self.max_concurrent and not self._queues:
+            self._active += 1
+            return
+
+        queue = self._queues.get(key)
+        if self._waiting >= self.max_queue or (queue and len(queue) >= self.max_queue_per_user):
+            self.rejected += 1
+            raise LLMBusyError()
+
+        future = asyncio.get_running_loop().create_future()
+        if queue is None:
+            queue = self._queues[key] = deque()
+        queue.append(future)
+        self._waiting += 1
+        try:
+            # اگه همزمان با تایم‌اوت نوبت داده بشه، wait_for نتیجه رو برمی‌گردونه
+            await asyncio.wait_for(future, self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._discard(key, future)
+            self.timed_out += 1
+            raise LLMBusyError() from None
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # نوبت گرفته بودیم ولی دیگه لازم نیست
+                self.release()
+            else:
+                self._discard(key, future)
+            raise
+
+    def _discard(self, key: Hashable, future: asyncio.Future):
+        queue = self._queues.get(key)
+        if queue is None:
+            return
+        try:
+            queue.remove(future)
+        except ValueError:
+            return
+        self._waiting -= 1
+        if not queue:
+            del self._queues[key]
+
+    def release(self):
+        """آزاد کردن جایگاه و دادن نوبت به کاربر بعدی (چرخشی)"""
+        while self._queues:
+            key, queue = next(iter(self._queues.items()))
+            future = queue.popleft()
+            self._waiting -= 1
+            if queue:
+                self._queues.move_to_end(key)
+            else:
+                del self._queues[key]
+            if not future.done():
+                # جایگاه مستقیم منتقل میشه؛ _active تغییری نمی‌کنه
+                future.set_result(None)
+                return
+        self._active -= 1
+
+    @asynccontextmanager
+    async def slot(self, key: Hashable):
+        await self.acquire(key)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> dict:
+        return {
+            "active": self._active,
+            "waiting": self._waiting,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+        }
@@ -1,33 +1,70 @@
-import requests
-import time
-from collections import defaultdict
 from dotenv import load_dotenv
 import os
-from telegram.ext import ApplicationBuilder, ContextTypes, CommandHandler, MessageHandler, filters, CallbackQueryHandler
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup
+from telegram.ext import ApplicationBuilder, ContextTypes, CommandHandler, MessageHandler, filters, CallbackQueryHandler, InlineQueryHandler
+from telegram import Update
 load_dotenv()
 from weather_advanced import (
     weather_command,
     forecast_command,
     get_current_weather,
     get_forecast_weather,
+    get_forecast_weather_days,
+    weather_cache_stats,
+    forecast_cache_stats,
+    prefetch_weather,
+    weather_upstream_stats,
+    city_lookup_stats,
+    WEATHER_PREFETCH_INTERVAL,
 )
 from date import parse_forecast_args
+from http_client import start_http_client, close_http_client
+from antispam import make_store, limit_for_chat_type
+from webhook import run_bot
+from router import RouteTable
+from ui import (
+    MAIN_MENU,
+    WEATHER_MENU,
+    MAIN_REPLY_KEYBOARD,
+    WEATHER_REPLY_KEYBOARD,
+    START_TEXT,
+    TUTORIAL_WEATHER_TEXT,
+    TUTORIAL_AI_TEXT,
+    CONTACT_TEXT,
+    CITY_CHOICES,
+    city_keyboard,
+    forecast_dates_keyboard,
+)
+from update_processor import PerUserUpdateProcessor, BOT_CONCURRENT_UPDATES, BOT_PENDING_UPDATES
 from datetime import datetime, timedelta
-import jdatetime
-from bot_ai import handle_message
-from main_ai import AIAgent
-from gold import get_gold_price, get_currency_price, get_crypto_price
+from bot_ai import handle_message, stream_stats, answer_cache_stats, warm_up_agent
+from gold import (
+    get_gold_price,
+    get_currency_price,
+    get_crypto_price,
+    refresh_prices,
+    add_snapshot_listener,
+    TGJU_REFRESH_INTERVAL,
+)
+from price_history import history_command, record_snapshot, save_price_history, PRICE_HISTORY_SAVE_INTERVAL
+from charts import chart_command, chart_stats
+from inline import inline_query
+from alerts import alert_command, alerts_command, delete_alert, check_alerts, close_alert_index
+from resilience import probe_circuits, circuit_stats, CIRCUIT_PROBE_INTERVAL
+from broadcast import (
+    digest_command,
+    toggle_digest,
+    send_daily_digest,
+    resume_broadcasts,
+    close_broadcaster,
+    get_broadcaster,
+    DIGEST_TIME,
+)
 BOT_TOKEN = os.getenv("API_TELEGRAM")
-MY_ID = os.getenv("MY_ID")
+# لود AI در پس‌زمینه بعد از استارت (0 = فقط با اولین پیام AI)
+AI_WARMUP = os.getenv("AI_WARMUP", "1") == "1"
 
 # ── Anti-Spam ─────────────────────────────────────────────────────────
-SPAM_MAX_MESSAGES = 5        # حداکثر تعداد پیام مجاز
-SPAM_TIME_WINDOW = 10        # در بازه زمانی (ثانیه)
-SPAM_BAN_DURATION = 30 * 60  # مدت بلاک (۳۰ دقیقه)
-
-_user_messages: dict[int, list[float]] = defaultdict(list)
-_banned_users: dict[int, float] = {}
+_spam_store = make_store()
 
 
 async def check_spam(update: Update) -> bool:
@@ -36,210 +73,113 @@ async def check_spam(update: Update) -> bool:
     if user is None:
         return False
 
-    user_id = user.id
-    now = time.time()
-
-    # اگه بلاک شده، چک کن هنوز وقتش تموم نشده
-    if user_id in _banned_users:
-        ban_expires = _banned_users[user_id]
-        if now < ban_expires:
-            remaining = int(ban_expires - now)
-            minutes = remaining // 60
-            seconds = remaining % 60
-            msg = update.effective_message
-            if msg:
-                await msg.reply_text(
-                    f"🚫 به دلیل ارسال پیام زیاد، دسترسی شما به مدت "
-                    f"{minutes} دقیقه و {seconds} ثانیه مسدود است.\n"
-                    f"لطفاً کمی صبر کنید."
-                )
-            return True
-        else:
-            # بلاک تموم شده
-            del _banned_users[user_id]
-            _user_messages[user_id].clear()
-
-    # ثبت پیام و حذف پیام‌های قدیمی‌تر از بازه زمانی
-    timestamps = _user_messages[user_id]
-    timestamps.append(now)
-    _user_messages[user_id] = [t for t in timestamps if now - t <= SPAM_TIME_WINDOW]
-
-    # اگه تعداد پیام‌ها از حد مجاز بیشتر شد → بلاک
-    if len(_user_messages[user_id]) > SPAM_MAX_MESSAGES:
-        _banned_users[user_id] = now + SPAM_BAN_DURATION
-        _user_messages[user_id].clear()
-        msg = update.effective_message
+    msg = update.effective_message
+    chat_type = update.effective_chat.type if update.effective_chat else None
+    limit = limit_for_chat_type(chat_type)
+    verdict = await _spam_store.check(user.id, limit)
+    if not verdict.blocked:
+        return False
+
+    # همین الان از حد مجاز رد شد → بلاک
+    if verdict.just_banned:
         if msg:
             await msg.reply_text(
-                "🚫 شما به دلیل ارسال پیام بیش از حد، به مدت ۳۰ دقیقه مسدود شدید.\n"
+                f"🚫 شما به دلیل ارسال پیام بیش از حد، به مدت {int(limit.ban_duration // 60)} دقیقه مسدود شدید.\n"
                 "لطفاً بعداً دوباره تلاش کنید."
             )
         return True
 
-    return False
+    # هنوز بلاکه
+    remaining = int(verdict.ban_remaining)
+    minutes = remaining // 60
+    seconds = remaining % 60
+    if msg:
+        await msg.reply_text(
+            f"🚫 به دلیل ارسال پیام زیاد، دسترسی شما به مدت "
+            f"{minutes} دقیقه و {seconds} ثانیه مسدود است.\n"
+            f"لطفاً کمی صبر کنید."
+        )
+    return True
 
-# ایراد اصلی این تعریف button این است که ساختارش بیش از حد تو در تو (nested) است و باعث می‌شود 
-# دکمه‌ها به‌صورت دلخواه در ردیف و ستون نمایش داده نشوند.
-# ساختار صحیح در InlineKeyboardMarkup، باید یک لیست از ردیف‌ها باشد و هر ردیف، یک لیست از دکمه‌ها.
-# یعنی: [[Button, Button], [Button], ...] و نه [[[Button], [Button]], ...] 
-# بر این اساس بازنویسی صحیح:
-
-button = [
-    [InlineKeyboardButton("🌤️آب و هوا", callback_data="weather"),
-     InlineKeyboardButton("🪙قیمت طلا", callback_data="gold")],
-    [InlineKeyboardButton("💵قیمت ارز", callback_data="currency"),
-     InlineKeyboardButton("💎ارز دیجیتال", callback_data="crypto")],
-    [InlineKeyboardButton("🤖هوش مصنوعی", callback_data="ai"),
-     InlineKeyboardButton("👨‍💻 ارتباط با سازنده", callback_data="contact")],
-    [InlineKeyboardButton("⬅️بازگشت", callback_data="back")]
-]
-
-weather_inline_button = [
-    [InlineKeyboardButton("🌤 وضعیت فعلی", callback_data="weather_current"),
-     InlineKeyboardButton("📅 پیش بینی", callback_data="weather_forecast")],
-    [InlineKeyboardButton("⬅️بازگشت", callback_data="back")],
-]
-
-_CITY_CHOICES = [
-    "تهران", "مشهد", "اصفهان", "شیراز", "تبریز", "اهواز",
-    "کرج", "قم", "کرمانشاه", "ارومیه", "رشت", "یزد",
-    "کازرون", "قشم", "کیش", "مازندران", "گیلان", "بندر عباس",
-]
-
-
-def _build_city_keyboard(prefix: str) -> InlineKeyboardMarkup:
-    rows: list[list[InlineKeyboardButton]] = []
-    for i in range(0, len(_CITY_CHOICES), 3):
-        row = [
-            InlineKeyboardButton(city, callback_data=f"{prefix}:{city}")
-            for city in _CITY_CHOICES[i:i + 3]
-        ]
-        rows.append(row)
-    rows.append([InlineKeyboardButton("⬅️بازگشت", callback_data="back")])
-    return InlineKeyboardMarkup(rows)
-
-
-def _to_persian_digits(text: str) -> str:
-    return text.translate(str.maketrans("0123456789", "۰۱۲۳۴۵۶۷۸۹"))
-
-
-def _build_forecast_dates_keyboard() -> InlineKeyboardMarkup:
-    rows: list[list[InlineKeyboardButton]] = []
-    today = datetime.now().date()
-    row: list[InlineKeyboardButton] = []
-    for offset in range(1, 5):
-        target_date = today + timedelta(days=offset)
-        iso_label = target_date.strftime("%Y-%m-%d")
-        jdate = jdatetime.date.fromgregorian(date=target_date)
-        month_names = [
-            "فروردین", "اردیبهشت", "خرداد", "تیر",
-            "مرداد", "شهریور", "مهر", "آبان",
-            "آذر", "دی", "بهمن", "اسفند",
-        ]
-        day_label = _to_persian_digits(str(jdate.day))
-        label = f"{day_label} {month_names[jdate.month - 1]}"
-        row.append(InlineKeyboardButton(label, callback_data=f"weather_date:{iso_label}"))
-    rows.append(row)
-    rows.append([InlineKeyboardButton("⬅️بازگشت", callback_data="back")])
-    return InlineKeyboardMarkup(rows)
-
-reply_button = ReplyKeyboardMarkup(
-    [
-        ["🌤️آب و هوا", "🪙قیمت طلا"],
-        ["💵قیمت ارز", "💎ارز دیجیتال"],
-        ["🤖هوش مصنوعی", "👨‍💻 ارتباط با سازنده"],
-        ["⬅️بازگشت"],
-    ],
-    resize_keyboard=True,
-    is_persistent=True,
-)
 
-weather_reply_button = ReplyKeyboardMarkup(
-    [
-        ["🌤 وضعیت فعلی", "📅 پیش بینی"],
-        ["⬅️بازگشت"],
-    ],
-    resize_keyboard=True,
-    is_persistent=True,
-)
+async def _post_shutdown(application):
+    await close_http_client(application)
+    await _spam_store.close()
+    close_alert_index()
+    await save_price_history()
+    await close_broadcaster()
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     message = update.effective_message
     if message is None:
         return
-    await message.reply_text("""🤖 به ربات هوشمند «کیارش» خوش آمدید!
-
-من اینجا هستم تا کارهای روزمره‌ت رو سریع‌تر و راحت‌تر کنم. با کیارش می‌تونی به کلی امکانات در یک جا دسترسی داشته باشی:
-
-🪙 قیمت طلا و سکه: مشاهده لحظه‌ای قیمت انواع طلا و سکه.
-
-💵 قیمت ارز: مشاهده لحظه‌ای قیمت دلار، یورو و سایر ارزها.
-
-💎 ارز دیجیتال: مشاهده لحظه‌ای قیمت بیت‌کوین، اتریوم، تتر و سایر رمز ارزها.
-
-🧠 هوش مصنوعی: گفتگو، پرسش و پاسخ، و حل مسائل با قدرت AI.
-
-🌤️ آب و هوا: چک کردن وضعیت جوی و پیش‌بینی هوای تمام شهرهای ایران و جهان.
-
-👨‍💻 ارتباط با سازنده: ارتباط با سازنده ربات برای دریافت اطلاعات بیشتر.
-
-همین حالا دکمه START رو بزن تا با هم شروع کنیم! 👇  """,
-    reply_markup=InlineKeyboardMarkup(button))
-    await message.reply_text("منوی اصلی 👇", reply_markup=reply_button)
+    await message.reply_text(START_TEXT, reply_markup=MAIN_MENU)
+    await message.reply_text("منوی اصلی 👇", reply_markup=MAIN_REPLY_KEYBOARD)
 
 
 async def tutorial_weather(update: Update, context: ContextTypes.DEFAULT_TYPE):
     message = update.effective_message
     if message is None:
         return
-    await message.reply_text("""🌦 راهنمای بخش هواشناسی
-
-من می‌تونم وضعیت آب و هوای هر شهری رو بهت بگم!
-فقط کافیه طبق الگوهای زیر بنویسی:
-
-1️⃣ آب و هوای الان:
-دکمه «وضعیت فعلی» رو بزن و بعد اسم شهر رو بفرست.
-مثال:  Shiraz یا شیراز
-
-2️⃣ پیش‌بینی روزهای آینده:
-دکمه «پیش بینی» رو بزن و بعد اسم شهر + تاریخ رو بفرست.
-مثال:  Shiraz 20 Bahman یا شیراز ۲۰ بهمن
-
-⚠️ نکته: نام شهر رو می‌تونی فارسی یا انگلیسی بنویسی.""")
+    await message.reply_text(TUTORIAL_WEATHER_TEXT)
 
 async def tutorial_ai(update: Update, context: ContextTypes.DEFAULT_TYPE):
     message = update.effective_message
     if message is None:
         return
-    await message.reply_text("""🧠 بخش هوش مصنوعی کیارش
-
-من اینجا هستم تا مثل یک دستیار هوشمند در کنارت باشم. هر سوالی داری، از مسائل درسی و برنامه‌نویسی گرفته تا مشورت برای کارهای روزمره، فقط کافیه برام بنویسی!
-
-چه کارهایی می‌تونم انجام بدم؟
-
-🚀 پاسخ به سوالات: هر چیزی که برات سواله رو بپرس.
-
-💻 کمک در کدنویسی: اگر توی پروژه‌هات به مشکل خوردی، روی من حساب کن.
-
-✍️ نوشتن متن: از ایمیل رسمی تا کپشن اینستاگرام رو برات می‌نویسم.
-
-💡 ایده‌پردازی: برای پروژه‌ها یا کارهای شخصیت بهت ایده میدم.""")
+    await message.reply_text(TUTORIAL_AI_TEXT)
 
 async def contact_developer(update: Update, context: ContextTypes.DEFAULT_TYPE):
     message = update.effective_message
     if message is None:
         return
+    await message.reply_text(CONTACT_TEXT)
+
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    message = update.effective_message
+    if message is None:
+        return
+    weather = weather_cache_stats()
+    forecast = forecast_cache_stats()
+    upstream = weather_upstream_stats()
+    cities = city_lookup_stats()
+    circuits_line = "، ".join(
+        f"{name} {c['state']}" + (f" (تست بعدی {c['retry_in']:.0f}s)" if c["retry_in"] else "")
+        for name, c in circuit_stats().items()
+    )
+    ai_stream = stream_stats()
+    ai_cache = answer_cache_stats()
+    ai_cache_line = (
+        f"💬 کش جواب AI: {ai_cache['hits']} hit / {ai_cache['misses']} miss "
+        f"({ai_cache['hit_rate']:.0%}) — {ai_cache['size']} سوال"
+        if ai_cache is not None else "💬 کش جواب AI: خاموش (یا AI هنوز لود نشده)"
+    )
+    digest = get_broadcaster().stats()
+    charts = chart_stats()
+    busiest = sorted(routes.stats().items(), key=lambda item: item[1]["calls"], reverse=True)[:3]
+    routes_line = "، ".join(
+        f"{name} {s['calls']}× ({s['avg'] * 1000:.0f}ms)" for name, s in busiest if s["calls"]
+    ) or "—"
     await message.reply_text(
-        f"سلام رفیق! 👋\n"
-        f"\n"
-        f"این ربات هنوز داره رشد می‌کنه و هر روز\n"
-        f"قابلیت‌های جدیدی بهش اضافه میشه 🚀\n"
-        f"\n"
-        f"🐛 اگه جایی باگ دیدی، بهم بگو\n"
-        f"💡 اگه ایده‌ای داری، خوشحال میشم بشنوم\n"
-        f"\n"
+        f"📊 آمار کش\n"
         f"━━━━━━━━━━━━━━━━━━\n"
-        f"👨‍💻 ارتباط با سازنده: {MY_ID}"
+        f"🌤 آب و هوای فعلی: {weather['hits']} hit / {weather['misses']} miss / "
+        f"{weather['coalesced']} coalesced / {weather['stale']} کهنه ({weather['hit_rate']:.0%}) — {weather['size']} شهر\n"
+        f"📅 پیش‌بینی: {forecast['hits']} hit / {forecast['misses']} miss / "
+        f"{forecast['coalesced']} coalesced ({forecast['hit_rate']:.0%}) — {forecast['size']} شهر\n"
+        f"🌐 weatherapi: {upstream['used']}/{upstream['budget']} درخواست در ساعت گذشته — "
+        f"پیش‌گرمایش {upstream['warmed']} شهر ({upstream['mode']})"
+        + (f"، {upstream['skipped']} جا موند" if upstream["skipped"] else "") + "\n"
+        f"🛡 سرویس‌ها: {circuits_line}\n"
+        f"🏙 اسم شهرها: {cities['exact']} از ایندکس / {cities['suggested']} پیشنهاد / "
+        f"{cities['rejected_hits']} رد از کش ({cities['rejected']} اسم نامعتبر)\n"
+        f"🧠 اولین متن AI: میانگین {ai_stream['first_text_avg']:.2f}s / بیشینه {ai_stream['first_text_max']:.2f}s "
+        f"({ai_stream['replies']} جواب)\n"
+        f"{ai_cache_line}\n"
+        f"🧭 پرکاربردترین مسیرها: {routes_line}\n"
+        f"📉 نمودار: {charts['file_id']} با file_id / {charts['uploaded']} آپلود / {charts['rendered']} رندر\n"
+        f"🗞 خلاصه‌ی روزانه: {digest['subscribers']} مشترک"
+        + (f" — آخرین ارسال: {digest['last']['sent']} موفق / {digest['last']['failed']} ناموفق" if digest["last"] else "")
     )
 
 async def welcome_new_members(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -268,11 +208,110 @@ def _is_addressed_in_group(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     return False
 
 
-_MENU_BUTTONS = {
-    "🌤️آب و هوا", "🤖هوش مصنوعی", "🪙قیمت طلا",
-    "💵قیمت ارز", "💎ارز دیجیتال", "👨‍💻 ارتباط با سازنده", "⬅️بازگشت",
-    "🌤 وضعیت فعلی", "📅 پیش بینی",
-}
+# ── Routes ────────────────────────────────────────────────────────────
+# دکمه‌های منو (متن دکمه‌ی کیبورد یا callback دکمه‌ی شیشه‌ای) → هندلر
+routes = RouteTable()
+
+
+def _menu_route(mode: str | None, handler):
+    """مسیر منو: اول مود کاربر عوض میشه، بعد هندلر اجرا میشه"""
+    async def route(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        context.user_data["mode"] = mode
+        await handler(update, context)
+    route.__name__ = handler.__name__
+    return route
+
+
+async def _weather_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    message = update.effective_message
+    if message is None:
+        return
+    await message.reply_text(
+        "یکی از گزینه‌های هواشناسی رو انتخاب کن 👇",
+        reply_markup=WEATHER_MENU,
+    )
+    await message.reply_text("منوی هواشناسی 👇", reply_markup=WEATHER_REPLY_KEYBOARD)
+
+
+async def _ask_city_current(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    message = update.effective_message
+    if message is None:
+        return
+    await message.reply_text(
+        "یکی از شهرهای زیر رو انتخاب کن 👇\n"
+        "اگر تو لیست نبود، اسم شهر رو انگلیسی بنویس.",
+        reply_markup=city_keyboard("weather_city_current"),
+    )
+
+
+async def _ask_city_forecast(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    message = update.effective_message
+    if message is None:
+        return
+    await message.reply_text(
+        "یکی از شهرهای زیر رو انتخاب کن 👇\n"
+        "اگر تو لیست نبود، اسم شهر رو انگلیسی بنویس.",
+        reply_markup=city_keyboard("weather_city_forecast"),
+    )
+
+
+routes.add(_menu_route("weather_menu", _weather_menu), texts=("🌤️آب و هوا",), callbacks=("weather",))
+routes.add(_menu_route("weather_current", _ask_city_current), texts=("🌤 وضعیت فعلی",), callbacks=("weather_current",))
+routes.add(_menu_route("weather_forecast", _ask_city_forecast), texts=("📅 پیش بینی",), callbacks=("weather_forecast",))
+routes.add(_menu_route("ai", tutorial_ai), texts=("🤖هوش مصنوعی",), callbacks=("ai",))
+routes.add(_menu_route(None, get_gold_price), texts=("🪙قیمت طلا",), callbacks=("gold",))
+routes.add(_menu_route(None, get_currency_price), texts=("💵قیمت ارز",), callbacks=("currency",))
+routes.add(_menu_route(None, get_crypto_price), texts=("💎ارز دیجیتال",), callbacks=("crypto",))
+routes.add(_menu_route(None, contact_developer), texts=("👨‍💻 ارتباط با سازنده",), callbacks=("contact",))
+routes.add(_menu_route(None, start), texts=("⬅️بازگشت",), callbacks=("back",))
+
+
+@routes.prefix("weather_city_current")
+async def _weather_city_current(update: Update, context: ContextTypes.DEFAULT_TYPE, city: str):
+    weather_info = await get_current_weather(city)
+    message = update.effective_message
+    if message:
+        if weather_info:
+            await message.reply_text(weather_info)
+        else:
+            await message.reply_text("هیچ داده ای برای این شهر یافت نشد")
+
+
+@routes.prefix("weather_city_forecast")
+async def _weather_city_forecast(update: Update, context: ContextTypes.DEFAULT_TYPE, city: str):
+    context.user_data["forecast_city"] = city
+    message = update.effective_message
+    if message:
+        await message.reply_text(
+            "تاریخ رو از دکمه‌های زیر انتخاب کن 👇",
+            reply_markup=forecast_dates_keyboard(),
+        )
+
+
+@routes.prefix("weather_date")
+async def _weather_date(update: Update, context: ContextTypes.DEFAULT_TYPE, date_str: str):
+    message = update.effective_message
+    city = context.user_data.get("forecast_city")
+    if not city:
+        if message:
+            await message.reply_text("اول اسم شهر رو انتخاب کن.")
+        return
+    if date_str == "all":
+        today = datetime.now()
+        target_dates = [today + timedelta(days=offset) for offset in range(1, 5)]
+        forecast_info = await get_forecast_weather_days(city, target_dates)
+    else:
+        target_date = datetime.strptime(date_str, "%Y-%m-%d")
+        forecast_info = await get_forecast_weather(city, target_date)
+    if message:
+        if forecast_info:
+            await message.reply_text(forecast_info)
+        else:
+            await message.reply_text("هیچ داده ای برای این تاریخ یافت نشد")
+
+
+routes.add_prefix("alert_del", delete_alert)
+routes.add_prefix("digest", toggle_digest)
 
 
 async def message_router(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -288,53 +327,7 @@ async def message_router(update: Update, context: ContextTypes.DEFAULT_TYPE):
         text = text.replace(f"@{bot_username}", "").strip()
 
     # ── دکمه‌های منو همیشه کار کنن (بدون بررسی اسپم) ──
-    if text == "🌤️آب و هوا":
-        context.user_data["mode"] = "weather_menu"
-        await message.reply_text(
-            "یکی از گزینه‌های هواشناسی رو انتخاب کن 👇",
-            reply_markup=InlineKeyboardMarkup(weather_inline_button),
-        )
-        await message.reply_text("منوی هواشناسی 👇", reply_markup=weather_reply_button)
-        return
-    if text == "🌤 وضعیت فعلی":
-        context.user_data["mode"] = "weather_current"
-        await message.reply_text(
-            "یکی از شهرهای زیر رو انتخاب کن 👇\n"
-            "اگر تو لیست نبود، اسم شهر رو انگلیسی بنویس.",
-            reply_markup=_build_city_keyboard("weather_city_current"),
-        )
-        return
-    if text == "📅 پیش بینی":
-        context.user_data["mode"] = "weather_forecast"
-        await message.reply_text(
-            "یکی از شهرهای زیر رو انتخاب کن 👇\n"
-            "اگر تو لیست نبود، اسم شهر رو انگلیسی بنویس.",
-            reply_markup=_build_city_keyboard("weather_city_forecast"),
-        )
-        return
-    if text == "🤖هوش مصنوعی":
-        context.user_data["mode"] = "ai"
-        await tutorial_ai(update, context)
-        return
-    if text == "🪙قیمت طلا":
-        context.user_data["mode"] = None
-        await get_gold_price(update, context)
-        return
-    if text == "💵قیمت ارز":
-        context.user_data["mode"] = None
-        await get_currency_price(update, context)
-        return
-    if text == "💎ارز دیجیتال":
-        context.user_data["mode"] = None
-        await get_crypto_price(update, context)
-        return
-    if text == "👨‍💻 ارتباط با سازنده":
-        context.user_data["mode"] = None
-        await contact_developer(update, context)
-        return
-    if text == "⬅️بازگشت":
-        context.user_data["mode"] = None
-        await start(update, context)
+    if await routes.dispatch_text(text, update, context):
         return
 
     # ── بررسی آنتی‌اسپم فقط برای پیام‌های آزاد (نه دکمه‌ها) ──
@@ -360,7 +353,7 @@ async def message_router(update: Update, context: ContextTypes.DEFAULT_TYPE):
             context.user_data["forecast_city"] = text.strip()
             await message.reply_text(
                 "تاریخ رو از دکمه‌های زیر انتخاب کن 👇",
-                reply_markup=_build_forecast_dates_keyboard(),
+                reply_markup=forecast_dates_keyboard(),
             )
             return
         forecast_info = await get_forecast_weather(city, target_date)
@@ -380,84 +373,30 @@ async def message_router(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
-    data = query.data
-    if data == "weather":
-        context.user_data["mode"] = "weather_menu"
-        if query.message:
-            await query.message.reply_text(
-                "یکی از گزینه‌های هواشناسی رو انتخاب کن 👇",
-                reply_markup=InlineKeyboardMarkup(weather_inline_button),
-            )
-            await query.message.reply_text("منوی هواشناسی 👇", reply_markup=weather_reply_button)
-    elif data == "weather_current":
-        context.user_data["mode"] = "weather_current"
-        if query.message:
-            await query.message.reply_text(
-                "یکی از شهرهای زیر رو انتخاب کن 👇\n"
-                "اگر تو لیست نبود، اسم شهر رو انگلیسی بنویس.",
-                reply_markup=_build_city_keyboard("weather_city_current"),
-            )
-    elif data == "weather_forecast":
-        context.user_data["mode"] = "weather_forecast"
-        if query.message:
-            await query.message.reply_text(
-                "یکی از شهرهای زیر رو انتخاب کن 👇\n"
-                "اگر تو لیست نبود، اسم شهر رو انگلیسی بنویس.",
-                reply_markup=_build_city_keyboard("weather_city_forecast"),
-            )
-    elif data.startswith("weather_city_current:"):
-        city = data.split(":", 1)[1]
-        weather_info = await get_current_weather(city)
-        if query.message:
-            if weather_info:
-                await query.message.reply_text(weather_info)
-            else:
-                await query.message.reply_text("هیچ داده ای برای این شهر یافت نشد")
-    elif data.startswith("weather_city_forecast:"):
-        city = data.split(":", 1)[1]
-        context.user_data["forecast_city"] = city
-        if query.message:
-            await query.message.reply_text(
-                "تاریخ رو از دکمه‌های زیر انتخاب کن 👇",
-                reply_markup=_build_forecast_dates_keyboard(),
-            )
-    elif data.startswith("weather_date:"):
-        date_str = data.split(":", 1)[1]
-        city = context.user_data.get("forecast_city")
-        if not city:
-            if query.message:
-                await query.message.reply_text("اول اسم شهر رو انتخاب کن.")
-            return
-        target_date = datetime.strptime(date_str, "%Y-%m-%d")
-        forecast_info = await get_forecast_weather(city, target_date)
-        if query.message:
-            if forecast_info:
-                await query.message.reply_text(forecast_info)
-            else:
-                await query.message.reply_text("هیچ داده ای برای این تاریخ یافت نشد")
-    elif data == "ai":
-        context.user_data["mode"] = "ai"
-        await tutorial_ai(update, context)
-    elif data == "gold":
-        context.user_data["mode"] = None
-        await get_gold_price(update, context)
-    elif data == "currency":
-        context.user_data["mode"] = None
-        await get_currency_price(update, context)
-    elif data == "crypto":
-        context.user_data["mode"] = None
-        await get_crypto_price(update, context)
-    elif data == "contact":
-        context.user_data["mode"] = None
-        await contact_developer(update, context)
-    elif data == "back":
-        context.user_data["mode"] = None
-        await start(update, context)
-
-
-def main():
-    print("Bot is running...")
-    app = ApplicationBuilder().token(BOT_TOKEN).build()
+    await routes.dispatch_callback(query.data or "", update, context)
+
+
+async def _post_init(application):
+    await start_http_client(application)
+    if AI_WARMUP:
+        # ربات بدون صبر برای لود LLM شروع به جواب دادن می‌کنه
+        application.create_task(warm_up_agent())
+    # خلاصه‌ی روزانه‌ای که با ری‌استارت نصفه موند از همون‌جا ادامه پیدا می‌کنه
+    await resume_broadcasts(application)
+
+
+def build_app(token: str = BOT_TOKEN, base_url: str | None = None):
+    """ساخت اپلیکیشن با همه‌ی هندلرها (base_url فقط برای بنچمارک)"""
+    builder = (
+        ApplicationBuilder()
+        .token(token)
+        .concurrent_updates(PerUserUpdateProcessor(BOT_CONCURRENT_UPDATES, BOT_PENDING_UPDATES))
+        .post_init(_post_init)
+        .post_shutdown(_post_shutdown)
+    )
+    if base_url:
+        builder = builder.base_url(base_url)
+    app = builder.build()
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CommandHandler("tutorial_weather", tutorial_weather))
     app.add_handler(CommandHandler("weather", weather_command))
@@ -466,7 +405,32 @@ def main():
     app.add_handler(MessageHandler(filters.StatusUpdate.NEW_CHAT_MEMBERS, welcome_new_members))
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, message_router))
     app.add_handler(CommandHandler("contact", contact_developer))
-    app.run_polling()   
+    app.add_handler(CommandHandler("stats", stats_command))
+    app.add_handler(CommandHandler("alert", alert_command))
+    app.add_handler(CommandHandler("alerts", alerts_command))
+    app.add_handler(CommandHandler("digest", digest_command))
+    app.add_handler(CommandHandler("history", history_command))
+    app.add_handler(CommandHandler("chart", chart_command))
+    # حالت inline (@bot dollar) — باید از BotFather با /setinline فعال بشه
+    app.add_handler(InlineQueryHandler(inline_query))
+    # اسنپ‌شات مشترک قیمت‌ها در پس‌زمینه به‌روز میشه و هشدارها با هر نسخه‌ی جدید بررسی میشن
+    add_snapshot_listener(record_snapshot)
+    add_snapshot_listener(check_alerts)
+    app.job_queue.run_repeating(refresh_prices, interval=TGJU_REFRESH_INTERVAL, first=0)
+    # شهرهای کیبورد همیشه از قبل گرم‌ان
+    app.job_queue.run_repeating(prefetch_weather, interval=WEATHER_PREFETCH_INTERVAL, first=0, data=CITY_CHOICES)
+    # تست بازیابی سرویس‌های قطع‌شده فقط از پس‌زمینه، نه با درخواست کاربرها
+    app.job_queue.run_repeating(probe_circuits, interval=CIRCUIT_PROBE_INTERVAL, first=CIRCUIT_PROBE_INTERVAL)
+    app.job_queue.run_daily(send_daily_digest, time=DIGEST_TIME)
+    app.job_queue.run_repeating(
+        save_price_history, interval=PRICE_HISTORY_SAVE_INTERVAL, first=PRICE_HISTORY_SAVE_INTERVAL
+    )
+    return app
+
+
+def main():
+    print("Bot is running...")
+    run_bot(build_app())
 
 
 if __name__ == "__main__":
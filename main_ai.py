@@ -1,23 +1,36 @@
 import os
 from typing import Annotated
-from typing_extensions import TypedDict
+from typing_extensions import NotRequired, TypedDict
 from dotenv import load_dotenv
 
 from langgraph.graph import StateGraph, START, END
 from langgraph.graph.message import add_messages
-from langgraph.checkpoint.memory import MemorySaver
 from langchain_openai import ChatOpenAI 
-from langchain_core.messages import HumanMessage, BaseMessage
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage, BaseMessage, RemoveMessage, SystemMessage
+from langgraph.constants import TAG_NOSTREAM
+
+from ai_memory import HistoryPolicy, make_checkpointer
+from llm_limiter import FairLimiter
+from cache import TTLCache
+from textnorm import normalize_persian_text
 
 # بارگذاری متغیرهای محیطی
 load_dotenv()
 
+# کش جواب سوال‌های تکراری و بدون زمینه (مثل سلام یا «چی کار می‌تونی بکنی») - اختیاری
+AI_ANSWER_CACHE = os.getenv("AI_ANSWER_CACHE", "0") == "1"
+AI_ANSWER_CACHE_TTL = float(os.getenv("AI_ANSWER_CACHE_TTL", str(6 * 60 * 60)))
+AI_ANSWER_CACHE_SIZE = int(os.getenv("AI_ANSWER_CACHE_SIZE", "1000"))
+AI_ANSWER_CACHE_MAX_PROMPT = 200   # سوال‌های بلندتر تقریباً هیچ‌وقت تکرار نمیشن
+
 # تعریف ساختار State (همون چیزی که خودت داشتی)
 class State(TypedDict):
     messages: Annotated[list, add_messages]
+    # خلاصه‌ی نوبت‌های قدیمی که از تاریخچه حذف شدن (اختیاری)
+    summary: NotRequired[str]
 
 class AIAgent:
-    def __init__(self):
+    def __init__(self, history: HistoryPolicy | None = None, limiter: FairLimiter | None = None):
         """
         اینجا مدل و گراف رو یک بار می‌سازیم تا هر دفعه نخوایم لود کنیم.
         """
@@ -32,8 +45,18 @@ class AIAgent:
             temperature=0
             )
 
-        # تنظیم حافظه
-        self.memory = MemorySaver()
+        # تنظیم حافظه: تاریخچه‌ی محدود برای هر thread و حذف threadهای بیکار
+        # (روی دیسک اگه AI_CHECKPOINT_DB تنظیم شده باشه)
+        self.history = history or HistoryPolicy()
+        self.memory = make_checkpointer()
+        # سقف درخواست‌های همزمان به LLM با صف انتظار منصفانه بین کاربرها
+        self.limiter = limiter or FairLimiter()
+        self.answer_cache = (
+            TTLCache(ttl=AI_ANSWER_CACHE_TTL, maxsize=AI_ANSWER_CACHE_SIZE) if AI_ANSWER_CACHE else None
+        )
+        # hit یعنی جواب واقعاً از کش داده شد (نه فقط پیدا شد؛ thread باید خالی باشه)
+        self._answer_hits = 0
+        self._answer_misses = 0
         
         # ساخت گراف
         builder = StateGraph(State)
@@ -45,13 +68,91 @@ class AIAgent:
         self.graph = builder.compile(checkpointer=self.memory)
         print("✅ AI Graph compiled successfully!")
 
-    def chatbot_node(self, state: State):
+    async def chatbot_node(self, state: State):
+        """
+        گره اصلی که پیام رو به مدل میده و جواب میگیره.
+        فقط نوبت‌های آخر (طبق HistoryPolicy) فرستاده میشن و بقیه از state حذف
+        یا در صورت فعال بودن، در یک خلاصه‌ی در حال اجرا جمع میشن.
+        """
+        keep, dropped = self.history.split(state["messages"])
+        summary = state.get("summary", "")
+        update = {}
+        if dropped:
+            if self.history.summarize:
+                summary = await self._summarize(summary, dropped)
+                update["summary"] = summary
+            update["messages"] = [RemoveMessage(id=m.id) for m in dropped]
+
+        prompt = keep
+        if summary:
+            prompt = [SystemMessage(content=f"خلاصه‌ی گفتگوی قبلی با کاربر:\n{summary}")] + keep
+        response = await self.llm.ainvoke(prompt)
+        update["messages"] = update.get("messages", []) + [response]
+        return update
+
+    async def _summarize(self, summary: str, dropped: list[BaseMessage]) -> str:
+        """اضافه کردن نوبت‌های حذف‌شده به خلاصه‌ی قبلی"""
+        instruction = (
+            "خلاصه‌ی فعلی گفتگو و پیام‌های جدید زیر رو در چند جمله‌ی کوتاه "
+            "در یک خلاصه‌ی واحد ترکیب کن. فقط خلاصه رو بنویس."
+        )
+        if summary:
+            instruction += f"\n\nخلاصه‌ی فعلی:\n{summary}"
+        # خلاصه‌سازی نباید تو استریم جواب به کاربر دیده بشه
+        result = await self.llm.ainvoke(
+            list(dropped) + [HumanMessage(content=instruction)],
+            config={"tags": [TAG_NOSTREAM]},
+        )
+        return result.content
+
+    def _cache_key(self, user_message: str) -> str | None:
+        if self.answer_cache is None or len(user_message) > AI_ANSWER_CACHE_MAX_PROMPT:
+            return None
+        return normalize_persian_text(user_message) or None
+
+    async def _cached_answer(self, config: dict, key: str | None, user_message: str) -> str | None:
         """
-        گره اصلی که پیام رو به مدل میده و جواب میگیره
+        جواب کش‌شده، فقط وقتی thread هیچ زمینه‌ی قبلی نداره. جواب در تاریخچه‌ی
+        کاربر هم ثبت میشه تا ادامه‌ی گفتگو طبیعی باشه.
         """
-        messages = state["messages"]
-        response = self.llm.invoke(messages)
-        return {"messages": [response]}
+        if key is None:
+            return None
+        answer = self.answer_cache.get(key)
+        if answer is None:
+            self._answer_misses += 1
+            return None
+        state = await self.graph.aget_state(config)
+        if state.values.get("messages"):
+            # جواب کش برای این thread قابل استفاده نیست؛ برای مدل هم یک miss حساب میشه
+            self._answer_misses += 1
+            return None
+        self._answer_hits += 1
+        await self.graph.aupdate_state(
+            config,
+            {"messages": [HumanMessage(content=user_message), AIMessage(content=answer)]},
+            as_node="chatbot",
+        )
+        return answer
+
+    async def _remember_answer(self, config: dict, key: str | None):
+        """ذخیره‌ی جواب اگه این اولین نوبت یک thread خالی بوده"""
+        if key is None:
+            return
+        state = await self.graph.aget_state(config)
+        messages = state.values.get("messages", [])
+        if len(messages) == 2 and not state.values.get("summary"):
+            self.answer_cache.set(key, messages[-1].content)
+
+    def answer_cache_stats(self) -> dict | None:
+        if self.answer_cache is None:
+            return None
+        lookups = self._answer_hits + self._answer_misses
+        return {
+            "size": len(self.answer_cache),
+            "hits": self._answer_hits,
+            "misses": self._answer_misses,
+            "hit_rate": self._answer_hits / lookups if lookups else 0.0,
+        }
 
     async def chat(self, user_id: int, user_message: str) -> str:
         """
@@ -62,20 +163,54 @@ class AIAgent:
         # تنظیم کانفیگ برای حافظه اختصاصی هر کاربر
         config = {"configurable": {"thread_id": str(user_id)}}
         
+        # سوال تکراری بدون زمینه → جواب از کش، بدون رفتن سراغ LLM
+        cache_key = self._cache_key(user_message)
+        cached = await self._cached_answer(config, cache_key, user_message)
+        if cached is not None:
+            return cached
+
         # ساخت پیام کاربر
         input_message = HumanMessage(content=user_message)
         
         # استفاده از ainvoke (نسخه Async) برای اینکه ربات هنگ نکنه
         # ما اینجا کل دیکشنری خروجی رو میگیریم
-        result = await self.graph.ainvoke(
-            {"messages": [input_message]}, 
-            config=config
-        )
+        # اگه صف LLM پر باشه LLMBusyError بالا میره
+        async with self.limiter.slot(user_id):
+            result = await self.graph.ainvoke(
+                {"messages": [input_message]}, 
+                config=config
+            )
         
         # آخرین پیام رو که جواب هوش مصنوعیه استخراج می‌کنیم
         last_message: BaseMessage = result["messages"][-1]
+        await self._remember_answer(config, cache_key)
         return last_message.content
 
+    async def stream_chat(self, user_id: int, user_message: str):
+        """
+        مثل chat ولی جواب رو تیکه‌تیکه (توکن به توکن) برمی‌گردونه
+        تا ربات بتونه زودتر شروع به نمایش متن کنه.
+        """
+        config = {"configurable": {"thread_id": str(user_id)}}
+        cache_key = self._cache_key(user_message)
+        cached = await self._cached_answer(config, cache_key, user_message)
+        if cached is not None:
+            yield cached
+            return
+
+        input_message = HumanMessage(content=user_message)
+        async with self.limiter.slot(user_id):
+            async for chunk, metadata in self.graph.astream(
+                {"messages": [input_message]},
+                config=config,
+                stream_mode="messages",
+            ):
+                if metadata.get("langgraph_node") != "chatbot":
+                    continue
+                if isinstance(chunk, AIMessageChunk) and chunk.text:
+                    yield chunk.text
+        await self._remember_answer(config, cache_key)
+
 # این تیکه برای تست دستی فایله که ببینی کار میکنه یا نه
 if __name__ == "__main__":
     import asyncio
@@ -0,0 +1,296 @@
+import json
+import os
+import struct
+import time
+from array import array
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from gold import (
+    CRYPTO_ITEMS,
+    CURRENCY_ITEMS,
+    GOLD_ITEMS,
+    TGJU_REFRESH_INTERVAL,
+    PriceSnapshot,
+    lookup_symbol,
+    parse_price,
+    symbol_for_key,
+)
+
+
+# ── Settings ──────────────────────────────────────────────────────────
+PRICE_HISTORY_FILE = os.getenv("PRICE_HISTORY_FILE", "price_history.bin")
+# پیش‌فرض: ۷ روز با فاصله‌ی به‌روزرسانی اسنپ‌شات
+PRICE_HISTORY_CAPACITY = int(os.getenv(
+    "PRICE_HISTORY_CAPACITY", str(7 * 24 * 60 * 60 // max(1, TGJU_REFRESH_INTERVAL) + 1)
+))
+PRICE_HISTORY_SAVE_INTERVAL = int(os.getenv("PRICE_HISTORY_SAVE_INTERVAL", "300"))
+
+WINDOWS = {"1h": 60 * 60, "24h": 24 * 60 * 60, "7d": 7 * 24 * 60 * 60}
+
+# قیمت‌های دلاری با ۴ رقم اعشار به عدد صحیح تبدیل میشن؛ ریالی‌ها همون ریال
+_USD_SCALE = 10_000
+TRACKED_KEYS = (
+    [key for key, _ in GOLD_ITEMS]
+    + [key for key, _ in CURRENCY_ITEMS]
+    + [irr_key for _, irr_key, _, _ in CRYPTO_ITEMS]
+)
+_USD_KEYS = ["ons"] + [usd_key for usd_key, _, _, _ in CRYPTO_ITEMS]
+
+_MAGIC = b"PHIST1\n"
+
+
+# ── Ring Buffer ───────────────────────────────────────────────────────
+class PriceSeries:
+    """
+    بافر حلقوی با ظرفیت ثابت: دو آرایه‌ی int64 برای زمان (ثانیه) و مقدار
+    (مقدار واقعی × scale). اضافه کردن O(1) و حافظه دقیقاً ۱۶ بایت × ظرفیت.
+    """
+
+    __slots__ = ("capacity", "scale", "times", "values", "_head", "_size")
+
+    def __init__(self, capacity: int = PRICE_HISTORY_CAPACITY, scale: int = 1):
+        self.capacity = capacity
+        self.scale = scale
+        self.times = array("q", bytes(8 * capacity))
+        self.values = array("q", bytes(8 * capacity))
+        self._head = 0   # جای نوشتن بعدی
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _physical(self, i: int) -> int:
+        """اندیس منطقی (۰ = قدیمی‌ترین) → اندیس آرایه"""
+        return (self._head - self._size + i) % self.capacity
+
+    def append(self, timestamp: float, price: float):
+        ts = int(timestamp)
+        if self._size and self.times[self._physical(self._size - 1)] >= ts:
+            return  # نمونه‌ی تکراری یا قدیمی‌تر
+        self.times[self._head] = ts
+        self.values[self._head] = round(price * self.scale)
+        self._head = (self._head + 1) % self.capacity
+        if self._size < self.capacity:
+            self._size += 1
+
+    def _first_index_since(self, since: int) -> int:
+        """اولین اندیس منطقی با زمان >= since (جستجوی دودویی، زمان‌ها صعودی‌ان)"""
+        lo, hi = 0, self._size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.times[self._physical(mid)] < since:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _slices(self, arr: array, start: int) -> list[array]:
+        """بازه‌ی [start, size) به صورت حداکثر دو تیکه‌ی پیوسته از آرایه"""
+        if start >= self._size:
+            return []
+        begin = self._physical(start)
+        end = begin + (self._size - start)
+        if end <= self.capacity:
+            return [arr[begin:end]]
+        return [arr[begin:], arr[:end - self.capacity]]
+
+    def points(self, seconds: float | None = None, now: float | None = None) -> tuple[array, array]:
+        """(زمان‌ها، مقدارهای scale‌شده) در پنجره‌ی seconds ثانیه‌ی آخر"""
+        start = 0
+        if seconds is not None:
+            now = time.time() if now is None else now
+            start = self._first_index_since(int(now - seconds))
+        times, values = array("q"), array("q")
+        for part in self._slices(self.times, start):
+            times.extend(part)
+        for part in self._slices(self.values, start):
+            values.extend(part)
+        return times, values
+
+    def stats(self, seconds: float, now: float | None = None) -> dict | None:
+        now = time.time() if now is None else now
+        start = self._first_index_since(int(now - seconds))
+        parts = self._slices(self.values, start)
+        if not parts:
+            return None
+        count = self._size - start
+        first = self.values[self._physical(start)]
+        last = self.values[self._physical(self._size - 1)]
+        scale = self.scale
+        return {
+            "count": count,
+            "min": min(min(p) for p in parts) / scale,
+            "max": max(max(p) for p in parts) / scale,
+            "avg": sum(sum(p) for p in parts) / count / scale,
+            "first": first / scale,
+            "last": last / scale,
+            "change_pct": (last - first) / first * 100 if first else 0.0,
+            "since": self.times[self._physical(start)],
+        }
+
+    def to_bytes(self) -> bytes:
+        times, values = self.points()
+        return times.tobytes() + values.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes, size: int, capacity: int, scale: int) -> "PriceSeries":
+        series = cls(capacity, scale)
+        times, values = array("q"), array("q")
+        times.frombytes(data[:8 * size])
+        values.frombytes(data[8 * size:16 * size])
+        # اگه ظرفیت کمتر شده، فقط آخرین نمونه‌ها
+        keep = min(size, capacity)
+        series.times[:keep] = times[size - keep:]
+        series.values[:keep] = values[size - keep:]
+        series._size = keep
+        series._head = keep % capacity
+        return series
+
+
+# ── Price History ─────────────────────────────────────────────────────
+class PriceHistory:
+    """سری زمانی قیمت برای همه‌ی keyهای دنبال‌شده، پر شده از اسنپ‌شات‌ها"""
+
+    def __init__(self, capacity: int = PRICE_HISTORY_CAPACITY):
+        self.capacity = capacity
+        self._series: dict[str, PriceSeries] = {}
+        for key in TRACKED_KEYS:
+            self._series[key] = PriceSeries(capacity, 1)
+        for key in _USD_KEYS:
+            self._series[key] = PriceSeries(capacity, _USD_SCALE)
+
+    def series(self, key: str) -> PriceSeries | None:
+        return self._series.get(key)
+
+    def record(self, data: dict, timestamp: float):
+        for key, series in self._series.items():
+            item = data.get(key)
+            if not item:
+                continue
+            price = parse_price(item.get("p"))
+            if price is not None:
+                series.append(timestamp, price)
+
+    def save(self, path: str = PRICE_HISTORY_FILE):
+        """فرمت فشرده: هدر JSON + آرایه‌های خام int64؛ نوشتن اتمیک با فایل موقت"""
+        header = []
+        blobs = []
+        for key, series in self._series.items():
+            header.append({"key": key, "size": len(series), "scale": series.scale})
+            blobs.append(series.to_bytes())
+        header_bytes = json.dumps(header).encode()
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(_MAGIC)
+            f.write(struct.pack("<I", len(header_bytes)))
+            f.write(header_bytes)
+            for blob in blobs:
+                f.write(blob)
+            # قبل از replace باید روی دیسک باشه؛ وگرنه قطع برق فایل خالی جا میذاره
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str = PRICE_HISTORY_FILE, capacity: int = PRICE_HISTORY_CAPACITY) -> "PriceHistory":
+        history = cls(capacity)
+        try:
+            with open(path, "rb") as f:
+                raw = f.read()
+        except FileNotFoundError:
+            return history
+        if not raw.startswith(_MAGIC):
+            print(f"Price history Error: unknown file format {path}")
+            return history
+        try:
+            offset = len(_MAGIC)
+            (header_len,) = struct.unpack_from("<I", raw, offset)
+            offset += 4
+            header = json.loads(raw[offset:offset + header_len])
+            offset += header_len
+            series = {}
+            for entry in header:
+                length = 16 * entry["size"]
+                if offset + length > len(raw):
+                    raise ValueError(f"truncated data for {entry['key']}")
+                if entry["key"] in history._series:
+                    series[entry["key"]] = PriceSeries.from_bytes(
+                        raw[offset:offset + length], entry["size"], capacity, entry["scale"]
+                    )
+                offset += length
+        except (struct.error, ValueError, KeyError, TypeError) as e:
+            # فایل خراب یا نیمه‌کاره → شروع با تاریخچه‌ی خالی
+            print(f"Price history Error: corrupt file {path}: {e}")
+            return history
+        history._series.update(series)
+        return history
+
+
+_history: PriceHistory | None = None
+
+
+def get_price_history() -> PriceHistory:
+    global _history
+    if _history is None:
+        _history = PriceHistory.load()
+    return _history
+
+
+async def record_snapshot(context: ContextTypes.DEFAULT_TYPE, previous: PriceSnapshot | None, snapshot: PriceSnapshot):
+    """listener اسنپ‌شات قیمت‌ها"""
+    get_price_history().record(snapshot.data, snapshot.fetched_at)
+
+
+async def save_price_history(context: ContextTypes.DEFAULT_TYPE | None = None):
+    """جاب دوره‌ای و موقع خاموش شدن"""
+    if _history is None:
+        return
+    try:
+        _history.save()
+    except OSError as e:
+        print(f"Price history Error: {e}")
+
+
+# ── Command ───────────────────────────────────────────────────────────
+def format_price(key: str, value: float) -> str:
+    symbol = symbol_for_key(key)
+    if symbol.factor == 1:
+        return f"${value:,.4f}".rstrip("0").rstrip(".")
+    return f"{value / symbol.factor:,.0f} تومان"
+
+
+async def history_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    message = update.effective_message
+    if message is None:
+        return
+    args = list(context.args or [])
+    window = "24h"
+    if args and args[-1].lower() in WINDOWS:
+        window = args.pop().lower()
+    symbol = lookup_symbol(" ".join(args)) if args else None
+    if symbol is None:
+        await message.reply_text(
+            "فرمت درست: /history نماد [1h|24h|7d]\n"
+            "مثال: /history usd 24h  یا  /history btc 7d"
+        )
+        return
+
+    series = get_price_history().series(symbol.key)
+    stats = series.stats(WINDOWS[window]) if series is not None else None
+    if stats is None:
+        await message.reply_text("هنوز داده‌ای برای این بازه ثبت نشده.")
+        return
+
+    change = stats["change_pct"]
+    arrow = "🔺" if change > 0 else "🔻" if change < 0 else "➖"
+    await message.reply_text(
+        f"📈 {symbol.label} — {window} گذشته\n"
+        f"━━━━━━━━━━━━━━━━━━\n"
+        f"▫️ کمترین: {format_price(symbol.key, stats['min'])}\n"
+        f"▫️ بیشترین: {format_price(symbol.key, stats['max'])}\n"
+        f"▫️ میانگین: {format_price(symbol.key, stats['avg'])}\n"
+        f"▫️ آخرین: {format_price(symbol.key, stats['last'])}  {arrow} {change:+.2f}%\n"
+        f"🔢 {stats['count']} نمونه"
+    )
@@ -0,0 +1,167 @@
+import json
+import os
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable
+
+import httpx
+from telegram.ext import ContextTypes
+
+
+# ── Settings ──────────────────────────────────────────────────────────
+# این تعداد خطای پشت سر هم → قطع مدار
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "3"))
+# بودجه‌ی خطا: اگه سهم خطا در CIRCUIT_WINDOW درخواست آخر بیشتر از این بشه → قطع مدار
+CIRCUIT_ERROR_BUDGET = float(os.getenv("CIRCUIT_ERROR_BUDGET", "0.5"))
+CIRCUIT_WINDOW = int(os.getenv("CIRCUIT_WINDOW", "20"))
+# مکث اولیه قبل از اولین تست بازیابی؛ با هر تست ناموفق دو برابر میشه تا سقف
+CIRCUIT_RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT", "30"))
+CIRCUIT_MAX_RESET_TIMEOUT = float(os.getenv("CIRCUIT_MAX_RESET_TIMEOUT", "600"))
+# فاصله‌ی جاب تست بازیابی سرویس‌هایی که مدارشون قطعه
+CIRCUIT_PROBE_INTERVAL = float(os.getenv("CIRCUIT_PROBE_INTERVAL", "10"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+class CircuitOpenError(Exception):
+    """مدار سرویس قطعه و درخواست اصلاً فرستاده نشد"""
+
+
+def is_upstream_failure(error: BaseException) -> bool:
+    """
+    فقط خطاهای خود سرویس حساب میشن: تایم‌اوت و خطای اتصال، 5xx و پاسخ خراب.
+    4xx یعنی سرویس سالمه و جواب داده (مثلاً شهر ناشناخته).
+    """
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500
+    return isinstance(error, (httpx.TransportError, json.JSONDecodeError))
+
+
+# ── Circuit Breaker ───────────────────────────────────────────────────
+class CircuitBreaker:
+    """
+    مدارشکن برای یک سرویس بیرونی. وقتی باز (قطع) باشه درخواست‌ها بدون هیچ
+    انتظاری CircuitOpenError می‌گیرن. بعد از reset timeout فقط یک درخواست
+    پس‌زمینه (background=True) اجازه‌ی تست داره؛ درخواست کاربرها هیچ‌وقت
+    بازیابی رو تست نمی‌کنن و پشت سرویس خراب منتظر نمی‌مونن.
+    """
+
+    def __init__(self, name: str, probe: Callable[[], Awaitable[Any]] | None = None):
+        self.name = name
+        # درخواستی که جاب probe_circuits برای تست بازیابی می‌زنه
+        self.probe = probe
+        self._outcomes: deque[bool] = deque(maxlen=CIRCUIT_WINDOW)
+        self._consecutive = 0
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._reset_timeout = CIRCUIT_RESET_TIMEOUT
+        self._probing = False
+        self.rejected = 0
+        self.opened = 0
+        self.last_success: float | None = None
+        _breakers[name] = self
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self._reset_timeout:
+            return HALF_OPEN
+        return self._state
+
+    def retry_in(self) -> float:
+        """چند ثانیه تا اولین تست بازیابی"""
+        if self._state != OPEN:
+            return 0.0
+        return max(0.0, self._opened_at + self._reset_timeout - time.monotonic())
+
+    def allow(self, background: bool = False) -> bool:
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and background and not self._probing:
+            self._probing = True
+            return True
+        self.rejected += 1
+        return False
+
+    def _open(self):
+        if self._state != OPEN:
+            self.opened += 1
+            print(f"Circuit Error: {self.name} is down, pausing requests for {self._reset_timeout:.0f}s")
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+
+    def record_success(self):
+        self._outcomes.append(True)
+        self._consecutive = 0
+        self.last_success = time.time()
+        if self._state == OPEN:
+            print(f"Circuit: {self.name} recovered")
+            self._state = CLOSED
+            self._reset_timeout = CIRCUIT_RESET_TIMEOUT
+            self._outcomes.clear()
+
+    def record_failure(self, probe: bool = False):
+        self._outcomes.append(False)
+        self._consecutive += 1
+        if self._state == OPEN:
+            if probe:
+                # تست بازیابی ناموفق بود؛ مکث بعدی طولانی‌تر
+                self._reset_timeout = min(self._reset_timeout * 2, CIRCUIT_MAX_RESET_TIMEOUT)
+                self._open()
+            return
+        failures = self._outcomes.count(False)
+        over_budget = (
+            len(self._outcomes) >= CIRCUIT_WINDOW // 2
+            and failures / len(self._outcomes) > CIRCUIT_ERROR_BUDGET
+        )
+        if self._consecutive >= CIRCUIT_FAILURE_THRESHOLD or over_budget:
+            self._open()
+
+    async def call(self, fetch: Callable[[], Awaitable[Any]], background: bool = False) -> Any:
+        if not self.allow(background):
+            raise CircuitOpenError(f"{self.name} is unavailable")
+        probe = self._probing
+        try:
+            result = await fetch()
+        except Exception as e:
+            if is_upstream_failure(e):
+                self.record_failure(probe)
+            raise
+        else:
+            self.record_success()
+            return result
+        finally:
+            if probe:
+                self._probing = False
+
+    def stats(self) -> dict:
+        failures = self._outcomes.count(False)
+        return {
+            "state": self.state,
+            "retry_in": self.retry_in(),
+            "error_rate": failures / len(self._outcomes) if self._outcomes else 0.0,
+            "rejected": self.rejected,
+            "opened": self.opened,
+            "last_success": self.last_success,
+        }
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+
+
+def circuit_stats() -> dict[str, dict]:
+    return {name: breaker.stats() for name, breaker in _breakers.items()}
+
+
+async def probe_circuits(context: ContextTypes.DEFAULT_TYPE | None = None):
+    """جاب پس‌زمینه: تست بازیابی سرویس‌هایی که مدارشون آماده‌ی تسته"""
+    for breaker in _breakers.values():
+        if breaker.probe is None or breaker.state != HALF_OPEN:
+            continue
+        try:
+            await breaker.probe()
+        except Exception:
+            # خطا رو خود مدار ثبت کرده
+            pass
@@ -0,0 +1,117 @@
+import time
+from typing import Awaitable, Callable
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+# هندلر معمولی: (update, context)؛ هندلر پیشوندی یک آرگومان سوم هم می‌گیره (بخش بعد از «:»)
+RouteHandler = Callable[..., Awaitable[None]]
+
+
+class RouteStats:
+    __slots__ = ("calls", "total", "max")
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, elapsed: float):
+        self.calls += 1
+        self.total += elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+
+
+class RouteTable:
+    """
+    جدول مسیرها برای متن دکمه‌های منو و callback_data دکمه‌های شیشه‌ای.
+    متن‌ها و callbackها با یک lookup در dict پیدا میشن؛ callbackهای پارامتردار
+    به شکل «prefix:arg» هستن و prefix (تا اولین «:») هم با lookup پیدا میشه.
+    پس هزینه‌ی dispatch با بزرگ شدن منو ثابت می‌مونه.
+    """
+
+    def __init__(self):
+        self._texts: dict[str, tuple[str, RouteHandler]] = {}
+        self._callbacks: dict[str, tuple[str, RouteHandler]] = {}
+        self._prefixes: dict[str, tuple[str, RouteHandler]] = {}
+        self._stats: dict[str, RouteStats] = {}
+
+    def _register(self, table: dict, key: str, handler: RouteHandler, name: str | None):
+        if key in table:
+            raise ValueError(f"Route already registered: {key!r}")
+        name = name or handler.__name__
+        table[key] = (name, handler)
+        self._stats.setdefault(name, RouteStats())
+
+    def add(
+        self,
+        handler: RouteHandler,
+        texts: tuple[str, ...] = (),
+        callbacks: tuple[str, ...] = (),
+        name: str | None = None,
+    ):
+        """ثبت یک هندلر برای چند متن دکمه و/یا چند callback_data دقیق"""
+        for text in texts:
+            self._register(self._texts, text, handler, name)
+        for data in callbacks:
+            self._register(self._callbacks, data, handler, name)
+
+    def add_prefix(self, prefix: str, handler: RouteHandler, name: str | None = None):
+        """ثبت هندلر برای callback_dataهای «prefix:arg»؛ arg به هندلر پاس داده میشه"""
+        if ":" in prefix:
+            raise ValueError("Route prefix must not contain ':'")
+        self._register(self._prefixes, prefix, handler, name)
+
+    def route(self, texts: tuple[str, ...] = (), callbacks: tuple[str, ...] = (), name: str | None = None):
+        def decorator(handler: RouteHandler) -> RouteHandler:
+            self.add(handler, texts=texts, callbacks=callbacks, name=name)
+            return handler
+        return decorator
+
+    def prefix(self, prefix: str, name: str | None = None):
+        def decorator(handler: RouteHandler) -> RouteHandler:
+            self.add_prefix(prefix, handler, name=name)
+            return handler
+        return decorator
+
+    def has_text(self, text: str) -> bool:
+        return text in self._texts
+
+    async def _call(self, name: str, handler: RouteHandler, *args):
+        started = time.perf_counter()
+        try:
+            await handler(*args)
+        finally:
+            self._stats[name].record(time.perf_counter() - started)
+
+    async def dispatch_text(self, text: str, update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
+        """False یعنی مسیری برای این متن ثبت نشده"""
+        route = self._texts.get(text)
+        if route is None:
+            return False
+        await self._call(route[0], route[1], update, context)
+        return True
+
+    async def dispatch_callback(self, data: str, update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
+        route = self._callbacks.get(data)
+        if route is not None:
+            await self._call(route[0], route[1], update, context)
+            return True
+        prefix, sep, arg = data.partition(":")
+        route = self._prefixes.get(prefix) if sep else None
+        if route is None:
+            return False
+        await self._call(route[0], route[1], update, context, arg)
+        return True
+
+    def stats(self) -> dict[str, dict]:
+        """آمار هر مسیر: تعداد فراخوانی، میانگین و بیشینه‌ی زمان (ثانیه)"""
+        return {
+            name: {
+                "calls": s.calls,
+                "avg": s.total / s.calls if s.calls else 0.0,
+                "max": s.max,
+            }
+            for name, s in self._stats.items()
+        }
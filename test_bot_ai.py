@@ -0,0 +1,54 @@
+import unittest
+from unittest import mock
+
+from telegram.error import RetryAfter
+
+import bot_ai
+
+
+class _FakeMessage:
+    """پیام تلگرام ساختگی؛ اولین ویرایش‌ها RetryAfter می‌گیرن"""
+
+    def __init__(self, retry_after_edits: int = 0):
+        self.text = ""
+        self.retry_after_edits = retry_after_edits
+        self.replies: list["_FakeMessage"] = []
+
+    async def reply_text(self, text):
+        reply = _FakeMessage(self.retry_after_edits)
+        reply.text = text
+        self.replies.append(reply)
+        return reply
+
+    async def edit_text(self, text):
+        if self.retry_after_edits:
+            self.retry_after_edits -= 1
+            raise RetryAfter(0)
+        self.text = text
+
+
+class StreamingReplyTest(unittest.IsolatedAsyncioTestCase):
+    async def test_finish_retries_after_flood_wait(self):
+        message = _FakeMessage(retry_after_edits=1)
+        # interval بلند: تنها ویرایش همون flush نهایی finish هست که RetryAfter می‌گیره
+        reply = bot_ai._StreamingReply(message, interval=60)
+        await reply.feed("سلام")
+        await reply.feed("، خوبی؟")
+        await reply.finish()
+        self.assertEqual(message.replies[0].retry_after_edits, 0)
+        self.assertEqual(len(message.replies), 1)
+        self.assertEqual(message.replies[0].text, "سلام، خوبی؟")
+
+    async def test_finish_sends_rest_when_edit_keeps_failing(self):
+        message = _FakeMessage(retry_after_edits=10)
+        reply = bot_ai._StreamingReply(message, interval=0)
+        await reply.feed("سلام")
+        with mock.patch.object(bot_ai.asyncio, "sleep", mock.AsyncMock()):
+            await reply.feed("، خوبی؟")
+            await reply.finish()
+        texts = "".join(sent.text for sent in message.replies)
+        self.assertIn("خوبی؟", texts)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+import re
+import unicodedata
+
+from date import normalize_persian_digits
+
+
+# حروف عربی → معادل فارسی، و حذف کشیده و اعراب
+_CHAR_MAP = str.maketrans({
+    "ي": "ی",
+    "ى": "ی",
+    "ئ": "ی",
+    "ك": "ک",
+    "ة": "ه",
+    "ۀ": "ه",
+    "أ": "ا",
+    "إ": "ا",
+    "ٱ": "ا",
+    "ؤ": "و",
+    "٠": "0", "١": "1", "٢": "2", "٣": "3", "٤": "4",
+    "٥": "5", "٦": "6", "٧": "7", "٨": "8", "٩": "9",
+    "\u0640": None,   # کشیده (ـ)
+    "\u200c": " ",    # نیم‌فاصله
+    "\u200d": None,
+    "\u200e": None,
+    "\u200f": None,
+})
+_DIACRITICS = re.compile("[\u064b-\u065f\u0670]")
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_persian_text(text: str, keep_punctuation: bool = False) -> str:
+    """
+    یکسان‌سازی متن فارسی برای مقایسه: ارقام فارسی/عربی، ی و ک عربی،
+    نیم‌فاصله، اعراب، حروف بزرگ/کوچک و فاصله‌های اضافه.
+    """
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFKC", text)
+    text = normalize_persian_digits(text).translate(_CHAR_MAP)
+    text = _DIACRITICS.sub("", text)
+    if not keep_punctuation:
+        text = _PUNCTUATION.sub(" ", text)
+    return _SPACES.sub(" ", text).strip().lower()
@@ -0,0 +1,184 @@
+import os
+from datetime import date, datetime, timedelta
+
+import jdatetime
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup
+
+# همه‌ی کیبوردها و متن‌های ثابت ربات یکبار موقع استارت ساخته میشن و بین همه‌ی
+# آپدیت‌ها مشترکن (آبجکت‌های تلگرام بعد از ساخت تغییرناپذیرن)
+
+MY_ID = os.getenv("MY_ID")
+
+# ── Keyboards ─────────────────────────────────────────────────────────
+# ایراد اصلی این تعریف button این است که ساختارش بیش از حد تو در تو (nested) است و باعث می‌شود 
+# دکمه‌ها به‌صورت دلخواه در ردیف و ستون نمایش داده نشوند.
+# ساختار صحیح در InlineKeyboardMarkup، باید یک لیست از ردیف‌ها باشد و هر ردیف، یک لیست از دکمه‌ها.
+# یعنی: [[Button, Button], [Button], ...] و نه [[[Button], [Button]], ...] 
+# بر این اساس بازنویسی صحیح:
+
+MAIN_MENU = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🌤️آب و هوا", callback_data="weather"),
+     InlineKeyboardButton("🪙قیمت طلا", callback_data="gold")],
+    [InlineKeyboardButton("💵قیمت ارز", callback_data="currency"),
+     InlineKeyboardButton("💎ارز دیجیتال", callback_data="crypto")],
+    [InlineKeyboardButton("🤖هوش مصنوعی", callback_data="ai"),
+     InlineKeyboardButton("👨‍💻 ارتباط با سازنده", callback_data="contact")],
+    [InlineKeyboardButton("⬅️بازگشت", callback_data="back")]
+])
+
+WEATHER_MENU = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🌤 وضعیت فعلی", callback_data="weather_current"),
+     InlineKeyboardButton("📅 پیش بینی", callback_data="weather_forecast")],
+    [InlineKeyboardButton("⬅️بازگشت", callback_data="back")],
+])
+
+MAIN_REPLY_KEYBOARD = ReplyKeyboardMarkup(
+    [
+        ["🌤️آب و هوا", "🪙قیمت طلا"],
+        ["💵قیمت ارز", "💎ارز دیجیتال"],
+        ["🤖هوش مصنوعی", "👨‍💻 ارتباط با سازنده"],
+        ["⬅️بازگشت"],
+    ],
+    resize_keyboard=True,
+    is_persistent=True,
+)
+
+WEATHER_REPLY_KEYBOARD = ReplyKeyboardMarkup(
+    [
+        ["🌤 وضعیت فعلی", "📅 پیش بینی"],
+        ["⬅️بازگشت"],
+    ],
+    resize_keyboard=True,
+    is_persistent=True,
+)
+
+CITY_CHOICES = (
+    "تهران", "مشهد", "اصفهان", "شیراز", "تبریز", "اهواز",
+    "کرج", "قم", "کرمانشاه", "ارومیه", "رشت", "یزد",
+    "کازرون", "قشم", "کیش", "مازندران", "گیلان", "بندر عباس",
+)
+
+
+def _build_city_keyboard(prefix: str) -> InlineKeyboardMarkup:
+    rows: list[list[InlineKeyboardButton]] = []
+    for i in range(0, len(CITY_CHOICES), 3):
+        row = [
+            InlineKeyboardButton(city, callback_data=f"{prefix}:{city}")
+            for city in CITY_CHOICES[i:i + 3]
+        ]
+        rows.append(row)
+    rows.append([InlineKeyboardButton("⬅️بازگشت", callback_data="back")])
+    return InlineKeyboardMarkup(rows)
+
+
+_CITY_KEYBOARDS = {
+    prefix: _build_city_keyboard(prefix)
+    for prefix in ("weather_city_current", "weather_city_forecast")
+}
+
+
+def city_keyboard(prefix: str) -> InlineKeyboardMarkup:
+    keyboard = _CITY_KEYBOARDS.get(prefix)
+    if keyboard is None:
+        keyboard = _CITY_KEYBOARDS[prefix] = _build_city_keyboard(prefix)
+    return keyboard
+
+
+_PERSIAN_DIGITS = str.maketrans("0123456789", "۰۱۲۳۴۵۶۷۸۹")
+_MONTH_NAMES = (
+    "فروردین", "اردیبهشت", "خرداد", "تیر",
+    "مرداد", "شهریور", "مهر", "آبان",
+    "آذر", "دی", "بهمن", "اسفند",
+)
+
+
+def to_persian_digits(text: str) -> str:
+    return text.translate(_PERSIAN_DIGITS)
+
+
+def _build_forecast_dates_keyboard(today: date) -> InlineKeyboardMarkup:
+    row: list[InlineKeyboardButton] = []
+    for offset in range(1, 5):
+        target_date = today + timedelta(days=offset)
+        jdate = jdatetime.date.fromgregorian(date=target_date)
+        label = f"{to_persian_digits(str(jdate.day))} {_MONTH_NAMES[jdate.month - 1]}"
+        row.append(InlineKeyboardButton(label, callback_data=f"weather_date:{target_date.isoformat()}"))
+    return InlineKeyboardMarkup([
+        row,
+        [InlineKeyboardButton("📅 همه‌ی روزها", callback_data="weather_date:all")],
+        [InlineKeyboardButton("⬅️بازگشت", callback_data="back")],
+    ])
+
+
+_forecast_dates: tuple[date, InlineKeyboardMarkup] | None = None
+
+
+def forecast_dates_keyboard() -> InlineKeyboardMarkup:
+    """کیبورد چهار روز آینده؛ فقط وقتی روز (به وقت محلی) عوض شد دوباره ساخته میشه"""
+    global _forecast_dates
+    today = datetime.now().date()
+    if _forecast_dates is None or _forecast_dates[0] != today:
+        _forecast_dates = (today, _build_forecast_dates_keyboard(today))
+    return _forecast_dates[1]
+
+
+# ── Static Texts ──────────────────────────────────────────────────────
+START_TEXT = """🤖 به ربات هوشمند «کیارش» خوش آمدید!
+
+من اینجا هستم تا کارهای روزمره‌ت رو سریع‌تر و راحت‌تر کنم. با کیارش می‌تونی به کلی امکانات در یک جا دسترسی داشته باشی:
+
+🪙 قیمت طلا و سکه: مشاهده لحظه‌ای قیمت انواع طلا و سکه.
+
+💵 قیمت ارز: مشاهده لحظه‌ای قیمت دلار، یورو و سایر ارزها.
+
+💎 ارز دیجیتال: مشاهده لحظه‌ای قیمت بیت‌کوین، اتریوم، تتر و سایر رمز ارزها.
+
+🧠 هوش مصنوعی: گفتگو، پرسش و پاسخ، و حل مسائل با قدرت AI.
+
+🌤️ آب و هوا: چک کردن وضعیت جوی و پیش‌بینی هوای تمام شهرهای ایران و جهان.
+
+👨‍💻 ارتباط با سازنده: ارتباط با سازنده ربات برای دریافت اطلاعات بیشتر.
+
+همین حالا دکمه START رو بزن تا با هم شروع کنیم! 👇  """
+
+TUTORIAL_WEATHER_TEXT = """🌦 راهنمای بخش هواشناسی
+
+من می‌تونم وضعیت آب و هوای هر شهری رو بهت بگم!
+فقط کافیه طبق الگوهای زیر بنویسی:
+
+1️⃣ آب و هوای الان:
+دکمه «وضعیت فعلی» رو بزن و بعد اسم شهر رو بفرست.
+مثال:  Shiraz یا شیراز
+
+2️⃣ پیش‌بینی روزهای آینده:
+دکمه «پیش بینی» رو بزن و بعد اسم شهر + تاریخ رو بفرست.
+مثال:  Shiraz 20 Bahman یا شیراز ۲۰ بهمن
+
+⚠️ نکته: نام شهر رو می‌تونی فارسی یا انگلیسی بنویسی."""
+
+TUTORIAL_AI_TEXT = """🧠 بخش هوش مصنوعی کیارش
+
+من اینجا هستم تا مثل یک دستیار هوشمند در کنارت باشم. هر سوالی داری، از مسائل درسی و برنامه‌نویسی گرفته تا مشورت برای کارهای روزمره، فقط کافیه برام بنویسی!
+
+چه کارهایی می‌تونم انجام بدم؟
+
+🚀 پاسخ به سوالات: هر چیزی که برات سواله رو بپرس.
+
+💻 کمک در کدنویسی: اگر توی پروژه‌هات به مشکل خوردی، روی من حساب کن.
+
+✍️ نوشتن متن: از ایمیل رسمی تا کپشن اینستاگرام رو برات می‌نویسم.
+
+💡 ایده‌پردازی: برای پروژه‌ها یا کارهای شخصیت بهت ایده میدم."""
+
+CONTACT_TEXT = (
+    f"سلام رفیق! 👋\n"
+    f"\n"
+    f"این ربات هنوز داره رشد می‌کنه و هر روز\n"
+    f"قابلیت‌های جدیدی بهش اضافه میشه 🚀\n"
+    f"\n"
+    f"🐛 اگه جایی باگ دیدی، بهم بگو\n"
+    f"💡 اگه ایده‌ای داری، خوشحال میشم بشنوم\n"
+    f"\n"
+    f"━━━━━━━━━━━━━━━━━━\n"
+    f"👨‍💻 ارتباط با سازنده: {MY_ID}"
+)
@@ -0,0 +1,70 @@
+import asyncio
+import os
+from typing import Any, Awaitable
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+# حداکثر تعداد آپدیت‌هایی که همزمان اجرا میشن
+BOT_CONCURRENT_UPDATES = int(os.getenv("BOT_CONCURRENT_UPDATES", "64"))
+# حداکثر آپدیت‌های در جریان (در حال اجرا + منتظر نوبت کاربر خودشون)
+BOT_PENDING_UPDATES = int(os.getenv("BOT_PENDING_UPDATES", str(BOT_CONCURRENT_UPDATES * 8)))
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """
+    پردازش همزمان آپدیت‌ها با حفظ ترتیب برای هر کاربر/چت.
+    آپدیت‌های یک کاربر پشت سر هم اجرا میشن (چون user_data["mode"] و
+    forecast_city بین پیام‌های متوالی خونده و نوشته میشن) ولی کاربرهای
+    مختلف موازی پیش میرن.
+
+    قفل هر کاربر قبل از گرفتن جایگاه اجرا گرفته میشه تا آپدیت‌هایی که
+    منتظر نوبت همون کاربرن جای بقیه رو اشغال نکنن.
+    """
+
+    __slots__ = ("_limit", "_workers", "_locks")
+
+    def __init__(self, max_concurrent_updates: int, max_pending_updates: int | None = None):
+        super().__init__(max(max_pending_updates or 0, max_concurrent_updates))
+        self._limit = max_concurrent_updates
+        self._workers: asyncio.Semaphore | None = None
+        # کلید → [قفل، تعداد آپدیت‌های در جریان برای این کلید]
+        self._locks: dict[int, list] = {}
+
+    @staticmethod
+    def _ordering_key(update: object) -> int | None:
+        if not isinstance(update, Update):
+            return None
+        if update.effective_user is not None:
+            return update.effective_user.id
+        if update.effective_chat is not None:
+            return update.effective_chat.id
+        return None
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        key = self._ordering_key(update)
+        if key is None:
+            async with self._workers:
+                await coroutine
+            return
+
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                async with self._workers:
+                    await coroutine
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                # کاربر بیکار → قفلش رو نگه نمی‌داریم
+                del self._locks[key]
+
+    async def initialize(self) -> None:
+        self._workers = asyncio.Semaphore(self._limit)
+
+    async def shutdown(self) -> None:
+        self._locks.clear()
@@ -1,10 +1,18 @@
+import asyncio
 import os
-import requests
+import time
+from collections import deque
 from dotenv import load_dotenv
 from telegram import Update
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
 from datetime import datetime
 from date import parse_forecast_args
+import httpx
+from http_client import get_json, post_json, start_http_client, close_http_client
+from cache import TTLCache
+from city_index import CityIndex, city_key
+from resilience import CLOSED, CircuitBreaker, CircuitOpenError, is_upstream_failure
+from webhook import run_bot
 
     
 load_dotenv()
@@ -14,6 +22,63 @@ TOKEN = os.getenv("API_TELEGRAM")
 API_KEY = os.getenv("NEW_API_WEATHER") or os.getenv("API_WEATHER")
 BASE_URL_current_weather = os.getenv("NEW_BASE_URL_current_weather") or os.getenv("BASE_URL_current_weather")
 BASE_URL_forecast_weather = os.getenv("NEW_BASE_URL_forecast_weather") or os.getenv("BASE_URL_forecast_weather")
+# مدت اعتبار کش وضعیت فعلی هوا (ثانیه)
+WEATHER_CACHE_TTL = float(os.getenv("WEATHER_CACHE_TTL", "600"))
+# پیش‌بینی هر شهر ساعتی یک بار تازه میشه
+WEATHER_FORECAST_TTL = float(os.getenv("WEATHER_FORECAST_TTL", "3600"))
+
+# سقف درخواست‌های weatherapi در هر ساعت؛ پیش‌گرمایش فقط تا همین سقف خرج می‌کنه
+WEATHER_CALL_BUDGET = int(os.getenv("WEATHER_CALL_BUDGET", "500"))
+# فاصله‌ی پیش‌گرمایش شهرهای پرکاربرد؛ کمتر از TTL تا کش هیچ‌وقت سرد نشه
+WEATHER_PREFETCH_INTERVAL = float(os.getenv("WEATHER_PREFETCH_INTERVAL", str(WEATHER_CACHE_TTL * 0.8)))
+# درخواست bulk (q=bulk) فقط روی پلن‌های پولی weatherapi هست؛ در غیر این صورت شهر به شهر
+WEATHER_BULK = os.getenv("WEATHER_BULK", "1") == "1"
+WEATHER_BULK_MAX = 50
+# اسم‌هایی که weatherapi پیدا نکرد تا این مدت دیگه بیرون فرستاده نمیشن
+WEATHER_NEGATIVE_TTL = float(os.getenv("WEATHER_NEGATIVE_TTL", str(6 * 60 * 60)))
+WEATHER_NEGATIVE_SIZE = int(os.getenv("WEATHER_NEGATIVE_SIZE", "10000"))
+# کد خطای weatherapi برای "No matching location found"
+_UNKNOWN_LOCATION = 1006
+# داده‌ی منقضی تا این مدت نگه داشته میشه: فوراً نشون داده میشه و پس‌زمینه تازه میشه
+WEATHER_STALE_TTL = float(os.getenv("WEATHER_STALE_TTL", str(12 * 60 * 60)))
+
+_current_weather_cache = TTLCache(ttl=WEATHER_CACHE_TTL, stale_ttl=WEATHER_STALE_TTL)
+_forecast_cache = TTLCache(ttl=WEATHER_FORECAST_TTL, stale_ttl=WEATHER_STALE_TTL)
+# وقتی قطعه، کاربرها بدون انتظار داده‌ی کهنه می‌گیرن و جاب probe_circuits بازیابی رو تست می‌کنه
+_breaker = CircuitBreaker("weatherapi", probe=lambda: _probe_weather())
+
+
+# ── Call Budget ───────────────────────────────────────────────────────
+class CallBudget:
+    """شمارش درخواست‌های بالادستی در پنجره‌ی لغزان یک ساعته"""
+
+    def __init__(self, limit: int, window: float = 3600):
+        self.limit = limit
+        self.window = window
+        self.total = 0
+        self._calls: deque[tuple[float, int]] = deque()
+        self._used = 0
+
+    def _trim(self):
+        cutoff = time.monotonic() - self.window
+        while self._calls and self._calls[0][0] <= cutoff:
+            self._used -= self._calls.popleft()[1]
+
+    def used(self) -> int:
+        self._trim()
+        return self._used
+
+    def remaining(self) -> int:
+        return max(0, self.limit - self.used())
+
+    def spend(self, calls: int = 1):
+        """ثبت درخواست (درخواست کاربرها هیچ‌وقت رد نمیشه، فقط شمرده میشه)"""
+        self._calls.append((time.monotonic(), calls))
+        self._used += calls
+        self.total += calls
+
+
+_budget = CallBudget(WEATHER_CALL_BUDGET)
 
 
 def _normalize_base_url(base_url: str, kind: str) -> str:
@@ -63,112 +128,406 @@ _CITY_ALIASES = {
 }
 
 
+_city_index = CityIndex(_CITY_ALIASES)
+_rejected_cities = TTLCache(ttl=WEATHER_NEGATIVE_TTL, maxsize=WEATHER_NEGATIVE_SIZE)
+
+
 def _normalize_city_name(city: str) -> str:
     if not city:
         return city
     cleaned = city.strip()
-    return _CITY_ALIASES.get(cleaned, cleaned)
+    return _city_index.resolve(cleaned) or cleaned
 
 
+def _is_rejected(normalized_city: str) -> bool:
+    """اسمی که قبلاً weatherapi پیدا نکرده (بدون درخواست شبکه)"""
+    return _rejected_cities.lookup(city_key(normalized_city)) is not None
 
 
-async def get_current_weather(city: str):
+def _reject(normalized_city: str):
+    _rejected_cities.set(city_key(normalized_city), True)
+
+
+def _not_found_text(city: str) -> str:
+    text = f"شهر «{city.strip()}» پیدا نشد."
+    suggestions = _city_index.suggest(city)
+    if suggestions:
+        text += f"\nمنظورت {' یا '.join(suggestions)} بود؟"
+    return text
+
+
+def city_lookup_stats() -> dict:
+    """تطبیق‌های ایندکس شهرها و اسم‌هایی که از کش منفی جواب گرفتن"""
+    return {
+        **_city_index.stats,
+        "rejected": len(_rejected_cities),
+        "rejected_hits": _rejected_cities.hits,
+    }
+
+
+def weather_cache_stats() -> dict:
+    """آمار hit/miss کش وضعیت فعلی هوا"""
+    return _current_weather_cache.stats()
+
+
+def forecast_cache_stats() -> dict:
+    """آمار hit/miss کش پیش‌بینی"""
+    return _forecast_cache.stats()
+
+
+class WeatherAPIError(Exception):
+    """خطایی که خود weatherapi در بدنه‌ی پاسخ برگردونده"""
+
+    def __init__(self, message: str, code: int | None = None):
+        super().__init__(message)
+        self.code = code
+
+
+def _raise_for_error(data: dict):
+    """
+    بدنه‌ی error (شهر ناشناخته، سهمیه‌ی تموم‌شده، کلید نامعتبر...) → WeatherAPIError
+    تا هیچ‌وقت وارد کش نشه و بعد از درست شدن سرویس دوباره نشون داده نشه
+    """
+    if "error" in data:
+        error = data["error"]
+        raise WeatherAPIError(error.get("message", "هیچ داده ای برای این شهر یافت نشد"), error.get("code"))
+
+
+async def _weather_get(url: str, params: dict) -> dict:
+    """
+    درخواست به weatherapi. خطاهای 4xx (مثل شهر ناشناخته) بدنه‌ی error دارن و
+    به عنوان جواب برمی‌گردن؛ یعنی سرویس سالمه و مدار رو قطع نمی‌کنن.
+    """
+    _budget.spend()
     try:
+        return await get_json(url, params=params)
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code < 500:
+            try:
+                data = e.response.json()
+            except ValueError:
+                raise e
+            if isinstance(data, dict) and "error" in data:
+                return data
+        raise
+
+
+async def _fetch_current_weather(normalized_city: str, background: bool = False):
+    base_url = _normalize_base_url(BASE_URL_current_weather, "current")
+    params = {"key": API_KEY, "q": normalized_city, "aqi": "no", "lang": "fa"}
+    # خطای داخل بدنه بعد از call بررسی میشه: سرویس جواب داده و برای مدار موفقه
+    data = await _breaker.call(lambda: _weather_get(base_url, params), background=background)
+    _raise_for_error(data)
+    return data
+
+
+def _stale_note(age: float | None) -> str:
+    """یادداشت "آخرین به‌روزرسانی" برای داده‌ی کهنه (برای داده‌ی تازه خالی)"""
+    if age is None:
+        return ""
+    minutes = int(age // 60)
+    ago = f"{minutes} دقیقه پیش" if minutes < 60 else f"{minutes // 60} ساعت پیش"
+    note = f"\n🕐 آخرین به‌روزرسانی: {ago}"
+    if _breaker.state != CLOSED:
+        note += " (سرویس آب و هوا فعلاً در دسترس نیست)"
+    return note
+
+
+_UNAVAILABLE_TEXT = "⚠️ سرویس آب و هوا فعلاً در دسترس نیست. چند دقیقه‌ی دیگه دوباره امتحان کن."
+
+
+def format_current_weather(data: dict) -> str:
+    """متن وضعیت فعلی هوا از پاسخ weatherapi"""
+    if "error" in data:
+        return data["error"].get("message", "هیچ داده ای برای این شهر یافت نشد")
+    location = data["location"]
+    current = data["current"]
+    condition = current["condition"]["text"]
+    temp = current["temp_c"]
+    humidity = current["humidity"]
+    wind_speed = current["wind_kph"]
+    pressure = current["pressure_mb"]
+    fells_like = current["feelslike_c"]
+    uv_index = current.get("uv", "نامشخص")
+    cloud = current.get("cloud", "نامشخص")
+    visibility = current.get("vis_km", "نامشخص")
+    precip = current.get("precip_mm", "نامشخص")
+    gust = current.get("gust_kph", "نامشخص")
+    last_updated = current.get("last_updated", "نامشخص")
+    city = location["name"]
+    return (
+        f"🌤 وضعیت آب و هوای {city}:\n"
+        f"📝 توضیحات: {condition}\n"
+        f"🌡 دما: {temp}°C\n"
+        f"💧 رطوبت: {humidity}%\n"
+        f"🌬 فشار: {pressure} mb\n"
+        f"🌡 حساسیت آب و هوا: {fells_like}°C\n"
+        f"🌬 سرعت باد: {wind_speed} km/h\n"
+        f"🌪 تندباد: {gust} km/h\n"
+        f"☁️ پوشش ابر: {cloud}%\n"
+        f"👁 دید افقی: {visibility} km\n"
+        f"🌧 بارش: {precip} mm\n"
+        f"🔆 شاخص UV: {uv_index}\n"
+        f"🌅 طلوع: {last_updated}\n"
+        f"🌇 غروب: {last_updated}\n"
         
-        base_url = _normalize_base_url(BASE_URL_current_weather, "current")
+    )
+
+
+def cached_current_weather(city: str) -> dict | None:
+    """داده‌ی وضعیت فعلی (حتی کهنه) از کش، بدون هیچ درخواست شبکه (None یعنی تو کش نیست)"""
+    entry = _current_weather_cache.get_stale(_normalize_city_name(city).lower())
+    return entry[0] if entry is not None else None
+
+
+async def get_current_weather(city: str):
+    try:
         normalized_city = _normalize_city_name(city)
-        complete_url = f"{base_url}?key={API_KEY}&q={normalized_city}&aqi=no&lang=fa"
-        response = requests.get(complete_url)
-        response.raise_for_status()
-        data = response.json()
-        if "error" in data:
-            return data["error"].get("message", "هیچ داده ای برای این شهر یافت نشد")
-        location = data["location"]
-        current = data["current"]
-        condition = current["condition"]["text"]
-        temp = current["temp_c"]
-        humidity = current["humidity"]
-        wind_speed = current["wind_kph"]
-        pressure = current["pressure_mb"]
-        fells_like = current["feelslike_c"]
-        uv_index = current.get("uv", "نامشخص")
-        cloud = current.get("cloud", "نامشخص")
-        visibility = current.get("vis_km", "نامشخص")
-        precip = current.get("precip_mm", "نامشخص")
-        gust = current.get("gust_kph", "نامشخص")
-        last_updated = current.get("last_updated", "نامشخص")
-        city = location["name"]
-        return (
-            f"🌤 وضعیت آب و هوای {city}:\n"
-            f"📝 توضیحات: {condition}\n"
-            f"🌡 دما: {temp}°C\n"
-            f"💧 رطوبت: {humidity}%\n"
-            f"🌬 فشار: {pressure} mb\n"
-            f"🌡 حساسیت آب و هوا: {fells_like}°C\n"
-            f"🌬 سرعت باد: {wind_speed} km/h\n"
-            f"🌪 تندباد: {gust} km/h\n"
-            f"☁️ پوشش ابر: {cloud}%\n"
-            f"👁 دید افقی: {visibility} km\n"
-            f"🌧 بارش: {precip} mm\n"
-            f"🔆 شاخص UV: {uv_index}\n"
-            f"🌅 طلوع: {last_updated}\n"
-            f"🌇 غروب: {last_updated}\n"
-            
+        if _is_rejected(normalized_city):
+            return _not_found_text(city)
+        data, stale_age = await _current_weather_cache.get_or_revalidate(
+            normalized_city.lower(),
+            lambda: _fetch_current_weather(normalized_city),
+            lambda: _fetch_current_weather(normalized_city, background=True),
         )
+        return format_current_weather(data) + _stale_note(stale_age)
 
+    except WeatherAPIError as e:
+        if e.code == _UNKNOWN_LOCATION:
+            _reject(normalized_city)
+            return _not_found_text(city)
+        return str(e)
+    except CircuitOpenError:
+        return _UNAVAILABLE_TEXT
     except Exception as e:
         print(f"Error: {e}")
+        if is_upstream_failure(e):
+            return _UNAVAILABLE_TEXT
     return None
 
 
 
 
+_FORECAST_PARAMS = {"days": 10, "aqi": "no", "alerts": "no", "lang": "fa"}
+
+
+async def _request_forecast(normalized_city: str, background: bool = False) -> dict:
+    base_url = _normalize_base_url(BASE_URL_forecast_weather, "forecast")
+    params = {"key": API_KEY, "q": normalized_city, **_FORECAST_PARAMS}
+    return await _breaker.call(lambda: _weather_get(base_url, params), background=background)
+
+
+def _index_forecast(normalized_city: str, data: dict) -> dict:
+    """
+    روزهای پیش‌بینی ۱۰ روزه رو بر اساس تاریخ ISO ایندکس می‌کنه
+    تا همه‌ی تاریخ‌ها از حافظه جواب داده بشن.
+    """
+    _raise_for_error(data)
+    forecast_days = data.get("forecast", {}).get("forecastday", [])
+    return {
+        "city_name": data.get("location", {}).get("name", normalized_city),
+        "days": {item["date"]: item for item in forecast_days if item.get("date")},
+    }
+
+
+async def _fetch_forecast(normalized_city: str, background: bool = False) -> dict:
+    """پیش‌بینی ۱۰ روزه‌ی یک شهر با یک درخواست"""
+    return _index_forecast(normalized_city, await _request_forecast(normalized_city, background))
+
+
+async def _get_forecast(city: str) -> tuple[dict, float | None]:
+    """(پیش‌بینی، عمر داده‌ی کهنه یا None)"""
+    normalized_city = _normalize_city_name(city)
+    return await _forecast_cache.get_or_revalidate(
+        normalized_city.lower(),
+        lambda: _fetch_forecast(normalized_city),
+        lambda: _fetch_forecast(normalized_city, background=True),
+    )
+
+
+def _format_forecast_day(city_name: str, target_str: str, day_data: dict) -> str:
+    day = day_data["day"]
+    astro = day_data.get("astro", {})
+    description = day["condition"]["text"]
+    return (
+        f"🌤 پیش بینی آب و هوای {city_name} برای {target_str}:\n"
+        f"📝 توضیحات غالب: {description}\n"
+        f"🌡 حداقل/حداکثر دما: {day['mintemp_c']}°C / {day['maxtemp_c']}°C\n"
+        f"🌡 دمای میانگین: {day['avgtemp_c']}°C\n"
+        f"💧 رطوبت میانگین: {day['avghumidity']}%\n"
+        f"🌬 بیشترین سرعت باد: {day['maxwind_kph']} km/h\n"
+        f"🌧 احتمال بارش: {day.get('daily_chance_of_rain', 'نامشخص')}%\n"
+        f"🌧 مجموع بارش: {day.get('totalprecip_mm', 'نامشخص')} mm\n"
+        f"👁 دید افقی میانگین: {day.get('avgvis_km', 'نامشخص')} km\n"
+        f"🔆 شاخص UV: {day.get('uv', 'نامشخص')}\n"
+        f"🌅 طلوع: {astro.get('sunrise', 'نامشخص')} | 🌇 غروب: {astro.get('sunset', 'نامشخص')}\n"
+    )
+
+
 async def get_forecast_weather(city: str, target_date: datetime):
+    return await get_forecast_weather_days(city, [target_date])
+
+
+async def get_forecast_weather_days(city: str, target_dates: list[datetime]):
+    """پیش‌بینی چند تاریخ در یک پیام، همه از روی یک بار دریافت"""
     try:
-        base_url = _normalize_base_url(BASE_URL_forecast_weather, "forecast")
-        normalized_city = _normalize_city_name(city)
-        complete_url = f"{base_url}?key={API_KEY}&q={normalized_city}&days=10&aqi=no&alerts=no&lang=fa"
-        response = requests.get(complete_url)
-        response.raise_for_status()
-        data = response.json()
-        if "error" in data:
-            return data["error"].get("message", "هیچ داده ای برای این شهر یافت نشد")
-        forecast_days = data.get("forecast", {}).get("forecastday", [])
-        if not forecast_days:
+        if _is_rejected(_normalize_city_name(city)):
+            return _not_found_text(city)
+        forecast, stale_age = await _get_forecast(city)
+        days = forecast["days"]
+        if not days:
             return "هیچ داده ای برای این شهر یافت نشد"
-        target_str = target_date.strftime("%Y-%m-%d")
-        day_data = next((item for item in forecast_days if item.get("date") == target_str), None)
-        if not day_data:
+        parts = []
+        for target_date in target_dates:
+            target_str = target_date.strftime("%Y-%m-%d")
+            day_data = days.get(target_str)
+            if day_data:
+                parts.append(_format_forecast_day(forecast["city_name"], target_str, day_data))
+        if not parts:
             return "برای این تاریخ پیش بینی در دسترس نیست (فقط چند روز آینده)."
-        day = day_data["day"]
-        astro = day_data.get("astro", {})
-        description = day["condition"]["text"]
-        city_name = data.get("location", {}).get("name", city)
-        return (
-            f"🌤 پیش بینی آب و هوای {city_name} برای {target_str}:\n"
-            f"📝 توضیحات غالب: {description}\n"
-            f"🌡 حداقل/حداکثر دما: {day['mintemp_c']}°C / {day['maxtemp_c']}°C\n"
-            f"🌡 دمای میانگین: {day['avgtemp_c']}°C\n"
-            f"💧 رطوبت میانگین: {day['avghumidity']}%\n"
-            f"🌬 بیشترین سرعت باد: {day['maxwind_kph']} km/h\n"
-            f"🌧 احتمال بارش: {day.get('daily_chance_of_rain', 'نامشخص')}%\n"
-            f"🌧 مجموع بارش: {day.get('totalprecip_mm', 'نامشخص')} mm\n"
-            f"👁 دید افقی میانگین: {day.get('avgvis_km', 'نامشخص')} km\n"
-            f"🔆 شاخص UV: {day.get('uv', 'نامشخص')}\n"
-            f"🌅 طلوع: {astro.get('sunrise', 'نامشخص')} | 🌇 غروب: {astro.get('sunset', 'نامشخص')}\n"
-        )
+        return "\n".join(parts) + _stale_note(stale_age)
 
+    except WeatherAPIError as e:
+        if e.code == _UNKNOWN_LOCATION:
+            _reject(_normalize_city_name(city))
+            return _not_found_text(city)
+        return str(e)
+    except CircuitOpenError:
+        return _UNAVAILABLE_TEXT
     except Exception as e:
         print(f"Error: {e}")
+        if is_upstream_failure(e):
+            return _UNAVAILABLE_TEXT
     return None
 
 
 
+# ── Prefetch ──────────────────────────────────────────────────────────
+_bulk_supported = WEATHER_BULK
+_last_forecast_prefetch = float("-inf")
+_prefetch_stats = {"runs": 0, "warmed": 0, "skipped": 0, "errors": 0, "mode": "—"}
+
+
+async def _fetch_bulk(kind: str, cities: list[str]) -> dict[str, dict]:
+    """
+    فرمت bulk در weatherapi: POST با q=bulk و لیست شهرها در بدنه؛ هر شهر
+    یک درخواست از سهمیه حساب میشه. خروجی: کلید کش ← پاسخ همون شهر
+    """
+    if kind == "current":
+        base_url = _normalize_base_url(BASE_URL_current_weather, "current")
+        params = {"key": API_KEY, "q": "bulk", "aqi": "no", "lang": "fa"}
+    else:
+        base_url = _normalize_base_url(BASE_URL_forecast_weather, "forecast")
+        params = {"key": API_KEY, "q": "bulk", **_FORECAST_PARAMS}
+    results: dict[str, dict] = {}
+    for i in range(0, len(cities), WEATHER_BULK_MAX):
+        chunk = cities[i:i + WEATHER_BULK_MAX]
+        body = {"locations": [{"q": city, "custom_id": city.lower()} for city in chunk]}
+        data = await _breaker.call(lambda: post_json(base_url, body, params=params), background=True)
+        # فقط بعد از جواب موفق؛ bulk ردشده با 4xx سهمیه نمی‌خوره و حالت شهر به شهر خودش حساب میشه
+        _budget.spend(len(chunk))
+        for item in data.get("bulk", []):
+            query = dict(item.get("query", {}))
+            key = query.pop("custom_id", None)
+            query.pop("q", None)
+            if key:
+                results[key] = query
+    return results
+
+
+async def _fetch_each(kind: str, cities: list[str]) -> dict[str, dict]:
+    """حالت جایگزین bulk: شهر به شهر ولی همزمان"""
+    fetch = _fetch_current_weather if kind == "current" else _request_forecast
+    responses = await asyncio.gather(*(fetch(city, background=True) for city in cities), return_exceptions=True)
+    results = {}
+    for city, data in zip(cities, responses):
+        if isinstance(data, Exception):
+            print(f"Weather prefetch Error ({city}): {data}")
+            _prefetch_stats["errors"] += 1
+        else:
+            results[city.lower()] = data
+    return results
+
+
+async def _prefetch(kind: str, cities: list[str]) -> dict[str, dict]:
+    global _bulk_supported
+    if _bulk_supported:
+        try:
+            results = await _fetch_bulk(kind, cities)
+            _prefetch_stats["mode"] = "bulk"
+            return results
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code >= 500:
+                raise
+            # پلن فعلی bulk نداره؛ دیگه امتحانش نمی‌کنیم
+            print(f"Weather bulk Error: {e.response.status_code}, falling back to per-city requests")
+            _bulk_supported = False
+    _prefetch_stats["mode"] = "per-city"
+    return await _fetch_each(kind, cities)
+
+
+async def prefetch_weather(context: ContextTypes.DEFAULT_TYPE):
+    """
+    جاب پیش‌گرمایش: وضعیت فعلی شهرهای context.job.data رو قبل از انقضای کش
+    تازه می‌کنه و پیش‌بینی‌ها رو قبل از انقضای کش خودشون. پاسخ forecast
+    وضعیت فعلی رو هم داره، پس اون دور فقط یک درخواست برای هر شهر زده میشه.
+    شهرها به ترتیب اولویت‌ان و اگه سهمیه‌ی ساعت کم باشه، آخری‌ها جا می‌مونن.
+    """
+    global _last_forecast_prefetch
+    if _breaker.state != CLOSED:
+        # تا بازیابی سرویس سهمیه رو خرج نمی‌کنیم؛ کاربرها داده‌ی کهنه می‌گیرن
+        return
+    cities = list(dict.fromkeys(_normalize_city_name(city) for city in context.job.data))
+    allowed = _budget.remaining()
+    if allowed < len(cities):
+        _prefetch_stats["skipped"] += len(cities) - allowed
+        cities = cities[:allowed]
+    if not cities:
+        return
+
+    now = time.monotonic()
+    forecast_due = now - _last_forecast_prefetch >= WEATHER_FORECAST_TTL - 2 * WEATHER_PREFETCH_INTERVAL
+    try:
+        results = await _prefetch("forecast" if forecast_due else "current", cities)
+    except Exception as e:
+        print(f"Weather prefetch Error: {e}")
+        _prefetch_stats["errors"] += 1
+        return
+
+    for key, data in results.items():
+        if "error" in data or "current" not in data:
+            _prefetch_stats["errors"] += 1
+            continue
+        _current_weather_cache.set(key, {"location": data["location"], "current": data["current"]})
+        if forecast_due:
+            _forecast_cache.set(key, _index_forecast(data["location"].get("name", key), data))
+        _prefetch_stats["warmed"] += 1
+    if forecast_due:
+        _last_forecast_prefetch = now
+    _prefetch_stats["runs"] += 1
+
+
+async def _probe_weather():
+    """تست بازیابی weatherapi با پرکاربردترین شهر؛ جوابش مستقیم تو کش میره"""
+    city = "Tehran"
+    _current_weather_cache.set(city.lower(), await _fetch_current_weather(city, background=True))
+
+
+def weather_upstream_stats() -> dict:
+    """مصرف سهمیه‌ی weatherapi در ساعت گذشته و وضعیت پیش‌گرمایش"""
+    return {
+        "used": _budget.used(),
+        "budget": _budget.limit,
+        "total": _budget.total,
+        **_prefetch_stats,
+    }
+
+
 async def weather_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not context.args:
         await update.message.reply_text("لطفا نام شهر را بعد از دستور /weather مثل /weather تهران  وارد کنید")
         return
-    city = context.args[0]
+    city = " ".join(context.args)
     weather_info = await get_current_weather(city)
     if weather_info:
         await update.message.reply_text(weather_info)
@@ -196,11 +555,17 @@ async def forecast_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 def main():
-    app = Application.builder().token(TOKEN).build()
+    app = (
+        Application.builder()
+        .token(TOKEN)
+        .post_init(start_http_client)
+        .post_shutdown(close_http_client)
+        .build()
+    )
     print("Bot is running...")
     app.add_handler(CommandHandler("weather", weather_command))
     app.add_handler(CommandHandler("forecast", forecast_command))
-    app.run_polling()
+    run_bot(app)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,139 @@
+import asyncio
+import hmac
+import json
+import os
+import secrets
+import signal
+
+from telegram import Update
+from telegram.ext import Application
+from tornado.httpserver import HTTPServer
+from tornado.web import Application as TornadoApplication, RequestHandler
+
+
+# ── Settings ──────────────────────────────────────────────────────────
+BOT_MODE = os.getenv("BOT_MODE", "polling")              # polling | webhook
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")                   # آدرس عمومی (مثلاً پشت لود بالانسر)
+# اجباری نیست اگه WEBHOOK_URL ست باشه: یک مقدار تصادفی ساخته میشه و به set_webhook داده میشه
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+WEBHOOK_HEALTH_PATH = os.getenv("WEBHOOK_HEALTH_PATH", "/healthz")
+
+_SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+# ── HTTP Handlers ─────────────────────────────────────────────────────
+class TelegramUpdateHandler(RequestHandler):
+    """دریافت آپدیت از تلگرام و گذاشتن اون تو صف اپلیکیشن"""
+
+    def initialize(self, bot_app: Application, secret_token: str):
+        self.bot_app = bot_app
+        self.secret_token = secret_token
+
+    async def post(self):
+        # بدون secret هر کسی می‌تونست آپدیت جعلی بفرسته؛ پس همیشه چک میشه
+        received = self.request.headers.get(_SECRET_HEADER, "")
+        if not self.secret_token or not hmac.compare_digest(received.encode(), self.secret_token.encode()):
+            self.set_status(403)
+            return
+        try:
+            data = json.loads(self.request.body)
+            update = Update.de_json(data, self.bot_app.bot)
+        except Exception as e:
+            print(f"Webhook Error: {e}")
+            self.set_status(400)
+            return
+        await self.bot_app.update_queue.put(update)
+        self.set_status(200)
+
+
+class HealthHandler(RequestHandler):
+    """اندپوینت سلامت برای لود بالانسر"""
+
+    def initialize(self, bot_app: Application):
+        self.bot_app = bot_app
+
+    def get(self):
+        running = self.bot_app.running
+        self.set_status(200 if running else 503)
+        self.write({
+            "status": "ok" if running else "starting",
+            "mode": "webhook",
+            "pending_updates": self.bot_app.update_queue.qsize(),
+        })
+
+
+def make_webhook_app(
+    application: Application,
+    path: str = WEBHOOK_PATH,
+    secret_token: str | None = WEBHOOK_SECRET,
+) -> TornadoApplication:
+    return TornadoApplication([
+        (path, TelegramUpdateHandler, {"bot_app": application, "secret_token": secret_token}),
+        (WEBHOOK_HEALTH_PATH, HealthHandler, {"bot_app": application}),
+    ])
+
+
+# ── Runners ───────────────────────────────────────────────────────────
+async def serve_webhook(
+    application: Application,
+    listen: str = WEBHOOK_LISTEN,
+    port: int = WEBHOOK_PORT,
+    path: str = WEBHOOK_PATH,
+    secret_token: str | None = WEBHOOK_SECRET,
+    webhook_url: str | None = WEBHOOK_URL,
+    stop_event: asyncio.Event | None = None,
+):
+    """
+    اجرای ربات با سرور HTTP داخلی. چرخه‌ی عمر اپلیکیشن (post_init،
+    post_stop، post_shutdown) مثل run_polling رعایت میشه.
+    """
+    if not secret_token:
+        if not webhook_url:
+            # وبهوک جای دیگه ست شده و secret تصادفی با اون جور درنمیاد
+            raise ValueError("WEBHOOK_SECRET is required in webhook mode when WEBHOOK_URL is not set")
+        secret_token = secrets.token_urlsafe(32)
+    if stop_event is None:
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop_event.set)
+            except NotImplementedError:
+                # ویندوز add_signal_handler نداره
+                signal.signal(sig, lambda *_: loop.call_soon_threadsafe(stop_event.set))
+
+    server = HTTPServer(make_webhook_app(application, path, secret_token), xheaders=True)
+    await application.initialize()
+    try:
+        if application.post_init:
+            await application.post_init(application)
+        server.listen(port, address=listen)
+        await application.start()
+        if webhook_url:
+            await application.bot.set_webhook(
+                url=webhook_url.rstrip("/") + path,
+                secret_token=secret_token,
+                allowed_updates=Update.ALL_TYPES,
+            )
+        print(f"Webhook listening on {listen}:{port}{path}")
+        await stop_event.wait()
+    finally:
+        server.stop()
+        if application.running:
+            await application.stop()
+            if application.post_stop:
+                await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+
+def run_bot(application: Application):
+    """اجرای ربات در حالت polling یا webhook بر اساس BOT_MODE"""
+    if BOT_MODE == "webhook":
+        asyncio.run(serve_webhook(application))
+    else:
+        application.run_polling()